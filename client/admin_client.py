@@ -5,7 +5,20 @@ import asyncio
 import websockets
 import json
 
+from reconnect import backoff_delay, new_outbox
+
 SERVER_URL = "ws://localhost:8765"
+OUT_MAX_LINES = 2000  # o log da janela cresce com o acompanhamento ao vivo
+
+# evento do admin_delta -> texto
+LIVE_EVENTS = {
+    "room_added": "sala {room} criada",
+    "room_removed": "sala {room} fechada",
+    "join": "{user} entrou em {room}",
+    "leave": "{user} saiu de {room}",
+    "online": "{user} conectou",
+    "offline": "{user} desconectou",
+}
 
 
 class AdminApp:
@@ -17,6 +30,14 @@ class AdminApp:
         self.ws = None
         self.loop = None
         self.role = None
+        self.session_token = None
+        self.next_cursor = None  # próxima página da última listagem
+        self.last_query = {}
+        self.live = False
+        self.live_seq = None
+        # enviado sem conexão fica na fila; retry_after pedido pelo servidor adia a reconexão
+        self.outbox = new_outbox()
+        self.retry_after = 0.0
 
         self.auth = tk.Frame(root)
         self.auth.pack(fill=tk.X, padx=10, pady=10)
@@ -38,8 +59,28 @@ class AdminApp:
         self.controls = tk.Frame(root)
         self.controls.pack(fill=tk.X, padx=10)
 
-        self.list_btn = tk.Button(self.controls, text="Listar salas", state=tk.DISABLED, command=self.list_rooms)
-        self.list_btn.pack(fill=tk.X, pady=4)
+        # listagem paginada com filtros (vazios = sem filtro)
+        filter_frame = tk.Frame(self.controls)
+        filter_frame.pack(fill=tk.X, pady=4)
+        tk.Label(filter_frame, text="Prefixo / mín. / user:").pack(side=tk.LEFT)
+        self.prefix_entry = tk.Entry(filter_frame, width=10)
+        self.prefix_entry.pack(side=tk.LEFT, padx=3)
+        self.min_users_entry = tk.Entry(filter_frame, width=4)
+        self.min_users_entry.pack(side=tk.LEFT, padx=3)
+        self.user_filter_entry = tk.Entry(filter_frame, width=10)
+        self.user_filter_entry.pack(side=tk.LEFT, padx=3)
+
+        list_frame = tk.Frame(self.controls)
+        list_frame.pack(fill=tk.X, pady=4)
+        self.list_btn = tk.Button(list_frame, text="Listar salas", state=tk.DISABLED, command=self.list_rooms)
+        self.list_btn.pack(side=tk.LEFT, expand=True, fill=tk.X)
+        self.next_btn = tk.Button(list_frame, text="Próxima página", state=tk.DISABLED, command=self.next_page)
+        self.next_btn.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=4)
+        self.live_btn = tk.Button(list_frame, text="Ao vivo", state=tk.DISABLED, command=self.toggle_live)
+        self.live_btn.pack(side=tk.LEFT, expand=True, fill=tk.X)
+
+        self.stats_btn = tk.Button(self.controls, text="Estatísticas", state=tk.DISABLED, command=self.stats)
+        self.stats_btn.pack(fill=tk.X, pady=4)
 
         # close room
         close_frame = tk.Frame(self.controls)
@@ -61,6 +102,15 @@ class AdminApp:
         self.kick_btn = tk.Button(kick_frame, text="Kick", state=tk.DISABLED, command=self.kick)
         self.kick_btn.pack(side=tk.LEFT)
 
+        # logout forçado (revoga todos os tokens do usuário)
+        logout_frame = tk.Frame(self.controls)
+        logout_frame.pack(fill=tk.X, pady=4)
+        tk.Label(logout_frame, text="Forçar logout:").pack(side=tk.LEFT)
+        self.logout_user_entry = tk.Entry(logout_frame)
+        self.logout_user_entry.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=5)
+        self.logout_user_btn = tk.Button(logout_frame, text="Deslogar", state=tk.DISABLED, command=self.logout_user)
+        self.logout_user_btn.pack(side=tk.LEFT)
+
         # output
         self.out = tk.Text(root, state="disabled", height=16)
         self.out.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -73,24 +123,60 @@ class AdminApp:
         self.loop.run_until_complete(self.ws_loop())
 
     async def ws_loop(self):
+        attempt = 0
+        while True:
+            retry_after, self.retry_after = self.retry_after, 0.0
+            if attempt:
+                delay = backoff_delay(attempt - 1, retry_after)
+                self.root.after(0, self.write, f"Reconectando em {delay:.1f}s...")
+                await asyncio.sleep(delay)
+            try:
+                async with websockets.connect(SERVER_URL) as ws:
+                    attempt = 0
+                    await self.on_connected(ws)
+                    async for msg in ws:
+                        data = json.loads(msg)
+                        if data.get("retry_after"):
+                            self.retry_after = float(data["retry_after"])
+                        self.root.after(0, self.handle, data)
+            except Exception as e:
+                self.root.after(0, self.write, f"Conexão perdida: {e}")
+            finally:
+                self.ws = None
+            attempt += 1
+
+    async def on_connected(self, ws):
+        if self.session_token:
+            await ws.send(json.dumps({"type": "resume", "token": self.session_token}))
+        else:
+            self.root.after(0, lambda: self.login_btn.config(state=tk.NORMAL))
+        while self.outbox:
+            await ws.send(json.dumps(self.outbox[0]))
+            self.outbox.popleft()
+        self.ws = ws
+
+    async def send_queued(self, data):
+        ws = self.ws
+        if ws is None:
+            self.outbox.append(data)
+            return
         try:
-            async with websockets.connect(SERVER_URL) as ws:
-                self.ws = ws
-                self.root.after(0, lambda: self.login_btn.config(state=tk.NORMAL))
-                async for msg in ws:
-                    data = json.loads(msg)
-                    self.root.after(0, self.handle, data)
-        except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("Erro", str(e)))
+            await ws.send(json.dumps(data))
+        except websockets.ConnectionClosed:
+            self.outbox.append(data)
 
     def send_ws(self, data):
-        if not self.ws or not self.loop:
+        if not self.loop:
+            self.outbox.append(data)
             return
-        asyncio.run_coroutine_threadsafe(self.ws.send(json.dumps(data)), self.loop)
+        asyncio.run_coroutine_threadsafe(self.send_queued(data), self.loop)
 
     def write(self, line):
         self.out.config(state="normal")
         self.out.insert(tk.END, line + "\n")
+        excess = int(self.out.index("end-1c").split(".")[0]) - 1 - OUT_MAX_LINES
+        if excess > 0:
+            self.out.delete("1.0", f"{excess + 1}.0")
         self.out.config(state="disabled")
         self.out.see(tk.END)
 
@@ -98,7 +184,41 @@ class AdminApp:
         self.send_ws({"type": "login", "user": self.user.get().strip(), "pass": self.pw.get()})
 
     def list_rooms(self):
-        self.send_ws({"type": "admin_list_rooms"})
+        query = {
+            "prefix": self.prefix_entry.get().strip(),
+            "min_users": self.min_users_entry.get().strip() or 0,
+            "user": self.user_filter_entry.get().strip(),
+        }
+        self.last_query = query
+        self.send_ws({"type": "admin_list_rooms", **query})
+
+    def next_page(self):
+        if self.next_cursor:
+            self.send_ws({"type": "admin_list_rooms", **self.last_query, "cursor": self.next_cursor})
+
+    def toggle_live(self):
+        self.live = not self.live
+        self.live_seq = None
+        self.live_btn.config(relief=tk.SUNKEN if self.live else tk.RAISED)
+        self.send_ws({"type": "admin_subscribe" if self.live else "admin_unsubscribe"})
+        if not self.live:
+            self.write("Acompanhamento ao vivo desligado")
+
+    def apply_live(self, data):
+        seq = data.get("seq")
+        if self.live_seq is not None and seq != self.live_seq + 1:
+            # frames perdidos no caminho: a visão não bate mais, lista de novo
+            self.write("[AO VIVO] eventos perdidos; listando de novo")
+            self.list_rooms()
+        self.live_seq = seq
+        for ev in data.get("events", []):
+            fmt = LIVE_EVENTS.get(ev.get("op"))
+            if fmt:
+                where = f" (shard {ev['shard']})" if "shard" in ev else ""
+                self.write("[AO VIVO] " + fmt.format(room=ev.get("room"), user=ev.get("user")) + where)
+
+    def stats(self):
+        self.send_ws({"type": "admin_stats"})
 
     def close_room(self):
         self.send_ws({"type": "admin_close_room", "room": self.close_room_entry.get().strip()})
@@ -110,26 +230,62 @@ class AdminApp:
             "user": self.kick_user.get().strip()
         })
 
+    def logout_user(self):
+        self.send_ws({"type": "admin_logout_user", "user": self.logout_user_entry.get().strip()})
+
+    def show_stats(self, st):
+        self.write(f"Estatísticas (uptime {st.get('uptime_s')}s, lag do loop {st.get('loop_lag_s', 0) * 1000:.1f}ms):")
+        for name, value in st.get("gauges", {}).items():
+            self.write(f"  {name} = {value}")
+        for name, value in st.get("counters", {}).items():
+            self.write(f"  {name} = {value}")
+        for name, h in st.get("histograms", {}).items():
+            self.write(
+                f"  {name}: n={h['count']} p50={h['p50'] * 1000:.2f}ms "
+                f"p95={h['p95'] * 1000:.2f}ms p99={h['p99'] * 1000:.2f}ms max={h['max'] * 1000:.2f}ms"
+            )
+
     def handle(self, data):
         t = data.get("type")
         if t == "login_ok":
             self.role = data.get("role")
-            self.write(f"Logado. role={self.role}")
+            self.session_token = data.get("token")
+            self.write(("Sessão retomada" if data.get("resumed") else "Logado") + f". role={self.role}")
             if self.role == "admin":
                 self.list_btn.config(state=tk.NORMAL)
+                self.live_btn.config(state=tk.NORMAL)
+                self.stats_btn.config(state=tk.NORMAL)
                 self.close_btn.config(state=tk.NORMAL)
                 self.kick_btn.config(state=tk.NORMAL)
+                self.logout_user_btn.config(state=tk.NORMAL)
+                if self.live and data.get("resumed"):
+                    self.live_seq = None
+                    self.send_ws({"type": "admin_subscribe"})  # inscrição não sobrevive à reconexão
             else:
                 messagebox.showerror("Erro", "Este usuário não é admin.")
         elif t == "admin_rooms":
-            self.write("Salas:")
-            for r in data.get("rooms", []):
+            rooms = data.get("rooms", [])
+            self.write("Salas:" if rooms else "Nenhuma sala nesta página.")
+            for r in rooms:
                 self.write(f"- {r['room']} ({len(r['users'])}): {', '.join(r['users'])}")
+            self.next_cursor = data.get("next_cursor")
+            self.next_btn.config(state=tk.NORMAL if self.next_cursor else tk.DISABLED)
+        elif t == "admin_subscribed":
+            self.live_seq = data.get("seq")
+            self.write("Acompanhamento ao vivo ligado")
+        elif t == "admin_delta":
+            if self.live:
+                self.apply_live(data)
+        elif t == "admin_stats":
+            self.show_stats(data.get("stats", {}))
         elif t == "admin_ok":
             self.write("OK: " + data.get("message", ""))
         elif t == "system":
             self.write("[SYSTEM] " + data.get("message", ""))
         elif t == "error":
+            if data.get("code") == "session_invalid":
+                self.session_token = None
+                self.login_btn.config(state=tk.NORMAL)
             messagebox.showerror("Erro", data.get("message", "Erro"))
 
 
@@ -0,0 +1,76 @@
+"""Benchmark da UI do client.py: tempo na thread do Tk por 1.000 mensagens de chat.
+
+Compara o caminho em lote (inbox drenada por quadro, um insert por lote e
+scrollback limitado) com o antigo, um insert e um see() por mensagem. Precisa
+de display (no Linux sem tela: xvfb-run python client/bench_render.py).
+
+Exemplo:
+    python client/bench_render.py --messages 20000
+"""
+import argparse
+import json
+import time
+import tkinter as tk
+
+import client
+
+
+def chat(i: int) -> dict:
+    return {"type": "chat", "user": f"user{i % 50}", "message": f"mensagem número {i} " + "x" * (i % 80)}
+
+
+def run_batched(app, n: int) -> float:
+    for i in range(n):
+        app.inbox.put(chat(i))
+    spent = 0.0
+    while not app.inbox.empty():
+        t0 = time.perf_counter()
+        app.drain()
+        app.root.update()
+        spent += time.perf_counter() - t0
+    return spent
+
+
+def run_per_message(app, n: int) -> float:
+    box = app.chat_box
+    spent = 0.0
+    for i in range(n):
+        t0 = time.perf_counter()
+        box.config(state="normal")
+        box.insert(tk.END, client.format_chat(chat(i)) + "\n")
+        box.config(state="disabled")
+        box.see(tk.END)
+        app.root.update()
+        spent += time.perf_counter() - t0
+    return spent
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de renderização do chat no Tk")
+    ap.add_argument("--messages", type=int, default=10000)
+    args = ap.parse_args()
+
+    root = tk.Tk()
+    app = client.ClientApp(root, connect=False)
+    app.go_to_chat()
+    root.update()
+
+    batched = run_batched(app, args.messages)
+    app.clear_chat()
+    legacy = run_per_message(app, args.messages)
+    lines = int(app.chat_box.index("end-1c").split(".")[0])
+    root.destroy()
+
+    per_k = 1000.0 / args.messages
+    print(json.dumps({
+        "messages": args.messages,
+        "scrollback_lines": client.SCROLLBACK_LINES,
+        "frame_ms": client.FRAME_MS,
+        "batched_ms_per_1000": round(batched * per_k * 1000, 2),
+        "per_message_ms_per_1000": round(legacy * per_k * 1000, 2),
+        "per_message_final_lines": lines,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
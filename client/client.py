@@ -2,14 +2,54 @@ import tkinter as tk
 from tkinter import messagebox, simpledialog
 import threading
 import asyncio
+import bisect
+import os
+import queue
 import websockets
 import json
+from urllib.parse import urlsplit
+
+from reconnect import backoff_delay, new_outbox
 
 SERVER_URL = "ws://localhost:8765"
 
+# a thread do websocket só enfileira; a UI drena em lotes, no máximo a cada FRAME_MS
+FRAME_MS = 33
+MAX_MESSAGES_PER_FRAME = 500
+SCROLLBACK_LINES = int(os.environ.get("TRUCO_SCROLLBACK", "1000"))
+
+# cartas chegam do servidor como inteiros 0..39 (naipe * 10 + índice do valor)
+SUITS = ("espadas", "bastos", "ouros", "copas")
+RANKS = (1, 2, 3, 4, 5, 6, 7, 10, 11, 12)
+GAME_ACTIONS = (
+    ("truco", "Truco"),
+    ("envido", "Envido"),
+    ("real_envido", "Real envido"),
+    ("falta_envido", "Falta envido"),
+    ("flor", "Flor"),
+    ("quiero", "Quero"),
+    ("no_quiero", "Não quero"),
+    ("mazo", "Mazo"),
+)
+
+
+def card_name(c):
+    return f"{RANKS[c % 10]} de {SUITS[c // 10]}"
+
+
+def format_chat(data):
+    if "user" in data:
+        return f'{data["user"]}: {data["message"]}'
+    return data.get("message", "")
+
+
+def redirect_url(url, port):
+    parts = urlsplit(url)
+    return parts._replace(netloc=f"{parts.hostname}:{port}").geturl()
+
 
 class ClientApp:
-    def __init__(self, root):
+    def __init__(self, root, connect=True):
         self.root = root
         self.root.title("Truco Online")
         self.root.geometry("420x560")
@@ -20,6 +60,30 @@ class ClientApp:
         self.username = None
         self.role = None
         self.room = None
+        self.watching = None  # sala assistida como espectador
+        self.session_token = None  # vem no login_ok; serve para "resume"
+
+        # reconexão: fila do que foi enviado sem conexão, sala a retomar num redirect
+        # e o último retry_after pedido pelo servidor
+        self.outbox = new_outbox()
+        self.resume_room = None
+        self.resume_create = False  # o redirect veio de um create_room: o dono cria a sala
+        self.retry_after = 0.0
+
+        # espelho do rooms_listbox (ordenado) e versão da lista no servidor
+        self.room_names = []
+        self.rooms_version = None
+        self.my_stats = None  # último player_stats (mostrado junto do ranking)
+
+        # mensagens vindas da thread do websocket, linhas de chat e estado de jogo por desenhar
+        self.inbox = queue.SimpleQueue()
+        self.chat_pending = []
+        self.chat_lines = 0
+        self.pending_state = None
+        # estado da partida montado pelos game_delta: seq do último aplicado
+        self.game_view = {}
+        self.game_seq = 0
+        self.resync_asked = False
 
         # ===== AUTH FRAME =====
         self.auth_frame = tk.Frame(root)
@@ -57,6 +121,21 @@ class ClientApp:
         self.join_btn = tk.Button(self.lobby_frame, text="Entrar na Sala", state=tk.DISABLED, command=self.join_room)
         self.join_btn.pack(fill=tk.X, padx=40)
 
+        self.watch_btn = tk.Button(self.lobby_frame, text="Assistir", state=tk.DISABLED, command=self.spectate)
+        self.watch_btn.pack(fill=tk.X, padx=40, pady=(5, 0))
+
+        # matchmaking: o servidor monta a mesa com gente de rating parecido
+        self.queue_frame = tk.Frame(self.lobby_frame)
+        self.queue_frame.pack(fill=tk.X, padx=40, pady=(10, 0))
+        for mode, label in ((2, "Jogar 1x1"), (4, "Jogar 2x2")):
+            tk.Button(self.queue_frame, text=label, command=lambda m=mode: self.queue_match(m)).pack(
+                side=tk.LEFT, expand=True, fill=tk.X)
+        tk.Button(self.queue_frame, text="Sair da fila", command=self.cancel_match).pack(side=tk.LEFT, expand=True, fill=tk.X)
+        self.queue_label = tk.Label(self.lobby_frame, text="")
+        self.queue_label.pack(fill=tk.X, padx=40)
+
+        tk.Button(self.lobby_frame, text="Ranking", command=self.show_ranking).pack(fill=tk.X, padx=40, pady=(10, 0))
+
         tk.Button(self.lobby_frame, text="Sair (logout)", command=self.logout).pack(fill=tk.X, padx=40, pady=10)
 
         # ===== CHAT =====
@@ -64,6 +143,41 @@ class ClientApp:
 
         tk.Label(self.chat_frame, text="Chat", font=("Arial", 14, "bold")).pack(pady=5)
 
+        # ----- mesa de truco -----
+        self.game_frame = tk.Frame(self.chat_frame)
+        self.game_frame.pack(fill=tk.X, padx=10)
+
+        self.game_status = tk.Label(self.game_frame, text="Sem partida", justify=tk.LEFT, anchor="w")
+        self.game_status.pack(fill=tk.X)
+
+        self.cards_frame = tk.Frame(self.game_frame)
+        self.cards_frame.pack(fill=tk.X, pady=2)
+        self.card_btns = []
+        for i in range(3):
+            btn = tk.Button(self.cards_frame, text="-", state=tk.DISABLED, command=lambda i=i: self.play_card(i))
+            btn.pack(side=tk.LEFT, expand=True, fill=tk.X)
+            self.card_btns.append(btn)
+
+        self.bets_frame = tk.Frame(self.game_frame)
+        self.bets_frame.pack(fill=tk.X)
+        self.bet_btns = {}
+        for i, (action, label) in enumerate(GAME_ACTIONS):
+            btn = tk.Button(
+                self.bets_frame, text=label, state=tk.DISABLED,
+                command=lambda a=action: self.send_game_action(a),
+            )
+            btn.grid(row=i // 4, column=i % 4, sticky="ew")
+            self.bets_frame.columnconfigure(i % 4, weight=1)
+            self.bet_btns[action] = btn
+
+        self.game_btns = tk.Frame(self.game_frame)
+        self.game_btns.pack(fill=tk.X, pady=2)
+        self.start_game_btn = tk.Button(self.game_btns, text="Iniciar partida", command=self.start_game)
+        self.start_game_btn.pack(side=tk.LEFT, expand=True, fill=tk.X)
+        tk.Button(self.game_btns, text="Adicionar robô", command=self.add_bot).pack(side=tk.LEFT, expand=True, fill=tk.X)
+        self.game_cards = []
+        self.game_players = []
+
         self.chat_box = tk.Text(self.chat_frame, state="disabled", height=15)
         self.chat_box.pack(fill=tk.BOTH, padx=10, expand=True)
 
@@ -73,8 +187,11 @@ class ClientApp:
 
         tk.Button(self.chat_frame, text="Sair da Sala", command=self.leave_room).pack(fill=tk.X, padx=40, pady=5)
 
+        self.root.after(FRAME_MS, self.pump)
+
         # ===== WS THREAD =====
-        threading.Thread(target=self.start_ws, daemon=True).start()
+        if connect:
+            threading.Thread(target=self.start_ws, daemon=True).start()
 
     # ================= WS =================
 
@@ -84,22 +201,75 @@ class ClientApp:
         self.loop.run_until_complete(self.ws_loop())
 
     async def ws_loop(self):
+        url = SERVER_URL
+        attempt = 0
+        while True:
+            retry_after, self.retry_after = self.retry_after, 0.0
+            if url == SERVER_URL and attempt:
+                delay = backoff_delay(attempt - 1, retry_after)
+                self.inbox.put({"type": "_connection", "status": "waiting", "delay": delay})
+                await asyncio.sleep(delay)
+            try:
+                async with websockets.connect(url) as ws:
+                    attempt = 0
+                    url = SERVER_URL
+                    await self.on_connected(ws)
+                    async for msg in ws:
+                        data = json.loads(msg)
+                        if data.get("retry_after"):
+                            self.retry_after = float(data["retry_after"])
+                        if data.get("type") == "redirect" and self.session_token:
+                            # a sala mora em outro processo do servidor: reconecta nele e retoma a sessão
+                            url = redirect_url(SERVER_URL, data["port"])
+                            if data.get("spectate"):
+                                self.watching = data.get("room")
+                            else:
+                                self.resume_room = data.get("room")
+                                self.resume_create = bool(data.get("create"))
+                            break
+                        self.inbox.put(data)
+            except Exception as e:
+                url = SERVER_URL  # redirect que falhou volta pela porta pública
+                self.inbox.put({"type": "_connection", "status": "down", "error": str(e)})
+            finally:
+                self.ws = None
+            if url == SERVER_URL:
+                attempt += 1
+
+    async def on_connected(self, ws):
+        """Retoma a sessão (e a sala) se havia login e despacha o que ficou na fila."""
+        if self.session_token:
+            room, self.resume_room = self.resume_room or self.room, None
+            resume = {"type": "resume", "token": self.session_token, "room": room}
+            if self.resume_create:
+                resume["create"] = True
+                self.resume_create = False
+            if room and room == self.room and self.game_seq:
+                resume["game_seq"] = self.game_seq  # o servidor manda só os deltas que faltam
+            if not room and self.watching:
+                resume["spectate"] = self.watching
+            await ws.send(json.dumps(resume))
+        self.inbox.put({"type": "_connection", "status": "up"})
+        while self.outbox:
+            await ws.send(json.dumps(self.outbox[0]))
+            self.outbox.popleft()
+        self.ws = ws
+
+    async def send_queued(self, data):
+        ws = self.ws
+        if ws is None:
+            self.outbox.append(data)
+            return
         try:
-            async with websockets.connect(SERVER_URL) as ws:
-                self.ws = ws
-                self.root.after(0, self.enable_auth_buttons)
-
-                async for msg in ws:
-                    data = json.loads(msg)
-                    self.root.after(0, self.handle_message, data)
-
-        except Exception as e:
-            self.root.after(0, lambda: self.show_error(f"Não foi possível conectar ao servidor.\n{e}"))
+            await ws.send(json.dumps(data))
+        except websockets.ConnectionClosed:
+            self.outbox.append(data)
 
     def send_ws(self, data):
-        if not self.ws or not self.loop:
+        if not self.loop:
+            self.outbox.append(data)
             return
-        asyncio.run_coroutine_threadsafe(self.ws.send(json.dumps(data)), self.loop)
+        asyncio.run_coroutine_threadsafe(self.send_queued(data), self.loop)
 
     # ================= UI helpers =================
 
@@ -113,12 +283,63 @@ class ClientApp:
         self.login_btn.config(state=tk.NORMAL)
         self.register_btn.config(state=tk.NORMAL)
 
+    def connection_changed(self, data):
+        status = data.get("status")
+        if status == "up":
+            self.root.title("Truco Online")
+            if not self.session_token:
+                self.enable_auth_buttons()
+        elif status == "waiting":
+            self.root.title(f"Truco Online - reconectando em {data.get('delay', 0):.1f}s")
+        else:
+            self.root.title("Truco Online - sem conexão")
+
+    def pump(self):
+        """Drena a inbox num lote só e agenda o próximo quadro."""
+        try:
+            self.drain()
+        finally:
+            self.root.after(FRAME_MS, self.pump)
+
+    def drain(self, limit=MAX_MESSAGES_PER_FRAME):
+        for _ in range(limit):
+            try:
+                data = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            self.handle_message(data)
+        if self.pending_state is not None:
+            # vários game_state no mesmo lote: só o último importa
+            st, self.pending_state = self.pending_state, None
+            self.render_game(st)
+        self.flush_chat()
+
     def append_chat(self, text):
+        self.chat_pending.append(text)
+
+    def flush_chat(self):
+        if not self.chat_pending:
+            return
+        # o que passaria do scrollback nem chega ao widget
+        text = "\n".join(self.chat_pending[-SCROLLBACK_LINES:]) + "\n"
+        self.chat_lines += text.count("\n")
+        self.chat_pending.clear()
         self.chat_box.config(state="normal")
-        self.chat_box.insert(tk.END, text + "\n")
+        self.chat_box.insert(tk.END, text)
+        excess = self.chat_lines - SCROLLBACK_LINES
+        if excess > 0:
+            self.chat_box.delete("1.0", f"{excess + 1}.0")
+            self.chat_lines -= excess
         self.chat_box.config(state="disabled")
         self.chat_box.see(tk.END)
 
+    def clear_chat(self):
+        self.chat_pending.clear()
+        self.chat_lines = 0
+        self.chat_box.config(state="normal")
+        self.chat_box.delete("1.0", tk.END)
+        self.chat_box.config(state="disabled")
+
     def go_to_auth(self):
         self.lobby_frame.pack_forget()
         self.chat_frame.pack_forget()
@@ -155,11 +376,16 @@ class ClientApp:
         self.send_ws({"type": "login", "user": u, "pass": p})
 
     def logout(self):
+        if self.role:
+            self.send_ws({"type": "logout"})
+        self.session_token = None
         self.role = None
         self.username = None
         self.room = None
+        self.watching = None
         self.create_btn.config(state=tk.DISABLED)
         self.join_btn.config(state=tk.DISABLED)
+        self.watch_btn.config(state=tk.DISABLED)
         self.go_to_auth()
 
     def create_room(self):
@@ -174,12 +400,129 @@ class ClientApp:
         room = self.rooms_listbox.get(selection[0])
         self.send_ws({"type": "join_room", "room": room})
 
+    def spectate(self):
+        selection = self.rooms_listbox.curselection()
+        if selection:
+            self.send_ws({"type": "spectate", "room": self.rooms_listbox.get(selection[0])})
+
     def leave_room(self):
         if self.room:
             self.send_ws({"type": "leave_room", "room": self.room})
+        elif self.watching:
+            self.send_ws({"type": "stop_spectating"})
         self.room = None
+        self.watching = None
+        self.reset_game_sync()
         self.go_to_lobby()
 
+    def start_game(self):
+        if self.room:
+            self.send_ws({"type": "game_start", "room": self.room})
+
+    def queue_match(self, mode):
+        self.send_ws({"type": "queue_match", "mode": mode})
+
+    def cancel_match(self):
+        self.send_ws({"type": "cancel_match"})
+
+    def show_ranking(self):
+        self.send_ws({"type": "player_stats"})
+        self.send_ws({"type": "leaderboard", "limit": 10})
+
+    def add_bot(self):
+        if self.room:
+            self.send_ws({"type": "add_bot", "room": self.room})
+
+    def play_card(self, i):
+        if self.room and i < len(self.game_cards):
+            self.send_ws({"type": "game_action", "room": self.room, "action": "play", "card": self.game_cards[i]})
+
+    def send_game_action(self, action):
+        if self.room:
+            self.send_ws({"type": "game_action", "room": self.room, "action": action})
+
+    def reset_game_sync(self):
+        self.game_view = {}
+        self.game_seq = 0
+        self.resync_asked = False
+
+    def apply_game_delta(self, data):
+        """Aplica o delta seq sobre seq-1; pulo de seq pede os que faltam (ou a foto)."""
+        seq = data.get("seq", 0)
+        if seq <= self.game_seq:
+            return  # repetido (chegou pelo resync e pelo caminho normal)
+        if seq != self.game_seq + 1:
+            if not self.resync_asked:
+                self.resync_asked = True
+                self.send_ws({"type": "game_resync", "room": self.room, "seq": self.game_seq})
+            return
+        self.game_view.update(data.get("set", {}))
+        for key in data.get("del", []):
+            self.game_view.pop(key, None)
+        self.game_seq = seq
+        self.resync_asked = False
+        self.pending_state = self.game_view
+
+    def reset_game_panel(self, text="Sem partida"):
+        self.pending_state = None
+        self.game_cards = []
+        self.game_status.config(text=text)
+        for btn in self.card_btns:
+            btn.config(text="-", state=tk.DISABLED)
+        for btn in self.bet_btns.values():
+            btn.config(state=tk.DISABLED)
+        self.start_game_btn.config(state=tk.NORMAL)
+
+    def render_game(self, st):
+        self.game_players = st.get("players", [])
+        self.game_cards = st.get("cards", [])
+        legal = set(st.get("legal", []))
+        score = st.get("score", [0, 0])
+        actor = st.get("actor", -1)
+        who = self.game_players[actor] if 0 <= actor < len(self.game_players) else "-"
+        lines = [
+            f"Placar: nós {score[st.get('team', 0)]} x {score[1 - st.get('team', 0)]} eles  (até {st.get('target')})",
+            f"Mão {st.get('hand')}  rodada {st.get('trick', 0) + 1}  vez de: {who}  envido: {st.get('envido')}",
+        ]
+        if st.get("pending"):
+            lines.append(f"Aposta pendente: {st.get('pending_call') or st.get('pending')}")
+        table = st.get("tricks", [])
+        if table:
+            row = table[-1]
+            played = [f"{self.game_players[i]}: {card_name(c)}" for i, c in enumerate(row) if c >= 0]
+            if played:
+                lines.append("Mesa: " + ", ".join(played))
+        self.game_status.config(text="\n".join(lines))
+
+        for i, btn in enumerate(self.card_btns):
+            if i < len(self.game_cards):
+                btn.config(text=card_name(self.game_cards[i]), state=tk.NORMAL if "play" in legal else tk.DISABLED)
+            else:
+                btn.config(text="-", state=tk.DISABLED)
+        for action, btn in self.bet_btns.items():
+            btn.config(state=tk.NORMAL if action in legal else tk.DISABLED)
+        self.start_game_btn.config(state=tk.DISABLED)
+
+    def describe_game_event(self, ev):
+        user = ev.get("user", "?")
+        action = ev.get("action")
+        if action == "play":
+            text = f"{user} jogou {card_name(ev['card'])}"
+        elif action == "truco":
+            text = f"{user} cantou {(ev.get('call') or 'truco').replace('_', ' ')}!"
+        else:
+            text = f"{user}: {action.replace('_', ' ')}"
+        parts = [text]
+        if "trick_winner" in ev:
+            parts.append("rodada empatada" if ev["trick_winner"] == 2 else f"rodada do time {ev['trick_winner'] + 1}")
+        if "envido" in ev:
+            parts.append(f"envido: time {ev['envido']['team'] + 1} leva {ev['envido']['points']}")
+        if "flor" in ev:
+            parts.append(f"flor: time {ev['flor']['team'] + 1} leva {ev['flor']['points']}")
+        if "hand_over" in ev:
+            parts.append(f"mão do time {ev['hand_over']['team'] + 1} (+{ev['hand_over']['points']})")
+        return " — ".join(parts)
+
     def send_message(self, event=None):
         msg = self.msg_entry.get()
         self.msg_entry.delete(0, tk.END)
@@ -188,6 +531,29 @@ class ClientApp:
 
     # ================= Handlers =================
 
+    def apply_room_delta(self, data):
+        version = data.get("version")
+        if self.rooms_version is None or version <= self.rooms_version:
+            return  # velho (já veio num snapshot mais novo)
+        if data.get("base") != self.rooms_version:
+            # perdemos um delta: pede a lista inteira de novo
+            self.rooms_version = None
+            self.send_ws({"type": "room_list_sync"})
+            return
+
+        for room in data.get("removed", []):
+            i = bisect.bisect_left(self.room_names, room)
+            if i < len(self.room_names) and self.room_names[i] == room:
+                del self.room_names[i]
+                self.rooms_listbox.delete(i)
+        for room in data.get("added", []):
+            i = bisect.bisect_left(self.room_names, room)
+            if i < len(self.room_names) and self.room_names[i] == room:
+                continue
+            self.room_names.insert(i, room)
+            self.rooms_listbox.insert(i, room)
+        self.rooms_version = version
+
     def handle_message(self, data):
         t = data.get("type")
 
@@ -198,39 +564,151 @@ class ClientApp:
 
         elif t == "login_ok":
             self.role = data.get("role")
-            self.username = self.user_entry.get().strip()
+            self.session_token = data.get("token")
+            if not data.get("resumed"):
+                self.username = self.user_entry.get().strip()
             self.pass_entry.delete(0, tk.END)
 
             self.create_btn.config(state=tk.NORMAL)
             self.join_btn.config(state=tk.NORMAL)
+            self.watch_btn.config(state=tk.NORMAL)
 
-            self.go_to_lobby()
+            if not self.watching:
+                self.go_to_lobby()
 
         elif t == "room_list":
+            self.room_names = sorted(data.get("rooms", []))
+            self.rooms_version = data.get("version")
             self.rooms_listbox.delete(0, tk.END)
-            for room in data.get("rooms", []):
+            for room in self.room_names:
                 self.rooms_listbox.insert(tk.END, room)
 
+        elif t == "room_list_delta":
+            self.apply_room_delta(data)
+
         elif t == "room_joined":
+            rejoined = data.get("room") == self.room
+            if not rejoined:
+                self.reset_game_sync()
             self.room = data.get("room")
-            self.chat_box.config(state="normal")
-            self.chat_box.delete("1.0", tk.END)
-            self.chat_box.config(state="disabled")
+            self.watching = None
+            self.clear_chat()
             self.go_to_chat()
+            self.reset_game_panel()
+            if rejoined and self.game_view:
+                self.pending_state = self.game_view  # voltou da queda: o que faltar chega em seguida
             self.append_chat(f"Você entrou na sala: {self.room}")
 
-        elif t in ("chat", "system"):
-            if "user" in data:
-                self.append_chat(f'{data["user"]}: {data["message"]}')
+        elif t == "spectating":
+            self.watching = data.get("room")
+            self.clear_chat()
+            self.go_to_chat()
+            self.reset_game_panel()
+            self.start_game_btn.config(state=tk.DISABLED)
+            delay = data.get("delay_ms", 0) / 1000
+            self.append_chat(f"Assistindo {self.watching} ({', '.join(data.get('players', []))}), atraso de {delay:.0f}s")
+
+        elif t == "spectate_batch":
+            # o lote traz chat, eventos e o último game_state (visão pública) da sala assistida
+            if data.get("room") == self.watching:
+                for ev in data.get("events", []):
+                    self.handle_message(ev)
+                if self.watching:
+                    self.start_game_btn.config(state=tk.DISABLED)
+
+        elif t == "spectate_end":
+            if self.watching:
+                self.append_chat("Transmissão encerrada")
+            self.watching = None
+            if not self.room:
+                self.go_to_lobby()
+
+        elif t == "game_started":
+            self.reset_game_sync()
+            self.append_chat("Partida iniciada: " + " x ".join(data.get("players", [])))
+
+        elif t == "game_state":
+            if "seq" in data:
+                # foto do assento (entrada no meio da partida ou resync)
+                self.game_view = dict(data.get("state") or {})
+                self.game_seq = data["seq"]
+                self.resync_asked = False
+            self.pending_state = data.get("state", {})
+
+        elif t == "game_delta":
+            if data.get("room") == self.room:
+                self.apply_game_delta(data)
+
+        elif t == "game_event":
+            self.append_chat(self.describe_game_event(data))
+
+        elif t == "game_over":
+            score = data.get("score", [0, 0])
+            if data.get("reason"):
+                text = f"Partida encerrada: {data['reason']}"
             else:
-                self.append_chat(data.get("message", ""))
+                text = f"Fim de partida! Time {data.get('winner', 0) + 1} venceu ({score[0]} x {score[1]})"
+            self.append_chat(text)
+            self.reset_game_sync()
+            self.reset_game_panel(text)
+
+        elif t == "chat_history":
+            # histórico da sala num frame só: um insert no chat_box
+            events = data.get("events", [])
+            if events:
+                lines = ["--- mensagens anteriores ---"] + [format_chat(e) for e in events] + ["---"]
+                self.append_chat("\n".join(lines))
+
+        elif t in ("chat", "system"):
+            self.append_chat(format_chat(data))
+
+        elif t == "match_queued":
+            mode = "1x1" if data.get("mode") == 2 else "2x2"
+            self.queue_label.config(text=f"Na fila {mode} (rating {data.get('rating', 0):.0f})...")
+
+        elif t == "match_cancelled":
+            self.queue_label.config(text="")
+
+        elif t == "match_found":
+            self.queue_label.config(text="")
+            ratings = data.get("ratings", {})
+            self.append_chat("Partida encontrada: " + ", ".join(f"{p} ({ratings.get(p, 0):.0f})" for p in data.get("players", [])))
+
+        elif t == "player_stats":
+            self.my_stats = data.get("stats")
+
+        elif t == "leaderboard":
+            lines = [f"{r['rank']}. {r['user']}  {r['rating']:.0f}  ({r['wins']}V {r['losses']}D)" for r in data.get("rows", [])]
+            st = self.my_stats
+            if st:
+                where = f"{st['rank']}º" if st.get("rank") else "fora do ranking"
+                lines += ["", f"Você: {where}, {st['rating']:.0f} pontos ({st['wins']}V {st['losses']}D)"]
+            self.show_info("\n".join(lines) or "Nenhuma partida registrada ainda.")
+
+        elif t == "_connection":
+            self.connection_changed(data)
 
         elif t == "error":
+            if data.get("code") == "room_gone":
+                # a sala sumiu enquanto estávamos fora: volta para o lobby
+                self.room = None
+                self.reset_game_sync()
+                self.go_to_lobby()
+            if data.get("code") == "session_invalid":
+                # a sessão não voltou depois da reconexão: login de novo
+                self.session_token = None
+                self.role = None
+                self.room = None
+                self.watching = None
+                self.create_btn.config(state=tk.DISABLED)
+                self.join_btn.config(state=tk.DISABLED)
+                self.watch_btn.config(state=tk.DISABLED)
             self.show_error(data.get("message", "Erro desconhecido"))
             if not self.role:
                 self.go_to_auth()
 
 
-root = tk.Tk()
-app = ClientApp(root)
-root.mainloop()
+if __name__ == "__main__":
+    root = tk.Tk()
+    app = ClientApp(root)
+    root.mainloop()
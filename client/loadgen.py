@@ -0,0 +1,326 @@
+"""Gerador de carga headless: simula muitos clientes falando o mesmo protocolo
+JSON do client.py (register, login, salas e chat) e grava o resultado em JSON.
+
+Todos os clientes saem do mesmo IP: para medir capacidade, suba o servidor
+com RATE_LIMITS="" MAX_CONNECTIONS_PER_IP=0 (os limites por IP de login/registro
+e de conexões abertas pegariam a carga; acima de 10000 clientes, MAX_CONNECTIONS também).
+
+Exemplo:
+    python client/loadgen.py --clients 2000 --rate 200 --duration 60 \\
+        --mix chatter=0.7,lurker=0.2,churn=0.1 --out run.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+import websockets
+
+SERVER_URL = "ws://localhost:8765"
+
+SCENARIOS = ("chatter", "lurker", "churn")
+
+
+def percentile(sorted_values, p: float):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def redirect_url(url: str, port: int) -> str:
+    parts = urlsplit(url)
+    return parts._replace(netloc=f"{parts.hostname}:{port}").geturl()
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"cenário desconhecido: {name}")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError("mix vazio")
+    return mix
+
+
+class Stats:
+    def __init__(self):
+        self.latency = {}  # tipo -> [segundos]
+        self.sent = 0
+        self.received = 0
+        self.errors = {}  # mensagem -> contagem
+        self.busy = 0
+        self.connect_failures = 0
+        self.disconnects = 0
+        self.redirects = 0
+        self.clients_started = 0
+        self.clients_ok = 0
+
+    def observe(self, kind: str, seconds: float):
+        self.latency.setdefault(kind, []).append(seconds)
+
+    def error(self, message: str):
+        self.errors[message] = self.errors.get(message, 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        latency = {}
+        for kind, values in sorted(self.latency.items()):
+            values.sort()
+            latency[kind] = {
+                "count": len(values),
+                "throughput_per_s": round(len(values) / elapsed, 2) if elapsed else None,
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+        started = self.clients_started or 1
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "clients_started": self.clients_started,
+            "clients_logged_in": self.clients_ok,
+            "frames_sent": self.sent,
+            "frames_received": self.received,
+            "send_rate_per_s": round(self.sent / elapsed, 2) if elapsed else None,
+            "receive_rate_per_s": round(self.received / elapsed, 2) if elapsed else None,
+            "latency": latency,
+            "errors": dict(sorted(self.errors.items(), key=lambda kv: -kv[1])),
+            "error_count": sum(self.errors.values()),
+            "busy_count": self.busy,
+            "connect_failures": self.connect_failures,
+            "disconnects": self.disconnects,
+            "redirects": self.redirects,
+            "error_rate": round(sum(self.errors.values()) / max(1, self.sent), 5),
+            "disconnect_rate": round(self.disconnects / started, 5),
+        }
+
+
+class SimClient:
+    def __init__(self, idx: int, scenario: str, args, stats: Stats, rng: random.Random):
+        self.idx = idx
+        self.scenario = scenario
+        self.args = args
+        self.stats = stats
+        self.rng = rng
+        self.username = f"{args.prefix}{idx}"
+        self.ws = None
+        self.token = None
+        self.waiters = {}  # tipo esperado ou nonce de chat -> future
+        self.reader = None
+
+    async def send(self, data: dict):
+        await self.ws.send(json.dumps(data))
+        self.stats.sent += 1
+
+    async def request(self, data: dict, expect: str):
+        """Envia e espera a resposta do tipo `expect` (ou um erro); devolve (resposta, latência)."""
+        fut = asyncio.get_running_loop().create_future()
+        self.waiters[expect] = fut
+        t0 = time.perf_counter()
+        await self.send(data)
+        try:
+            reply = await asyncio.wait_for(fut, self.args.timeout)
+        finally:
+            self.waiters.pop(expect, None)
+        return reply, time.perf_counter() - t0
+
+    async def read_loop(self):
+        try:
+            async for raw in self.ws:
+                self.stats.received += 1
+                data = json.loads(raw)
+                t = data.get("type")
+                if t == "error":
+                    if data.get("retry_after") is not None:
+                        self.stats.busy += 1
+                    # o erro responde ao pedido em aberto; quem pediu decide se conta
+                    pending = [f for f in self.waiters.values() if not f.done()]
+                    for fut in pending:
+                        fut.set_result(data)
+                    if not pending:
+                        self.stats.error(data.get("message", "?"))
+                    continue
+                if t == "chat" and data.get("user") == self.username:
+                    fut = self.waiters.get(data.get("message"))
+                elif t == "redirect":
+                    fut = self.waiters.get("room_joined")
+                else:
+                    fut = self.waiters.get(t)
+                if fut is not None and not fut.done():
+                    fut.set_result(data)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def request_retry(self, data: dict, expect: str):
+        """Como request(), mas respeita o retry_after de "servidor ocupado"."""
+        for _ in range(self.args.max_retries):
+            reply, dt = await self.request(data, expect)
+            if reply.get("retry_after") is None:
+                return reply, dt
+            self.stats.error(reply.get("message", "?"))
+            # espera o tempo sugerido com jitter, para não voltarem todos juntos
+            await asyncio.sleep(reply["retry_after"] * (1 + self.rng.random()))
+        return await self.request(data, expect)
+
+    async def login(self) -> bool:
+        password = self.args.password
+        # registro falha se o usuário já existe de uma rodada anterior; tudo bem
+        await self.request_retry({"type": "register", "user": self.username, "pass": password}, "register_ok")
+        reply, dt = await self.request_retry({"type": "login", "user": self.username, "pass": password}, "login_ok")
+        if reply.get("type") != "login_ok":
+            self.stats.error(reply.get("message", "?"))
+            return False
+        self.stats.observe("login_ok", dt)
+        self.token = reply.get("token")
+        return True
+
+    async def join(self, room: str) -> bool:
+        reply, dt = await self.request({"type": "create_room", "room": room}, "room_joined")
+        if reply.get("type") == "redirect":
+            reply, dt2 = await self.follow_redirect(reply)
+            dt += dt2
+        if reply.get("type") != "room_joined":
+            self.stats.error(reply.get("message", "?"))
+            return False
+        self.stats.observe("room_joined", dt)
+        return True
+
+    async def follow_redirect(self, redirect: dict):
+        """Sala de outro shard (cluster.py): reconecta na porta direta do dono e retoma a sessão."""
+        self.stats.redirects += 1
+        self.reader.cancel()
+        await self.ws.close()
+        url = redirect_url(self.args.url, redirect["port"])
+        self.ws = await websockets.connect(url, open_timeout=self.args.timeout)
+        self.reader = asyncio.create_task(self.read_loop())
+        resume = {"type": "resume", "token": self.token, "room": redirect["room"]}
+        if redirect.get("create"):
+            resume["create"] = True
+        return await self.request(resume, "room_joined")
+
+    async def chat(self, room: str, seq: int):
+        nonce = f"{self.username}:{seq}"
+        reply, dt = await self.request({"type": "chat", "room": room, "message": nonce}, nonce)
+        if reply.get("type") == "chat":
+            self.stats.observe("chat_echo", dt)
+        else:
+            self.stats.error(reply.get("message", "?"))
+
+    def pick_room(self) -> str:
+        return f"{self.args.room_prefix}{self.rng.randrange(self.args.rooms)}"
+
+    async def run(self, deadline: float):
+        self.stats.clients_started += 1
+        try:
+            self.ws = await websockets.connect(self.args.url, open_timeout=self.args.timeout)
+        except Exception:
+            self.stats.connect_failures += 1
+            return
+        self.reader = asyncio.create_task(self.read_loop())
+        try:
+            if not await self.login():
+                return
+            self.stats.clients_ok += 1
+            room = self.pick_room()
+            if not await self.join(room):
+                return
+            seq = 0
+            while time.monotonic() < deadline:
+                if self.scenario == "lurker":
+                    await asyncio.sleep(min(1.0, max(0.0, deadline - time.monotonic())))
+                    continue
+                gap = self.rng.expovariate(1.0 / self.args.chat_interval)
+                await asyncio.sleep(max(self.args.min_chat_gap, gap))
+                if time.monotonic() >= deadline:
+                    break
+                if self.scenario == "churn" and self.rng.random() < self.args.churn_prob:
+                    await self.send({"type": "leave_room"})
+                    room = self.pick_room()
+                    if not await self.join(room):
+                        return
+                    continue
+                seq += 1
+                await self.chat(room, seq)
+        except asyncio.TimeoutError:
+            self.stats.error("timeout")
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            if self.ws.close_code is not None and time.monotonic() < deadline:
+                self.stats.disconnects += 1
+            self.reader.cancel()
+            await self.ws.close()
+
+
+async def run_load(args) -> dict:
+    rng = random.Random(args.seed)
+    stats = Stats()
+    names = list(args.mix)
+    weights = [args.mix[n] for n in names]
+
+    t0 = time.monotonic()
+    deadline = t0 + args.duration
+    tasks = []
+    for i in range(args.clients):
+        scenario = rng.choices(names, weights)[0]
+        client = SimClient(i, scenario, args, stats, random.Random(rng.random()))
+        tasks.append(asyncio.create_task(client.run(deadline)))
+        if args.rate > 0:
+            # chegadas de Poisson com a taxa pedida
+            await asyncio.sleep(rng.expovariate(args.rate))
+    await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.monotonic() - t0
+
+    return {
+        "config": {
+            "url": args.url,
+            "clients": args.clients,
+            "rate": args.rate,
+            "duration": args.duration,
+            "mix": args.mix,
+            "rooms": args.rooms,
+            "chat_interval": args.chat_interval,
+            "seed": args.seed,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": stats.report(elapsed),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Gerador de carga para o servidor de Truco")
+    ap.add_argument("--url", default=SERVER_URL)
+    ap.add_argument("--clients", type=int, default=100)
+    ap.add_argument("--rate", type=float, default=50.0, help="chegadas por segundo (0 = todos de uma vez)")
+    ap.add_argument("--duration", type=float, default=30.0, help="segundos de carga a partir do início")
+    ap.add_argument("--mix", type=parse_mix, default=parse_mix("chatter=0.7,lurker=0.2,churn=0.1"))
+    ap.add_argument("--rooms", type=int, default=50)
+    ap.add_argument("--room-prefix", default="load-")
+    ap.add_argument("--chat-interval", type=float, default=2.0, help="média de segundos entre mensagens")
+    ap.add_argument("--min-chat-gap", type=float, default=0.4, help="fica abaixo do limite de chat por conexão do servidor")
+    ap.add_argument("--churn-prob", type=float, default=0.2)
+    ap.add_argument("--prefix", default="load", help="prefixo dos usuários simulados")
+    ap.add_argument("--password", default="loadtest")
+    ap.add_argument("--timeout", type=float, default=10.0)
+    ap.add_argument("--max-retries", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="arquivo JSON de saída (padrão: stdout)")
+    args = ap.parse_args()
+
+    result = asyncio.run(run_load(args))
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""Reconexão dos clientes Tk: backoff exponencial com jitter total e fila de saída.
+
+Quando o servidor cai, todos os clientes perdem a conexão no mesmo instante;
+se tentassem voltar em intervalos fixos, chegariam todos juntos de novo. Com
+jitter total cada um espera um tempo sorteado entre 0 e o teto da tentativa,
+e nunca menos que o retry_after que o servidor tenha pedido.
+"""
+import random
+from collections import deque
+
+RECONNECT_BASE_SECONDS = 0.5
+RECONNECT_MAX_SECONDS = 30.0
+# mensagens guardadas enquanto desconectado (as mais antigas saem primeiro)
+OUTBOX_MAX = 200
+
+
+def backoff_delay(attempt: int, retry_after: float = 0.0, base: float = RECONNECT_BASE_SECONDS,
+                  cap: float = RECONNECT_MAX_SECONDS, rng=random) -> float:
+    """Espera antes da tentativa `attempt` (0 = primeira): uniforme em [0, min(cap, base*2^n)]."""
+    delay = rng.uniform(0, min(cap, base * (2 ** min(attempt, 32))))
+    return max(delay, retry_after)
+
+
+def new_outbox() -> deque:
+    return deque(maxlen=OUTBOX_MAX)
@@ -1,16 +1,274 @@
+"""Inspeção e carga em massa da tabela de usuários.
+
+Sem argumentos lista as tabelas e os usuários (como sempre fez). Os
+subcomandos trabalham em streaming, com memória constante:
+
+    python inspect_db.py export --out users.jsonl       # ou .csv, ou - (stdout)
+    python inspect_db.py import users.jsonl --workers 8 # senha em claro é hasheada em paralelo
+
+Cada registro tem username e password_hash (já pronto, como o export gera)
+ou password (em claro); role e created_at são opcionais. username e
+password seguem as mesmas regras do registro no servidor (accounts.py) e
+password_hash precisa estar no formato alg$custo$salt$dk do servidor, com
+custo dentro da faixa aceita; o resto conta como inválido.
+
+Um servidor já rodando não fica sabendo do import: usuários que ele tem no
+cache continuam com os dados antigos por até USER_CACHE_TTL_SECONDS.
+"""
+import argparse
+import csv
+import json
+import os
 import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "server"))
+
+from accounts import validate_password, validate_username  # noqa: E402
+from database import DB_PATH, migrate  # noqa: E402
+from hashing import DEFAULT_TARGET_MS, HashParams, calibrate, hash_password, parse_hash  # noqa: E402
+
+EXPORT_COLUMNS = ("id", "username", "password_hash", "role", "created_at")
+SELECT_EXPORT = "SELECT id, username, password_hash, role, created_at FROM users ORDER BY id"
+INSERT_IMPORT = {
+    "skip": "INSERT OR IGNORE INTO users (username, password_hash, role, created_at) "
+            "VALUES (?, ?, ?, COALESCE(?, datetime('now')))",
+    "replace": "INSERT INTO users (username, password_hash, role, created_at) "
+               "VALUES (?, ?, ?, COALESCE(?, datetime('now'))) "
+               "ON CONFLICT(username) DO UPDATE SET password_hash = excluded.password_hash, role = excluded.role",
+    "fail": "INSERT INTO users (username, password_hash, role, created_at) "
+            "VALUES (?, ?, ?, COALESCE(?, datetime('now')))",
+}
+ROLES = ("user", "admin")
+PROGRESS_SECONDS = 2.0
+
+
+def open_db(path):
+    conn = sqlite3.connect(str(path), isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+def detect_format(path: str, fmt: str | None) -> str:
+    if fmt:
+        return fmt
+    return "csv" if path.endswith(".csv") else "jsonl"
+
+
+class Progress:
+    """Linha de progresso no stderr a cada PROGRESS_SECONDS e um resumo no fim."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.started = self.last = time.perf_counter()
+
+    def add(self, n: int, **extra):
+        self.count += n
+        now = time.perf_counter()
+        if now - self.last >= PROGRESS_SECONDS:
+            self.last = now
+            self._print(now, extra)
+
+    def done(self, **extra):
+        self._print(time.perf_counter(), extra)
+
+    def _print(self, now: float, extra: dict):
+        elapsed = max(now - self.started, 1e-9)
+        more = "".join(f" {k}={v}" for k, v in extra.items())
+        print(f"{self.label}: {self.count} linhas em {elapsed:.1f}s ({self.count / elapsed:.0f}/s){more}",
+              file=sys.stderr)
+
+
+# ----- listagem -----
+
+def show(conn):
+    print("Tabelas:")
+    for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name;"):
+        print(" -", row[0])
+
+    print("\nUsers:")
+    for row in conn.execute("SELECT id, username FROM users ORDER BY id;"):
+        print(row)
+
+
+# ----- export -----
+
+def export_users(conn, out, fmt: str, batch: int):
+    # o cursor do sqlite anda passo a passo no arquivo: fetchmany nunca carrega a tabela toda
+    progress = Progress("export")
+    cur = conn.execute(SELECT_EXPORT)
+    writer = csv.writer(out) if fmt == "csv" else None
+    if writer:
+        writer.writerow(EXPORT_COLUMNS)
+    while True:
+        rows = cur.fetchmany(batch)
+        if not rows:
+            break
+        if writer:
+            writer.writerows(rows)
+        else:
+            out.writelines(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n" for row in rows)
+        progress.add(len(rows))
+    progress.done()
+
+
+# ----- import -----
+
+def read_records(path: str, fmt: str):
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+    try:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def chunks(records, size: int):
+    chunk = []
+    for rec in records:
+        chunk.append(rec)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def prepare(chunk: list, hash_many) -> tuple[list, int]:
+    """Registros -> linhas do INSERT; senhas em claro vão para hash_many (pool de hashing)."""
+    rows, plain, invalid = [], [], 0
+    for rec in chunk:
+        username = rec.get("username")
+        username = username.strip() if isinstance(username, str) else ""
+        password_hash, password = rec.get("password_hash"), rec.get("password")
+        role = rec.get("role") or "user"
+        if validate_username(username) or role not in ROLES:
+            invalid += 1
+            continue
+        if password_hash:
+            if not isinstance(password_hash, str) or parse_hash(password_hash) is None:
+                invalid += 1  # malformado ou custo absurdo (travaria o login no servidor)
+                continue
+        elif not isinstance(password, str) or validate_password(password):
+            invalid += 1  # senha que o servidor recusaria no login
+            continue
+        row = [username, password_hash or None, role, rec.get("created_at") or None]
+        if not password_hash:
+            plain.append((row, password))
+        rows.append(row)
+    if plain:
+        for (row, _), hashed in zip(plain, hash_many([p for _, p in plain])):
+            row[1] = hashed
+    return rows, invalid
+
+
+def hash_params_from_env() -> HashParams:
+    """Mesmos parâmetros do servidor (HASH_ALG/HASH_COST, ou calibra para HASH_TARGET_MS)."""
+    alg = os.environ.get("HASH_ALG", "pbkdf2_sha256")
+    cost = int(os.environ.get("HASH_COST") or 0)
+    if cost > 0:
+        return HashParams(alg, cost)
+    return calibrate(float(os.environ.get("HASH_TARGET_MS") or DEFAULT_TARGET_MS), alg)
+
+
+def import_users(conn, records, on_conflict: str, batch: int, txn_rows: int, workers: int):
+    sql = INSERT_IMPORT[on_conflict]
+    executor = params = None  # pool e calibração só se aparecer senha em claro
+    progress = Progress("import")
+    inserted = invalid = 0
+    in_txn = 0
+
+    def hash_many(passwords: list):
+        nonlocal executor, params
+        if executor is None:
+            params = hash_params_from_env()
+            executor = ProcessPoolExecutor(max_workers=workers)
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return executor.map(partial(hash_password, params=params), passwords, chunksize=chunksize)
+
+    try:
+        for chunk in chunks(records, batch):
+            rows, bad = prepare(chunk, hash_many)
+            invalid += bad
+            if in_txn == 0:
+                conn.execute("BEGIN")
+            before = conn.total_changes
+            conn.executemany(sql, rows)
+            inserted += conn.total_changes - before
+            in_txn += len(rows)
+            if in_txn >= txn_rows:
+                conn.execute("COMMIT")
+                in_txn = 0
+            progress.add(len(chunk), gravadas=inserted, invalidas=invalid)
+        if in_txn:
+            conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")  # só a transação em andamento; as anteriores ficam
+        raise
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    progress.done(gravadas=inserted, ignoradas=progress.count - inserted - invalid, invalidas=invalid)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspeção e import/export da tabela de usuários")
+    ap.add_argument("--db", default=str(DB_PATH))
+    sub = ap.add_subparsers(dest="cmd")
 
-DB = "data/truco.db"
+    exp = sub.add_parser("export", help="exporta usuários em JSONL ou CSV")
+    exp.add_argument("--out", default="-", help="arquivo de saída (- = stdout)")
+    exp.add_argument("--format", choices=("jsonl", "csv"))
+    exp.add_argument("--batch", type=int, default=5000)
 
-conn = sqlite3.connect(DB)
-cur = conn.cursor()
+    imp = sub.add_parser(
+        "import", help="importa usuários de JSONL ou CSV",
+        description="Importa usuários de JSONL ou CSV. Um servidor rodando não é avisado: usuários "
+                    "que ele já tem em cache só enxergam o import quando a entrada vence "
+                    "(USER_CACHE_TTL_SECONDS, 300s por padrão).")
+    imp.add_argument("path", help="arquivo de entrada (- = stdin)")
+    imp.add_argument("--format", choices=("jsonl", "csv"))
+    imp.add_argument("--batch", type=int, default=2000, help="registros por executemany")
+    imp.add_argument("--txn-rows", type=int, default=100_000, help="linhas por transação")
+    imp.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processos de hashing")
+    imp.add_argument("--on-conflict", choices=tuple(INSERT_IMPORT), default="skip",
+                     help="usuário que já existe: ignora, substitui hash/role ou aborta")
+    args = ap.parse_args()
 
-print("Tabelas:")
-for row in cur.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name;"):
-    print(" -", row[0])
+    if args.cmd == "import":
+        migrate(args.db)  # permite semear um banco novo
+    conn = open_db(args.db)
+    try:
+        if args.cmd == "export":
+            fmt = detect_format(args.out, args.format)
+            out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8", newline="")
+            try:
+                export_users(conn, out, fmt, args.batch)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+        elif args.cmd == "import":
+            fmt = detect_format(args.path, args.format)
+            import_users(conn, read_records(args.path, fmt), args.on_conflict,
+                         args.batch, args.txn_rows, max(1, args.workers))
+        else:
+            show(conn)
+    finally:
+        conn.close()
 
-print("\nUsers:")
-for row in cur.execute("SELECT id, username FROM users ORDER BY id;"):
-    print(row)
 
-conn.close()
+if __name__ == "__main__":
+    main()
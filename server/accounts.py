@@ -0,0 +1,31 @@
+"""Regras de nome de usuário e senha.
+
+Ficam fora do server.py para o inspect_db.py validar um import com as
+mesmas regras do registro sem subir o servidor.
+"""
+
+USERNAME_MIN = 3
+USERNAME_MAX = 20
+
+PASSWORD_MIN = 5
+PASSWORD_MAX = 20  # se quiser, mude para 64
+
+BOT_PREFIX = "bot#"  # reservado: humanos não registram nomes assim
+
+
+def validate_len(field: str, value: str, min_len: int, max_len: int) -> str | None:
+    if not (min_len <= len(value) <= max_len):
+        return f"{field} deve ter entre {min_len} e {max_len} caracteres"
+    return None
+
+
+def validate_username(username: str) -> str | None:
+    """Erro para mostrar ao usuário, ou None se o nome pode ser registrado."""
+    err = validate_len("Usuário", username, USERNAME_MIN, USERNAME_MAX)
+    if not err and username.startswith(BOT_PREFIX):
+        err = "Nome de usuário reservado"
+    return err
+
+
+def validate_password(password: str) -> str | None:
+    return validate_len("Senha", password, PASSWORD_MIN, PASSWORD_MAX)
@@ -0,0 +1,83 @@
+"""Benchmark dos robôs: simulações Monte Carlo por segundo, por núcleo.
+
+Gera posições reais (início de mão, 2 e 4 jogadores) e roda simulate() com o
+orçamento pedido, primeiro num processo só e depois em paralelo com um worker
+por núcleo.
+
+Exemplo:
+    python server/bench_bots.py --think-ms 200 --decisions 20 --workers 4
+"""
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bots import DEFAULT_BATCH, simulate
+from table import Table
+
+
+def sample_views(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    views = []
+    for i in range(count):
+        n = 2 if i % 2 == 0 else 4
+        table = Table([f"p{s}" for s in range(n)], seed=rng.randrange(1 << 62))
+        table.start_hand()
+        views.append(table.view(table.match.actor()))
+    return views
+
+
+def _run(views, think_ms, batch, seed):
+    sims = 0
+    t0 = time.perf_counter()
+    for i, view in enumerate(views):
+        sims += simulate(view, think_ms, seed + i, batch=batch)["sims"]
+    return sims, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark dos robôs Monte Carlo")
+    ap.add_argument("--think-ms", type=float, default=200.0)
+    ap.add_argument("--decisions", type=int, default=20)
+    ap.add_argument("--batch", type=int, default=DEFAULT_BATCH)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    views = sample_views(args.decisions, args.seed)
+    _run(views[:1], 10, args.batch, args.seed)  # aquece imports e caches do NumPy
+
+    sims, elapsed = _run(views, args.think_ms, args.batch, args.seed)
+    single = sims / elapsed
+
+    chunks = [views[i::args.workers] for i in range(args.workers)]
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(_run, chunks, [args.think_ms] * args.workers,
+                                [args.batch] * args.workers, [args.seed] * args.workers))
+    wall = time.perf_counter() - t0
+    total = sum(r[0] for r in results)
+
+    print(json.dumps({
+        "think_ms": args.think_ms,
+        "batch": args.batch,
+        "decisions": args.decisions,
+        "single_process": {
+            "sims": sims,
+            "elapsed_s": round(elapsed, 3),
+            "sims_per_s": round(single),
+        },
+        "pool": {
+            "workers": args.workers,
+            "sims": total,
+            "wall_s": round(wall, 3),
+            "sims_per_s": round(total / wall),
+            "sims_per_s_per_core": round(total / wall / args.workers),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Benchmark do matchmaking: vazão e tempo até a partida.
+
+Simula chegadas na fila (rating ~ normal, mistura de 1x1 e 2x2, parte
+desistindo) num relógio simulado com um tick por segundo, como no
+servidor. Mede o custo real de CPU por operação e o tempo de espera
+simulado. Depois mede uma rajada: N jogadores entrando de uma vez.
+
+Exemplo:
+    python server/bench_matchmaking.py --rate 2000 --seconds 60 --burst 100000
+"""
+import argparse
+import json
+import random
+import time
+
+from matchmaking import Matchmaker
+
+
+class SimClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def percentile(sorted_values, p: float):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, round(p / 100.0 * (len(sorted_values) - 1))))
+    return round(sorted_values[k], 3)
+
+
+def steady(args) -> dict:
+    rng = random.Random(args.seed)
+    clock = SimClock()
+    mm = Matchmaker(args.bucket_width, args.widen, args.max_window, clock=clock)
+    joined = {}
+    waits = []
+    spreads = []
+    next_id = 0
+    ops = 0
+    peak = 0
+    cpu = 0.0
+
+    def record(group):
+        for t in group:
+            waits.append(clock.now - joined.pop(t.key))
+        ratings = [t.rating for t in group]
+        spreads.append(max(ratings) - min(ratings))
+
+    step = 1.0 / args.steps_per_second
+    for s in range(int(args.seconds * args.steps_per_second)):
+        clock.now = s * step
+        arrivals = [
+            (next_id + i, rng.gauss(1500, 300), 4 if rng.random() < args.share_2v2 else 2)
+            for i in range(int(args.rate * step))
+        ]
+        next_id += len(arrivals)
+        leaving = [k for k in joined if rng.random() < args.cancel * step] if joined else []
+        t0 = time.perf_counter()
+        for key, rating, mode in arrivals:
+            joined[key] = clock.now
+            group = mm.enqueue(key, rating, mode)
+            if group:
+                record(group)
+        for key in leaving:
+            if mm.cancel(key):
+                joined.pop(key, None)
+        if s % args.steps_per_second == 0:
+            for group in mm.tick():
+                record(group)
+        cpu += time.perf_counter() - t0
+        ops += len(arrivals) + len(leaving)
+        peak = max(peak, len(mm))
+
+    waits.sort()
+    spreads.sort()
+    return {
+        "arrivals": next_id,
+        "matched": mm.matched,
+        "cancelled": mm.cancelled,
+        "still_queued": len(mm),
+        "peak_queue": peak,
+        "ops_per_cpu_s": round(ops / cpu) if cpu else None,
+        "wait_s": {"p50": percentile(waits, 50), "p95": percentile(waits, 95),
+                   "p99": percentile(waits, 99), "max": percentile(waits, 100)},
+        "rating_spread": {"p50": percentile(spreads, 50), "p95": percentile(spreads, 95),
+                          "max": percentile(spreads, 100)},
+    }
+
+
+def burst(args) -> dict:
+    rng = random.Random(args.seed + 1)
+    clock = SimClock()
+    mm = Matchmaker(args.bucket_width, args.widen, args.max_window, clock=clock)
+    players = [(i, rng.gauss(1500, 300), 4 if rng.random() < args.share_2v2 else 2) for i in range(args.burst)]
+    t0 = time.perf_counter()
+    for key, rating, mode in players:
+        mm.enqueue(key, rating, mode)
+    enqueue_s = time.perf_counter() - t0
+    left = len(mm)
+    ticks = 0
+    t0 = time.perf_counter()
+    while len(mm) and ticks < 60:
+        clock.now += 1.0
+        mm.tick()
+        ticks += 1
+    return {
+        "players": args.burst,
+        "enqueue_per_s": round(args.burst / enqueue_s),
+        "left_after_enqueue": left,
+        "ticks_to_drain": ticks,
+        "tick_cpu_ms": round((time.perf_counter() - t0) * 1000 / max(ticks, 1), 3),
+        "unmatched": len(mm),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark do matchmaking por faixa de rating")
+    ap.add_argument("--rate", type=float, default=2000.0, help="chegadas por segundo simulado")
+    ap.add_argument("--seconds", type=float, default=60.0)
+    ap.add_argument("--steps-per-second", type=int, default=10)
+    ap.add_argument("--share-2v2", type=float, default=0.3)
+    ap.add_argument("--cancel", type=float, default=0.01, help="chance por segundo de desistir")
+    ap.add_argument("--burst", type=int, default=100_000)
+    ap.add_argument("--bucket-width", type=float, default=100.0)
+    ap.add_argument("--widen", type=float, default=20.0)
+    ap.add_argument("--max-window", type=float, default=400.0)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    print(json.dumps({"steady": steady(args), "burst": burst(args)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
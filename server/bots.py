@@ -0,0 +1,390 @@
+"""Jogadores robôs: decidem jogadas e apostas por Monte Carlo.
+
+Para cada decisão sorteiam-se as mãos escondidas (cartas que o robô não viu),
+e o resto da mão é simulado em lotes vetorizados com NumPy. As simulações
+rodam num pool de processos, com orçamento de tempo por decisão, para nunca
+travar o event loop.
+"""
+import asyncio
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from truco import ENVIDO_TABLE, NUM_CARDS, PARDA, STRENGTH, TRUCO_POINTS
+
+STRENGTH_NP = np.frombuffer(STRENGTH, dtype=np.uint8).astype(np.int16)
+ENVIDO_NP = np.frombuffer(ENVIDO_TABLE, dtype=np.uint8)
+
+DEFAULT_BATCH = 2048
+
+# limiares de decisão (probabilidade de ganhar a mão / o envido)
+TRUCO_CALL_P = 0.66
+TRUCO_RAISE_P = 0.82
+ENVIDO_CALL_P = 0.62
+REAL_ENVIDO_P = 0.78
+FALTA_ENVIDO_P = 0.92
+ENVIDO_ACCEPT_P = 0.45
+
+
+def log(msg):
+    print(f"[BOTS] {msg}")
+
+
+class _Sample:
+    """Um lote de mundos possíveis consistentes com o que o robô já viu."""
+
+    def __init__(self, view: dict, rng, size: int):
+        n = view["seats"]
+        me = view["seat"]
+        tricks = view["tricks"]
+        seen = set(view["cards"])
+        for row in tricks:
+            seen.update(c for c in row if c >= 0)
+        unseen = np.array([c for c in range(NUM_CARDS) if c not in seen], dtype=np.int16)
+
+        hidden = [0 if s == me else view["cards_left"][s] for s in range(n)]
+        total = sum(hidden)
+        keys = rng.random((size, len(unseen)))
+        drawn = unseen[np.argsort(keys, axis=1)[:, :total]]
+
+        # cartas na mão de cada assento (N, n, 3); -1 = sem carta
+        self.cards = np.full((size, n, 3), -1, dtype=np.int16)
+        col = 0
+        for s in range(n):
+            if s == me:
+                self.cards[:, s, :len(view["cards"])] = view["cards"]
+            elif hidden[s]:
+                self.cards[:, s, :hidden[s]] = drawn[:, col:col + hidden[s]]
+                col += hidden[s]
+        self.size = size
+        self.n = n
+
+
+def _strengths(cards):
+    st = STRENGTH_NP[np.where(cards >= 0, cards, 0)]
+    return np.where(cards >= 0, st, 0)
+
+
+def _hand_winner(tw, t_done, mano_team):
+    """Vencedor da mão (vetorizado) a partir das rodadas completadas; -1 se indefinido."""
+    n = tw.shape[0]
+    out = np.full(n, -1, dtype=np.int8)
+    if t_done < 2:
+        return out
+    r0, r1 = tw[:, 0], tw[:, 1]
+    two = np.where(r0 == PARDA, np.where(r1 != PARDA, r1, -1), np.where((r1 == r0) | (r1 == PARDA), r0, -1))
+    out[:] = two
+    if t_done >= 3:
+        r2 = tw[:, 2]
+        both_parda = (r0 == PARDA) & (r1 == PARDA)
+        three = np.where(both_parda, np.where(r2 != PARDA, r2, mano_team), np.where(r2 == PARDA, r0, r2))
+        out = np.where(out == -1, three, out).astype(np.int8)
+    return out
+
+
+def _rollout(view: dict, sample: _Sample, forced_card: int | None):
+    """Joga o resto da mão com uma política gulosa; devolve o time vencedor por mundo."""
+    n = sample.n
+    size = sample.size
+    me = view["seat"]
+    rows = np.arange(size)
+    strengths = _strengths(sample.cards)  # (N, n, 3), 0 = vazio
+
+    t = view["trick"]
+    tw = np.full((size, 3), -1, dtype=np.int8)
+    for i, w in enumerate(view["trick_winners"]):
+        tw[:, i] = w
+    mano_team = view["mano"] & 1
+
+    row = view["tricks"][t] if t < len(view["tricks"]) else [-1] * n
+    played_now = sum(1 for c in row if c >= 0)
+    leader = np.full(size, (view["turn"] - played_now) % n, dtype=np.int64)
+    best = np.zeros(size, dtype=np.int16)
+    best_team = np.full(size, -1, dtype=np.int8)
+    best_seat = leader.copy()
+    for k in range(played_now):
+        s = (int(leader[0]) + k) % n
+        v = STRENGTH_NP[row[s]]
+        beat = v > best
+        tie = (v == best) & (best_team != (s & 1))
+        best = np.where(beat, v, best)
+        best_seat = np.where(beat, s, best_seat)
+        best_team = np.where(beat, s & 1, np.where(tie, PARDA, best_team)).astype(np.int8)
+
+    winner = _hand_winner(tw, t, mano_team)
+    # a carta candidata é a próxima que o robô jogar, seja nesta rodada ou na seguinte
+    forced = np.full(size, forced_card is not None)
+    if forced_card is not None:
+        forced_v = STRENGTH_NP[forced_card]
+        forced_idx = np.argmax(sample.cards[:, me, :] == forced_card, axis=1)
+    while t < 3:
+        for k in range(played_now, n):
+            seat = (leader + k) % n
+            hand = strengths[rows, seat]  # (N, 3)
+            team = (seat & 1).astype(np.int8)
+            big = np.where(hand > 0, hand, 99)
+            lowest = np.argmin(big, axis=1)
+            beats = np.where(hand > best[:, None], hand, 99)
+            lowest_beat = np.argmin(beats, axis=1)
+            can_beat = beats[rows, lowest_beat] < 99
+            partner_winning = best_team == team
+            idx = np.where(partner_winning | ~can_beat, lowest, lowest_beat)
+            v = hand[rows, idx]
+            if forced_card is not None:
+                use = forced & (seat == me)
+                idx = np.where(use, forced_idx, idx)
+                v = np.where(use, forced_v, v)
+                forced &= seat != me
+            strengths[rows, seat, idx] = 0
+            beat = v > best
+            tie = (v == best) & (best_team != team)
+            best = np.where(beat, v, best)
+            best_seat = np.where(beat, seat, best_seat)
+            best_team = np.where(beat, team, np.where(tie, PARDA, best_team)).astype(np.int8)
+        tw[:, t] = best_team
+        leader = np.where(best_team != PARDA, best_seat, leader)
+        t += 1
+        decided = _hand_winner(tw, t, mano_team)
+        winner = np.where(winner == -1, decided, winner)
+        best = np.zeros(size, dtype=np.int16)
+        best_team = np.full(size, -1, dtype=np.int8)
+        best_seat = leader.copy()
+        played_now = 0
+    return winner
+
+
+def _envido_win_rate(view: dict, sample: _Sample) -> float:
+    """Chance do time do robô ter o maior envido (empates contam meio)."""
+    n = sample.n
+    me = view["seat"]
+    row0 = view["tricks"][0] if view["tricks"] else [-1] * n
+    best = {0: None, 1: None}
+    for s in range(n):
+        if s == me:
+            env = np.full(sample.size, view["envido"], dtype=np.int16)
+        else:
+            hand = sample.cards[:, s, :].copy()
+            if row0[s] >= 0:
+                hand[:, 2] = row0[s]  # a carta já jogada também conta no envido
+            env = ENVIDO_NP[hand[:, 0] * 1600 + hand[:, 1] * 40 + hand[:, 2]].astype(np.int16)
+        team = s & 1
+        best[team] = env if best[team] is None else np.maximum(best[team], env)
+    mine, theirs = best[view["team"]], best[1 - view["team"]]
+    return float(np.mean(mine > theirs) + 0.5 * np.mean(mine == theirs))
+
+
+def simulate(view: dict, think_ms: float, seed: int, batch: int = DEFAULT_BATCH) -> dict:
+    """Roda lotes até esgotar o orçamento; devolve P(ganhar) por carta e do envido."""
+    rng = np.random.default_rng(seed)
+    cards = view["cards"]
+    wins = np.zeros(len(cards))
+    no_card = 0
+    env_rate = 0.0
+    sims = 0
+    batches = 0
+    deadline = time.perf_counter() + think_ms / 1000.0
+    want_envido = any(a in view["legal"] for a in ("envido", "real_envido", "falta_envido")) or view["pending"] == "envido"
+    while True:
+        sample = _Sample(view, rng, batch)
+        for i, c in enumerate(cards):
+            winner = _rollout(view, sample, c)
+            wins[i] += np.count_nonzero(winner == view["team"])
+            sims += batch
+        if not cards:
+            # já jogou tudo na rodada atual: só estima a mão
+            no_card += np.count_nonzero(_rollout(view, sample, None) == view["team"])
+            sims += batch
+        if want_envido:
+            env_rate += _envido_win_rate(view, sample)
+        batches += 1
+        if time.perf_counter() >= deadline:
+            break
+    total = batches * batch
+    return {
+        "per_card": (wins / total).tolist(),
+        "p_hand": float(wins.max() / total) if cards else no_card / total,
+        "envido": env_rate / batches if want_envido else None,
+        "sims": sims,
+    }
+
+
+def choose(view: dict, est: dict) -> tuple:
+    """Transforma as estimativas numa ação legal: (ação, carta)."""
+    legal = view["legal"]
+    cards = view["cards"]
+    per_card = est["per_card"]
+    p_hand = est["p_hand"]
+    p_env = est["envido"]
+    pending = view["pending"]
+
+    if "flor" in legal and pending != "flor":
+        return "flor", None
+
+    if pending == "flor":
+        return ("quiero" if view["envido"] >= 30 else "no_quiero"), None
+
+    if pending == "envido":
+        if p_env is not None and p_env >= FALTA_ENVIDO_P and "falta_envido" in legal:
+            return "falta_envido", None
+        if p_env is not None and p_env >= REAL_ENVIDO_P and "real_envido" in legal:
+            return "real_envido", None
+        return ("quiero" if p_env is not None and p_env >= ENVIDO_ACCEPT_P else "no_quiero"), None
+
+    if pending == "truco":
+        # envido está primeiro: aproveita antes de responder o truco
+        if p_env is not None and p_env >= ENVIDO_CALL_P and "envido" in legal:
+            return "envido", None
+        level = view["truco_level"]
+        call = {"truco": 1, "retruco": 2, "vale_quatro": 3}.get(view.get("pending_call"), level + 1)
+        if p_hand >= TRUCO_RAISE_P and "truco" in legal:
+            return "truco", None
+        # aceitar vale a pena se (2p - 1) * novo > -atual
+        new, old = TRUCO_POINTS[call], TRUCO_POINTS[call - 1]
+        return ("quiero" if (2 * p_hand - 1) * new > -old else "no_quiero"), None
+
+    if p_env is not None:
+        if p_env >= FALTA_ENVIDO_P and "falta_envido" in legal:
+            return "falta_envido", None
+        if p_env >= REAL_ENVIDO_P and "real_envido" in legal:
+            return "real_envido", None
+        if p_env >= ENVIDO_CALL_P and "envido" in legal:
+            return "envido", None
+    if p_hand >= TRUCO_CALL_P and "truco" in legal:
+        return "truco", None
+    if "play" in legal and cards:
+        best = max(range(len(cards)), key=lambda i: (per_card[i], -STRENGTH[cards[i]]))
+        return "play", cards[best]
+    return legal[0], None
+
+
+def decide(view: dict, think_ms: float, seed: int) -> dict:
+    """Ponto de entrada no worker: estima e escolhe a ação."""
+    est = simulate(view, think_ms, seed)
+    action, card = choose(view, est)
+    return {"action": action, "card": card, "sims": est["sims"]}
+
+
+def fallback(view: dict) -> tuple:
+    """Ação legal sem pensar (pool falhou ou o servidor recusou): a carta mais fraca, senão a primeira legal."""
+    legal = view["legal"]
+    if "play" in legal and view.get("cards"):
+        return "play", min(view["cards"], key=lambda c: STRENGTH[c])
+    return legal[0], None
+
+
+class BotPool:
+    """Pool de processos onde os robôs pensam; think_ms limita cada decisão."""
+
+    def __init__(self, workers: int | None = None, think_ms: float = 200.0):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.think_ms = think_ms
+        self.decisions = 0
+        self.sims = 0
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def decide(self, view: dict) -> dict:
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._get_executor(), decide, view, self.think_ms, secrets.randbits(63))
+        except BrokenProcessPool:
+            self._executor = None  # um worker morreu: a próxima decisão sobe um pool novo
+            raise
+        self.decisions += 1
+        self.sims += result["sims"]
+        return result
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "think_ms": self.think_ms, "decisions": self.decisions, "sims": self.sims}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class BotConnection:
+    """Participante robô que ocupa o lugar de um websocket na sala.
+
+    O servidor escreve nele como num cliente, mas send recebe o dict (sem
+    JSON); quando o game_state diz que é a vez dele, pensa no pool e devolve
+    a ação por on_action, que entra no mesmo dispatch das mensagens dos
+    humanos. Se o pool falhar ou o servidor recusar a jogada, joga fallback()
+    para a mesa nunca ficar parada esperando por ele.
+    """
+
+    def __init__(self, username: str, pool: BotPool, on_action):
+        self.username = username
+        self.pool = pool
+        self.on_action = on_action
+        self.closed = False
+        self._thinking = None
+        self._turn = None  # (sala, visão) da vez atual, até a próxima visão
+        self._fell_back = False
+
+    async def send(self, data: dict):
+        if self.closed:
+            return
+        t = data.get("type")
+        if t == "game_state":
+            st = data.get("state", {})
+            self._turn = None
+            if st.get("actor") == st.get("seat") and st.get("legal"):
+                self._turn = (data.get("room"), st)
+                self._fell_back = False
+                self._start(self._play(data.get("room"), st))
+        elif t == "error" and self._turn is not None and not self._fell_back:
+            # jogada recusada: tenta uma vez a ação de reserva (se ela também falhar, desiste e avisa)
+            self._fell_back = True
+            room, st = self._turn
+            log(f"{self.username}: jogada recusada ({data.get('message')}), usando a ação de reserva")
+            self._start(self._act(room, *fallback(st)))
+        elif t == "game_over":
+            self._turn = None
+            if self._thinking is not None:
+                self._thinking.cancel()
+
+    def _start(self, coro):
+        # a visão nova pode chegar de dentro da própria jogada (dispatch -> send_game_views):
+        # cancelar a task atual interromperia o servidor no meio do game_action
+        if self._thinking is not None and self._thinking is not asyncio.current_task():
+            self._thinking.cancel()
+        self._thinking = asyncio.get_running_loop().create_task(coro)
+
+    async def _play(self, room: str, state: dict):
+        try:
+            result = await self.pool.decide(state)
+            action, card = result["action"], result["card"]
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            log(f"{self.username}: falha ao decidir ({e!r}), usando a ação de reserva")
+            self._fell_back = True
+            action, card = fallback(state)
+        await self._act(room, action, card)
+
+    async def _act(self, room: str, action: str, card):
+        if self.closed:
+            return
+        msg = {"type": "game_action", "room": room, "action": action}
+        if card is not None:
+            msg["card"] = card
+        try:
+            await self.on_action(self, msg)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log(f"{self.username}: erro ao jogar {msg} ({e!r})")
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self.closed = True
+        if self._thinking is not None:
+            self._thinking.cancel()
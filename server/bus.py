@@ -0,0 +1,259 @@
+"""Barramento local entre os processos do servidor (modo multi-core).
+
+Um hub TCP em 127.0.0.1 (rodando no supervisor, cluster.py) repassa linhas
+JSON entre os shards: sem "to" vai para todos os outros, com "to" só para
+aquele shard. Em cima disso o BusClient oferece publish, send_to e call
+(pedido/resposta com timeout). Se a conexão com o hub cair, o cliente reconecta
+sozinho; um shard que não consome o que o hub manda é desconectado pelo hub.
+"""
+import asyncio
+import itertools
+import json
+
+BUS_HOST = "127.0.0.1"
+CALL_TIMEOUT_SECONDS = 2.0
+RECONNECT_MIN_SECONDS = 0.1
+RECONNECT_MAX_SECONDS = 5.0
+HUB_HIGH_WATER = 1 << 20  # bytes pendentes para um shard antes de esperar o drain
+HUB_DRAIN_SECONDS = 2.0  # shard que não esvazia o buffer nesse tempo é desconectado
+
+
+class BusError(Exception):
+    """O shard chamado respondeu com erro (método inexistente ou que falhou)."""
+
+
+def _line(msg: dict) -> bytes:
+    return json.dumps(msg, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+class BusHub:
+    """Roteador de mensagens entre shards; avisa os outros quando um shard cai."""
+
+    def __init__(self):
+        self.shards = {}  # shard -> StreamWriter
+        self.relayed = 0
+        self.dropped = 0  # shards desconectados por lentidão
+        self._server = None
+
+    async def start(self, host: str, port: int):
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        for writer in self.shards.values():
+            writer.close()
+
+    async def _route(self, raw: bytes, msg: dict, sender: int):
+        to = msg.get("to")
+        if to is not None:
+            targets = [self.shards.get(to)]
+        else:
+            targets = [w for s, w in self.shards.items() if s != sender]
+        slow = []
+        for writer in targets:
+            if writer is not None and not writer.is_closing():
+                writer.write(raw)
+                self.relayed += 1
+                if writer.transport.get_write_buffer_size() > HUB_HIGH_WATER:
+                    slow.append(writer)
+        if slow:
+            await asyncio.gather(*(self._drain(w) for w in slow))
+
+    async def _drain(self, writer):
+        # segura quem enviou até o destino esvaziar; se não esvaziar, derruba o destino
+        # (o _handle dele avisa shard_down e o BusClient de lá reconecta)
+        try:
+            await asyncio.wait_for(writer.drain(), HUB_DRAIN_SECONDS)
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            writer.close()
+        except ConnectionError:
+            pass
+
+    async def _handle(self, reader, writer):
+        shard = None
+        try:
+            hello = json.loads(await reader.readline() or b"{}")
+            shard = hello.get("shard")
+            if shard is None:
+                return
+            old = self.shards.get(shard)
+            if old is not None:
+                old.close()
+            self.shards[shard] = writer
+            async for raw in reader:
+                try:
+                    msg = json.loads(raw)
+                except ValueError:
+                    continue
+                msg["from"] = shard
+                await self._route(_line(msg), msg, shard)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            if shard is not None and self.shards.get(shard) is writer:
+                del self.shards[shard]
+                await self._route(_line({"op": "shard_down", "from": shard}), {}, shard)
+            writer.close()
+
+
+class BusClient:
+    """Conexão de um shard com o hub.
+
+    Handlers registrados com on(op, fn) recebem a mensagem; para op "call" o
+    valor devolvido pelo handler vira a resposta, e uma exceção dele vira
+    BusError em quem chamou. on_reconnect (async, opcional) roda a cada vez que
+    a conexão volta depois de cair.
+    """
+
+    def __init__(self, shard: int, host: str = BUS_HOST, port: int = 0):
+        self.shard = shard
+        self.host = host
+        self.port = port
+        self.handlers = {}  # op -> async fn(msg)
+        self.methods = {}  # nome -> async fn(args) -> resultado
+        self.on_reconnect = None
+        self.sent = 0
+        self.received = 0
+        self.reconnects = 0
+        self._writer = None
+        self._reader_task = None
+        self._calls = {}  # id -> future
+        self._ids = itertools.count(1)
+
+    def on(self, op: str, fn):
+        self.handlers[op] = fn
+
+    def method(self, name: str, fn):
+        self.methods[name] = fn
+
+    async def connect(self, retries: int = 50, delay: float = 0.1):
+        for _ in range(retries):
+            try:
+                reader = await self._open()
+                break
+            except OSError:
+                await asyncio.sleep(delay)
+        else:
+            raise ConnectionError(f"barramento indisponível em {self.host}:{self.port}")
+        self._reader_task = asyncio.get_running_loop().create_task(self._run(reader))
+
+    async def _open(self):
+        reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._writer.write(_line({"shard": self.shard}))
+        return reader
+
+    async def _run(self, reader):
+        """Lê do hub e, quando a conexão cai, reconecta com backoff até close()."""
+        while True:
+            try:
+                await self._read_loop(reader)
+            except ConnectionError:
+                pass
+            self._writer.close()
+            # as respostas pendentes vinham pela conexão que caiu
+            self._fail_calls(BusError("conexão com o barramento caiu"))
+            delay = RECONNECT_MIN_SECONDS
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    reader = await self._open()
+                    break
+                except OSError:
+                    delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+            self.reconnects += 1
+            if self.on_reconnect is not None:
+                asyncio.get_running_loop().create_task(self.on_reconnect())
+
+    def _fail_calls(self, exc: Exception):
+        for fut in self._calls.values():
+            if not fut.done():
+                fut.set_exception(exc)
+
+    def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+        for fut in self._calls.values():
+            if not fut.done():
+                fut.cancel()
+
+    def publish(self, op: str, **fields):
+        self._write({"op": op, **fields})
+
+    def send_to(self, shard: int, op: str, **fields):
+        self._write({"op": op, "to": shard, **fields})
+
+    def _write(self, msg: dict):
+        if self._writer is None or self._writer.is_closing():
+            return
+        self._writer.write(_line(msg))
+        self.sent += 1
+
+    async def call(self, shard: int, name: str, timeout: float = CALL_TIMEOUT_SECONDS, **args):
+        call_id = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._calls[call_id] = fut
+        self.send_to(shard, "call", id=call_id, method=name, args=args)
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        finally:
+            self._calls.pop(call_id, None)
+
+    async def call_all(self, shards, name: str, timeout: float = CALL_TIMEOUT_SECONDS, **args) -> dict:
+        """Chama em vários shards ao mesmo tempo; quem não responder fica de fora."""
+        shards = list(shards)
+        results = await asyncio.gather(
+            *(self.call(s, name, timeout=timeout, **args) for s in shards),
+            return_exceptions=True,
+        )
+        return {s: r for s, r in zip(shards, results) if not isinstance(r, BaseException)}
+
+    async def _answer(self, msg: dict):
+        fn = self.methods.get(msg.get("method"))
+        if fn is None:
+            self.send_to(msg["from"], "reply", id=msg.get("id"), error=f"Método desconhecido: {msg.get('method')}")
+            return
+        try:
+            result = await fn(**(msg.get("args") or {}))
+        except Exception as e:
+            # sem resposta quem chamou ficaria esperando até o timeout
+            self.send_to(msg["from"], "reply", id=msg.get("id"), error=f"{type(e).__name__}: {e}")
+            return
+        self.send_to(msg["from"], "reply", id=msg.get("id"), result=result)
+
+    async def _read_loop(self, reader):
+        loop = asyncio.get_running_loop()
+        async for raw in reader:
+            try:
+                msg = json.loads(raw)
+            except ValueError:
+                continue
+            self.received += 1
+            op = msg.get("op")
+            if op == "reply":
+                fut = self._calls.get(msg.get("id"))
+                if fut is None or fut.done():
+                    pass
+                elif "error" in msg:
+                    fut.set_exception(BusError(msg["error"]))
+                else:
+                    fut.set_result(msg.get("result"))
+            elif op == "call":
+                loop.create_task(self._answer(msg))
+            else:
+                fn = self.handlers.get(op)
+                if fn is not None:
+                    loop.create_task(fn(msg))
+
+    def stats(self) -> dict:
+        return {
+            "shard": self.shard,
+            "sent": self.sent,
+            "received": self.received,
+            "reconnects": self.reconnects,
+            "pending_calls": len(self._calls),
+        }
@@ -0,0 +1,93 @@
+"""Supervisor do modo multi-core: sobe N processos server.py na mesma porta.
+
+Cada processo é um shard (SHARD_ID) e escuta a porta pública com
+SO_REUSEPORT, além de uma porta direta própria. O supervisor roda o hub do
+barramento local (bus.py), reinicia shards que caírem e derruba todos no
+SIGTERM/Ctrl+C. SO_REUSEPORT existe no Linux e nos BSDs; no Windows use o
+server.py direto.
+
+Exemplo:
+    python server/cluster.py --workers 4
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+from pathlib import Path
+
+from bus import BUS_HOST, BusHub
+from database import migrate
+from hashing import DEFAULT_TARGET_MS, calibrate
+from sessions import load_or_create_secret
+
+SERVER_PY = Path(__file__).resolve().parent / "server.py"
+RESTART_DELAY_SECONDS = 1.0
+
+
+def log(msg):
+    print(f"[CLUSTER] {msg}")
+
+
+async def run_shard(shard: int, env: dict, stopping: asyncio.Event):
+    while not stopping.is_set():
+        proc = await asyncio.create_subprocess_exec(sys.executable, str(SERVER_PY), env={**env, "SHARD_ID": str(shard)})
+        log(f"Shard {shard} iniciado (pid {proc.pid})")
+        waiter = asyncio.ensure_future(proc.wait())
+        stop = asyncio.ensure_future(stopping.wait())
+        await asyncio.wait({waiter, stop}, return_when=asyncio.FIRST_COMPLETED)
+        if stopping.is_set():
+            if proc.returncode is None:
+                proc.terminate()
+            await waiter
+            return
+        stop.cancel()
+        log(f"Shard {shard} saiu com código {proc.returncode}; reiniciando")
+        await asyncio.sleep(RESTART_DELAY_SECONDS)
+
+
+async def main():
+    ap = argparse.ArgumentParser(description="Servidor de Truco em vários processos")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--bus-port", type=int, default=int(os.environ.get("BUS_PORT", "8865")))
+    args = ap.parse_args()
+
+    # cria a chave de sessão e migra o banco antes dos shards, para não disputarem os arquivos
+    load_or_create_secret()
+    applied = migrate()
+    if applied:
+        log(f"Banco migrado para a versão {applied[-1]}")
+
+    hub = BusHub()
+    await hub.start(BUS_HOST, args.bus_port)
+    log(f"Barramento em {BUS_HOST}:{args.bus_port}; {args.workers} shards")
+
+    cores = os.cpu_count() or 1
+    env = dict(os.environ)
+    env["SHARD_COUNT"] = str(args.workers)
+    env["BUS_PORT"] = str(args.bus_port)
+    # pools por shard dividem os núcleos em vez de cada um pegar todos
+    env.setdefault("HASH_WORKERS", str(max(1, cores // args.workers)))
+    env.setdefault("BOT_WORKERS", str(max(1, cores // args.workers)))
+    if int(env.get("HASH_COST") or 0) <= 0:
+        # calibra uma vez só: shards com custos diferentes refariam os hashes uns dos outros
+        params = calibrate(float(env.get("HASH_TARGET_MS") or DEFAULT_TARGET_MS), env.get("HASH_ALG", "pbkdf2_sha256"))
+        env["HASH_ALG"], env["HASH_COST"] = params.alg, str(params.cost)
+        log(f"Hash de senha calibrado: {params.alg}, custo {params.cost}")
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except (NotImplementedError, AttributeError):
+            pass
+    try:
+        await asyncio.gather(*(run_shard(i, env, stopping) for i in range(args.workers)))
+    finally:
+        hub.close()
+        log("Encerrado.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,62 +1,558 @@
+import asyncio
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent  # .../Truco
 DB_PATH = BASE_DIR / "data" / "truco.db"
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
+SELECT_USER_BY_USERNAME = "SELECT id, username, password_hash, role FROM users WHERE username = ?"
+INSERT_USER = "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)"
+UPDATE_USER_ROLE = "UPDATE users SET role = ? WHERE username = ?"
+DELETE_USER = "DELETE FROM users WHERE username = ?"
+# só troca se ninguém mudou o hash desde a leitura (ex.: troca de senha no meio)
+UPDATE_PASSWORD_HASH = "UPDATE users SET password_hash = ? WHERE username = ? AND password_hash = ?"
+UPSERT_SESSION_NOT_BEFORE = (
+    "INSERT INTO session_revocations (username, not_before) VALUES (?, ?) "
+    "ON CONFLICT(username) DO UPDATE SET not_before = excluded.not_before"
+)
+UPSERT_REVOKED_SESSION = (
+    "INSERT INTO revoked_sessions (sid, until) VALUES (?, ?) "
+    "ON CONFLICT(sid) DO UPDATE SET until = max(until, excluded.until)"
+)
 
-def get_connection():
-    return sqlite3.connect(str(DB_PATH))
 
+def get_connection(path=DB_PATH):
+    return sqlite3.connect(str(path))
 
-def create_tables():
-    with get_connection() as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                role TEXT NOT NULL DEFAULT 'user',
-                created_at TEXT NOT NULL DEFAULT (datetime('now'))
-            )
-        """)
-
-
-def ensure_schema_or_raise():
-    """Falha cedo com mensagem clara se o banco for antigo."""
-    with get_connection() as conn:
-        cur = conn.cursor()
-        cur.execute("PRAGMA table_info(users);")
-        cols = {row[1] for row in cur.fetchall()}  # row[1] = nome da coluna
-    required = {"id", "username", "password_hash", "role", "created_at"}
-    missing = required - cols
-    if missing:
-        raise RuntimeError(
-            "Seu banco está com schema antigo. Apague data/truco.db (e server/truco.db se existir) "
-            f"e rode o servidor de novo. Faltando colunas: {sorted(missing)}"
+
+# ----- migrações -----
+# cada versão roda uma vez, em ordem, numa transação; a versão fica em PRAGMA user_version
+
+
+def _migrate_v1(conn):
+    """Usuários e revogações; bancos antigos ganham as colunas que faltarem."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'user',
+            created_at TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    """)
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(users)")}  # row[1] = nome da coluna
+    if "role" not in cols:
+        conn.execute("ALTER TABLE users ADD COLUMN role TEXT NOT NULL DEFAULT 'user'")
+    if "created_at" not in cols:
+        # ALTER não aceita default não constante: contas antigas ficam com a data da migração
+        conn.execute("ALTER TABLE users ADD COLUMN created_at TEXT NOT NULL DEFAULT ''")
+        conn.execute("UPDATE users SET created_at = datetime('now')")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS session_revocations (
+            username TEXT PRIMARY KEY,
+            not_before REAL NOT NULL
+        )
+    """)
+
+
+def _migrate_v2(conn):
+    """Partidas, resultado por jogador e agregados por jogador (ranking)."""
+    conn.execute("""
+        CREATE TABLE matches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            room TEXT NOT NULL,
+            players INTEGER NOT NULL,
+            started_at REAL NOT NULL,
+            finished_at REAL NOT NULL,
+            winner_team INTEGER NOT NULL,  -- -1 = cancelada
+            score0 INTEGER NOT NULL,
+            score1 INTEGER NOT NULL,
+            reason TEXT,
+            seed INTEGER
         )
+    """)
+    conn.execute("CREATE INDEX matches_finished ON matches (finished_at)")
+    conn.execute("""
+        CREATE TABLE match_players (
+            match_id INTEGER NOT NULL REFERENCES matches(id),
+            seat INTEGER NOT NULL,
+            username TEXT NOT NULL,
+            team INTEGER NOT NULL,
+            result INTEGER NOT NULL,  -- 1 vitória, 0 derrota, -1 cancelada
+            rating_before REAL,
+            rating_after REAL,
+            PRIMARY KEY (match_id, seat)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX match_players_user ON match_players (username, match_id DESC)")
+    conn.execute("""
+        CREATE TABLE player_stats (
+            username TEXT PRIMARY KEY,
+            games INTEGER NOT NULL DEFAULT 0,
+            wins INTEGER NOT NULL DEFAULT 0,
+            losses INTEGER NOT NULL DEFAULT 0,
+            abandoned INTEGER NOT NULL DEFAULT 0,
+            points_for INTEGER NOT NULL DEFAULT 0,
+            points_against INTEGER NOT NULL DEFAULT 0,
+            rating REAL NOT NULL DEFAULT 1500,
+            last_match_id INTEGER,
+            updated_at REAL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX player_stats_rating ON player_stats (rating DESC, username)")
+
+
+def _migrate_v3(conn):
+    """Sessões revogadas (logout) até o último token da sessão expirar."""
+    conn.execute("""
+        CREATE TABLE revoked_sessions (
+            sid TEXT PRIMARY KEY,
+            until REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+
+
+MIGRATIONS = (
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+)
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(path=DB_PATH) -> list:
+    """Leva o banco até SCHEMA_VERSION; devolve as versões aplicadas agora."""
+    conn = sqlite3.connect(str(path), isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")  # persiste no arquivo; leitores não bloqueiam o writer
+        conn.execute("PRAGMA busy_timeout=5000")
+        applied = []
+        for version, step in MIGRATIONS:
+            # IMMEDIATE: num cluster, só um processo migra; os outros esperam e pulam
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = conn.execute("PRAGMA user_version").fetchone()[0]
+                if current > SCHEMA_VERSION:
+                    raise RuntimeError(
+                        f"Banco na versão {current}, mais nova que a deste servidor ({SCHEMA_VERSION}). "
+                        "Atualize o servidor."
+                    )
+                if current >= version:
+                    conn.execute("COMMIT")
+                    continue
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+                applied.append(version)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return applied
+    finally:
+        conn.close()
 
 
 def create_user(username: str, password_hash: str, role: str = "user") -> bool:
     try:
         with get_connection() as conn:
             cur = conn.cursor()
-            cur.execute(
-                "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
-                (username, password_hash, role),
-            )
+            cur.execute(INSERT_USER, (username, password_hash, role))
         return True
     except sqlite3.IntegrityError:
         return False
 
 
+def load_session_revocations() -> dict:
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT username, not_before FROM session_revocations")
+        return dict(cur.fetchall())
+
+
+def load_revoked_sessions() -> dict:
+    """sid -> até quando vale a revogação; as vencidas saem da tabela aqui."""
+    now = time.time()
+    with get_connection() as conn:
+        conn.execute("DELETE FROM revoked_sessions WHERE until < ?", (now,))
+        return dict(conn.execute("SELECT sid, until FROM revoked_sessions").fetchall())
+
+
 def get_user_by_username(username: str):
     with get_connection() as conn:
         cur = conn.cursor()
-        cur.execute(
-            "SELECT id, username, password_hash, role FROM users WHERE username = ?",
-            (username,),
-        )
+        cur.execute(SELECT_USER_BY_USERNAME, (username,))
         return cur.fetchone()
+
+
+# ----- partidas e ranking -----
+# o ranking sai de player_stats (mantida a cada partida), nunca de um GROUP BY em match_players
+
+RATING_START = 1500.0
+RATING_K = 32.0
+
+INSERT_MATCH = (
+    "INSERT INTO matches (room, players, started_at, finished_at, winner_team, score0, score1, reason, seed) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+INSERT_MATCH_PLAYER = (
+    "INSERT INTO match_players (match_id, seat, username, team, result, rating_before, rating_after) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+UPSERT_PLAYER_STATS = (
+    "INSERT INTO player_stats (username, games, wins, losses, abandoned, points_for, points_against, "
+    "rating, last_match_id, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(username) DO UPDATE SET games = games + excluded.games, wins = wins + excluded.wins, "
+    "losses = losses + excluded.losses, abandoned = abandoned + excluded.abandoned, "
+    "points_for = points_for + excluded.points_for, points_against = points_against + excluded.points_against, "
+    "rating = excluded.rating, last_match_id = excluded.last_match_id, updated_at = excluded.updated_at"
+)
+SELECT_RATING = "SELECT rating FROM player_stats WHERE username = ?"
+# paginação por chave (rating DESC, username), no índice player_stats_rating: a página
+# seguinte começa depois da última linha da anterior, sem varrer as de cima (OFFSET)
+SELECT_LEADERBOARD = (
+    "SELECT username, rating, games, wins, losses FROM player_stats "
+    "WHERE games >= ? ORDER BY rating DESC, username LIMIT ?"
+)
+SELECT_LEADERBOARD_AFTER = (
+    "SELECT username, rating, games, wins, losses FROM player_stats "
+    "WHERE rating <= ? AND (rating < ? OR username > ?) AND games >= ? "
+    "ORDER BY rating DESC, username LIMIT ?"
+)
+SELECT_PLAYER_STATS = (
+    "SELECT username, games, wins, losses, abandoned, points_for, points_against, rating "
+    "FROM player_stats WHERE username = ?"
+)
+# quem vem antes no ranking (mesma ordem e mesmo filtro do leaderboard), contando até um teto
+SELECT_RANK = (
+    "SELECT COUNT(*) FROM (SELECT 1 FROM player_stats "
+    "WHERE rating >= ? AND (rating > ? OR username < ?) AND games >= ? LIMIT ?)"
+)
+RANK_MAX = 1000  # posição exata só no top RANK_MAX; abaixo disso, rank None
+SELECT_MATCH_HISTORY = (
+    "SELECT m.id, m.room, m.finished_at, m.winner_team, m.score0, m.score1, m.reason, "
+    "p.team, p.result, p.rating_before, p.rating_after "
+    "FROM match_players p JOIN matches m ON m.id = p.match_id "
+    "WHERE p.username = ? AND p.match_id < ? ORDER BY p.match_id DESC LIMIT ?"
+)
+
+
+def expected_score(rating: float, opponent: float) -> float:
+    return 1.0 / (1.0 + 10 ** ((opponent - rating) / 400.0))
+
+
+def record_match(conn, match: dict) -> int:
+    """Grava uma partida e atualiza os agregados; roda na thread de escrita (lote do writer).
+
+    match: room, started_at, finished_at, winner (time, -1 = cancelada), score,
+    reason, seed e seats [(username, rated)]. Robôs entram na partida mas não
+    no ranking (rated=False). Times: assento % 2, como na mesa.
+    """
+    seats = match["seats"]
+    winner = match["winner"]
+    score = match["score"]
+    cur = conn.execute(INSERT_MATCH, (
+        match["room"], len(seats), match["started_at"], match["finished_at"], winner,
+        score[0], score[1], match.get("reason"), match.get("seed"),
+    ))
+    match_id = cur.lastrowid
+
+    ratings = {}
+    for username, rated in seats:
+        row = conn.execute(SELECT_RATING, (username,)).fetchone() if rated else None
+        ratings[username] = row[0] if row else RATING_START
+    team_rating = [0.0, 0.0]
+    for seat, (username, _) in enumerate(seats):
+        team_rating[seat % 2] += ratings[username] * 2 / len(seats)  # média do time
+
+    now = match["finished_at"]
+    for seat, (username, rated) in enumerate(seats):
+        team = seat % 2
+        before = ratings[username]
+        if winner < 0:
+            result, after = -1, before
+        else:
+            result = 1 if team == winner else 0
+            after = before + RATING_K * (result - expected_score(team_rating[team], team_rating[1 - team]))
+        conn.execute(INSERT_MATCH_PLAYER, (
+            match_id, seat, username, team, result,
+            before if rated else None, after if rated else None,
+        ))
+        if not rated:
+            continue
+        abandoned = 1 if username == match.get("abandoned_by") else 0
+        if winner < 0:
+            counts = (0, 0, 0, abandoned, 0, 0)
+        else:
+            counts = (1, result, 1 - result, 0, score[team], score[1 - team])
+        conn.execute(UPSERT_PLAYER_STATS, (username, *counts, after, match_id, now))
+    return match_id
+
+
+# ----- camada assíncrona -----
+
+
+def open_pooled_connection(path=DB_PATH):
+    # isolation_level=None: as transações são abertas explicitamente pelo writer.
+    # Conexões longas + SQL constante = o cache de statements do sqlite3 reaproveita o prepare.
+    conn = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False, cached_statements=256)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+class AsyncDatabase:
+    """Leituras num pool de threads com conexões fixas; escritas numa única
+    thread que agrupa o que estiver na fila numa transação só."""
+
+    def __init__(self, path=DB_PATH, readers: int = 4, write_batch: int = 256, user_cache=None):
+        self.path = path
+        self.user_cache = user_cache  # UserCache na frente de get_user_by_username (opcional)
+        self.readers = max(1, readers)
+        self.write_batch = max(1, write_batch)
+        self.writes = 0
+        self.write_errors = 0  # escritas sem ninguém esperando (write_nowait) que falharam
+        self.write_txns = 0
+        self.observer = None  # callback(op, segundos), medido do ponto de vista do event loop
+        self._local = threading.local()
+        self._reader_conns = []
+        self._reader_lock = threading.Lock()
+        self._pool = None
+        self._write_q = queue.Queue()
+        self._writer = None
+
+    def start(self):
+        if self._pool is not None:
+            return
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.readers,
+            thread_name_prefix="db-read",
+            initializer=self._init_reader,
+        )
+        self._writer = threading.Thread(target=self._writer_loop, name="db-write", daemon=True)
+        self._writer.start()
+
+    def close(self):
+        if self._pool is None:
+            return
+        self._write_q.put(None)
+        self._writer.join(timeout=5)
+        self._pool.shutdown(wait=True)
+        for conn in self._reader_conns:
+            conn.close()
+        self._reader_conns.clear()
+        self._pool = None
+        self._writer = None
+
+    def stats(self) -> dict:
+        return {
+            "readers": self.readers,
+            "write_queue": self._write_q.qsize(),
+            "writes": self.writes,
+            "write_txns": self.write_txns,
+            "write_errors": self.write_errors,
+        }
+
+    # ----- leitura -----
+
+    def _init_reader(self):
+        conn = open_pooled_connection(self.path)
+        self._local.conn = conn
+        with self._reader_lock:
+            self._reader_conns.append(conn)
+
+    def _fetchone(self, sql, params):
+        return self._local.conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql, params):
+        return self._local.conn.execute(sql, params).fetchall()
+
+    async def _read(self, fn, sql, params):
+        t0 = time.perf_counter()
+        result = await asyncio.get_running_loop().run_in_executor(self._pool, fn, sql, params)
+        if self.observer is not None:
+            self.observer("read", time.perf_counter() - t0)
+        return result
+
+    async def fetchone(self, sql: str, params=()):
+        return await self._read(self._fetchone, sql, params)
+
+    async def fetchall(self, sql: str, params=()):
+        return await self._read(self._fetchall, sql, params)
+
+    # ----- escrita -----
+
+    def write_nowait(self, sql, params=()):
+        """Enfileira uma escrita sem esperar por ela; falhas só contam em write_errors.
+
+        sql pode ser um callable fn(conn, *params), que roda dentro da
+        transação do lote (para escritas com leitura no meio).
+        """
+        self._write_q.put((sql, params, None, None))
+
+    async def execute(self, sql: str, params=()):
+        """Enfileira uma escrita; devolve lastrowid ou propaga o erro do sqlite."""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        t0 = time.perf_counter()
+        self._write_q.put((sql, params, fut, loop))
+        try:
+            return await fut
+        finally:
+            if self.observer is not None:
+                self.observer("write", time.perf_counter() - t0)
+
+    def _writer_loop(self):
+        conn = open_pooled_connection(self.path)
+        try:
+            while True:
+                item = self._write_q.get()
+                if item is None:
+                    return
+                batch = [item]
+                stop = False
+                while len(batch) < self.write_batch:
+                    try:
+                        item = self._write_q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                self._run_batch(conn, batch)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _run_batch(self, conn, batch):
+        results = []
+        try:
+            # IMMEDIATE: pega o lock de escrita já (outros processos esperam no busy_timeout)
+            conn.execute("BEGIN IMMEDIATE")
+            for sql, params, _, _ in batch:
+                # savepoint por item: um UNIQUE violado não derruba o resto do lote
+                conn.execute("SAVEPOINT w")
+                try:
+                    if callable(sql):
+                        value = sql(conn, *params)
+                    else:
+                        value = conn.execute(sql, params).lastrowid
+                    conn.execute("RELEASE w")
+                    results.append((True, value))
+                except Exception as e:  # erro de um item (inclusive de um callable) fica com ele
+                    conn.execute("ROLLBACK TO w")
+                    conn.execute("RELEASE w")
+                    results.append((False, e))
+            conn.execute("COMMIT")
+            self.writes += len(batch)
+            self.write_txns += 1
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            results = [(False, e)] * len(batch)
+        for (_, _, fut, loop), (ok, value) in zip(batch, results):
+            if fut is None:
+                if not ok:
+                    self.write_errors += 1
+                continue
+            try:
+                loop.call_soon_threadsafe(_resolve, fut, ok, value)
+            except RuntimeError:
+                pass  # loop já fechado
+
+    # ----- usuários -----
+    # toda escrita em users passa por aqui para o cache não ficar velho
+
+    async def get_user_by_username(self, username: str):
+        cache = self.user_cache
+        if cache is None:
+            return await self.fetchone(SELECT_USER_BY_USERNAME, (username,))
+        found, row = cache.get(username)
+        if found:
+            return row
+        generation = cache.generation
+        row = await self.fetchone(SELECT_USER_BY_USERNAME, (username,))
+        cache.put(username, row, generation)
+        return row
+
+    async def create_user(self, username: str, password_hash: str, role: str = "user") -> bool:
+        try:
+            user_id = await self.execute(INSERT_USER, (username, password_hash, role))
+        except sqlite3.IntegrityError:
+            return False
+        if self.user_cache is not None:
+            self.user_cache.invalidate(username)
+            self.user_cache.put(username, (user_id, username, password_hash, role))
+        return True
+
+    async def set_user_role(self, username: str, role: str):
+        await self.execute(UPDATE_USER_ROLE, (role, username))
+        self.invalidate_user(username)
+
+    async def update_password_hash(self, username: str, old_hash: str, new_hash: str) -> bool:
+        changed = await self.execute(
+            lambda conn: conn.execute(UPDATE_PASSWORD_HASH, (new_hash, username, old_hash)).rowcount
+        )
+        self.invalidate_user(username)
+        return changed > 0
+
+    async def delete_user(self, username: str):
+        await self.execute(DELETE_USER, (username,))
+        self.invalidate_user(username)
+
+    def invalidate_user(self, username: str):
+        """Também para mudanças de outro shard (user_changed no barramento).
+
+        O inspect_db.py não avisa um servidor rodando: o que ele grava só aparece
+        quando a entrada do cache vence (USER_CACHE_TTL_SECONDS).
+        """
+        if self.user_cache is not None:
+            self.user_cache.invalidate(username)
+
+    # ----- partidas -----
+
+    def record_match_nowait(self, match: dict):
+        """Fim de partida não espera o disco: vai para a fila do writer e pronto."""
+        self.write_nowait(record_match, (match,))
+
+    async def leaderboard(self, limit: int = 20, after: tuple | None = None, min_games: int = 1) -> list:
+        """Uma página do ranking; after = (rating, username) da última linha da página anterior."""
+        if after is None:
+            return await self.fetchall(SELECT_LEADERBOARD, (min_games, limit))
+        rating, username = after
+        return await self.fetchall(SELECT_LEADERBOARD_AFTER, (rating, rating, username, min_games, limit))
+
+    async def rating(self, username: str) -> float:
+        row = await self.fetchone(SELECT_RATING, (username,))
+        return row[0] if row else RATING_START
+
+    async def player_stats(self, username: str, min_games: int = 1):
+        """Agregados do jogador mais a posição no ranking (None fora do top RANK_MAX ou sem partidas)."""
+        row = await self.fetchone(SELECT_PLAYER_STATS, (username,))
+        if row is None:
+            return None
+        rating, games = row[7], row[1]
+        rank = None
+        if games >= min_games:
+            ahead = (await self.fetchone(SELECT_RANK, (rating, rating, username, min_games, RANK_MAX)))[0]
+            rank = ahead + 1 if ahead < RANK_MAX else None
+        return row + (rank,)
+
+    async def match_history(self, username: str, before_id: int | None = None, limit: int = 20) -> list:
+        return await self.fetchall(SELECT_MATCH_HISTORY, (username, before_id or 2 ** 62, limit))
+
+
+def _resolve(fut, ok, value):
+    if fut.done():
+        return  # quem esperava foi cancelado
+    if ok:
+        fut.set_result(value)
+    else:
+        fut.set_exception(value)
@@ -0,0 +1,162 @@
+import asyncio
+import json
+from collections import deque
+
+POLICY_DROP = "drop"  # fila cheia: descarta a mensagem nova
+POLICY_COALESCE = "coalesce"  # fila cheia: descarta a mais antiga (a chave mais recente sempre vence)
+POLICY_DISCONNECT = "disconnect"  # fila cheia: derruba o cliente lento
+POLICIES = (POLICY_DROP, POLICY_COALESCE, POLICY_DISCONNECT)
+
+
+def encode(data: dict) -> str:
+    return json.dumps(data)
+
+
+class Outbox:
+    """Fila de saída limitada de uma conexão, drenada por uma task própria."""
+
+    __slots__ = ("ws", "entries", "keyed", "wakeup", "task", "closed", "dropped", "overflowed")
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.entries = deque()  # [key, texto]
+        self.keyed = {}  # key -> entry ainda não enviada
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.closed = False
+        self.dropped = 0
+        self.overflowed = False  # perdeu algo desde a última vez que alguém olhou
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _pop(self):
+        entry = self.entries.popleft()
+        if entry[0] is not None and self.keyed.get(entry[0]) is entry:
+            del self.keyed[entry[0]]
+        return entry
+
+
+class FanOut:
+    """Serializa cada payload uma vez e entrega em paralelo, uma fila por conexão."""
+
+    def __init__(self, max_queue: int = 256, policy: str = POLICY_COALESCE, on_overflow=None):
+        if policy not in POLICIES:
+            raise ValueError(f"política inválida: {policy!r}")
+        self.max_queue = max(1, max_queue)
+        self.policy = policy
+        self.on_overflow = on_overflow  # callback(ws) quando uma fila estoura
+        self.outboxes = {}
+        self.encodes = 0
+        self.dropped = 0
+        self.disconnected = 0
+
+    def open(self, ws):
+        box = Outbox(ws)
+        box.task = asyncio.get_running_loop().create_task(self._writer(box))
+        self.outboxes[ws] = box
+        return box
+
+    def close(self, ws):
+        box = self.outboxes.pop(ws, None)
+        if box is None:
+            return
+        box.closed = True
+        if box.task is not None and box.task is not asyncio.current_task():
+            box.task.cancel()
+
+    def is_open(self, ws) -> bool:
+        box = self.outboxes.get(ws)
+        return box is not None and not box.closed
+
+    def take_overflowed(self, ws) -> bool:
+        """True se a conexão perdeu mensagens desde a última consulta."""
+        box = self.outboxes.get(ws)
+        if box is None or not box.overflowed:
+            return False
+        box.overflowed = False
+        return True
+
+    def queue_depth(self, ws) -> int:
+        box = self.outboxes.get(ws)
+        return len(box) if box else 0
+
+    def stats(self) -> dict:
+        depths = [len(b) for b in self.outboxes.values()]
+        return {
+            "connections": len(depths),
+            "queued": sum(depths),
+            "max_depth": max(depths, default=0),
+            "encodes": self.encodes,
+            "dropped": self.dropped,
+            "disconnected": self.disconnected,
+        }
+
+    def encode(self, data: dict) -> str:
+        self.encodes += 1
+        return encode(data)
+
+    def send(self, ws, data: dict, key=None) -> bool:
+        return self.send_raw(ws, self.encode(data), key)
+
+    def send_raw(self, ws, text: str, key=None) -> bool:
+        box = self.outboxes.get(ws)
+        if box is None or box.closed:
+            return False
+        if key is not None:
+            entry = box.keyed.get(key)
+            if entry is not None:
+                entry[1] = text  # ainda não saiu: troca pelo mais recente
+                return True
+        if len(box.entries) >= self.max_queue and not self._overflow(box):
+            return not box.closed
+        entry = [key, text]
+        box.entries.append(entry)
+        if key is not None:
+            box.keyed[key] = entry
+        box.wakeup.set()
+        return True
+
+    def broadcast(self, conns, data: dict, key=None) -> list:
+        """Enfileira o mesmo texto para todas as conexões; devolve as que estão mortas."""
+        text = self.encode(data)
+        dead = []
+        for ws in conns:
+            if not self.send_raw(ws, text, key):
+                dead.append(ws)
+        return dead
+
+    def _overflow(self, box) -> bool:
+        """Trata fila cheia; True se ainda há espaço para a mensagem nova."""
+        box.dropped += 1
+        box.overflowed = True
+        self.dropped += 1
+        if self.policy == POLICY_DISCONNECT:
+            self.disconnected += 1
+            self.close(box.ws)
+            asyncio.get_running_loop().create_task(box.ws.close(code=1013, reason="cliente lento"))
+            accepted = False
+        elif self.policy == POLICY_COALESCE:
+            box._pop()
+            accepted = True
+        else:
+            accepted = False
+        if self.on_overflow is not None:
+            self.on_overflow(box.ws)
+        return accepted
+
+    async def _writer(self, box):
+        ws = box.ws
+        try:
+            while not box.closed:
+                if not box.entries:
+                    box.wakeup.clear()
+                    await box.wakeup.wait()
+                    continue
+                _, text = box._pop()
+                await ws.send(text)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # conexão caiu: quem fizer o próximo envio vê a fila fechada e limpa o estado
+            box.closed = True
@@ -0,0 +1,54 @@
+from collections import deque
+
+_MISSING = object()
+
+
+def diff_view(old: dict, new: dict) -> tuple[dict, list]:
+    """Campos de primeiro nível que mudaram (com o valor novo) e os que sumiram."""
+    changed = {k: v for k, v in new.items() if old.get(k, _MISSING) != v}
+    removed = [k for k in old if k not in new]
+    return changed, removed
+
+
+class ViewStream:
+    """Visões de um assento como deltas numerados.
+
+    update() compara a visão nova com a anterior e gera o delta seq (os
+    campos que mudaram, aplicados sobre o estado seq-1); o primeiro traz a
+    visão inteira, aplicada sobre {}. Os últimos `window` deltas ficam
+    guardados: quem perdeu alguns (pulo de seq ou queda curta) recebe só o
+    que falta; quem ficou para trás da janela recebe a foto (snapshot).
+    """
+
+    __slots__ = ("seq", "view", "deltas")
+
+    def __init__(self, window: int = 32):
+        self.seq = 0
+        self.view = None
+        self.deltas = deque(maxlen=max(1, window))
+
+    def update(self, view: dict) -> dict | None:
+        """Registra a visão; devolve o delta ou None se nada mudou."""
+        changed, removed = diff_view(self.view or {}, view)
+        if not changed and not removed:
+            return None
+        self.seq += 1
+        self.view = view
+        delta = {"seq": self.seq, "set": changed}
+        if removed:
+            delta["del"] = removed
+        self.deltas.append(delta)
+        return delta
+
+    def since(self, seq) -> list | None:
+        """Deltas depois de seq; None se a janela não cobre mais (mande snapshot)."""
+        if not isinstance(seq, int) or seq > self.seq:
+            return None
+        if seq == self.seq:
+            return []
+        if not self.deltas or seq < self.deltas[0]["seq"] - 1:
+            return None
+        return [d for d in self.deltas if d["seq"] > seq]
+
+    def snapshot(self) -> dict:
+        return {"seq": self.seq, "state": self.view}
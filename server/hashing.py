@@ -0,0 +1,229 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+PBKDF2_ITERS = 200_000  # custo padrão quando não há calibração
+DEFAULT_TARGET_MS = 100.0  # alvo da calibração: tempo de um hash nesta máquina
+PBKDF2_MIN_ITERS = 100_000  # piso: máquina lenta não derruba a segurança abaixo disso
+PBKDF2_STEP = 10_000
+# teto aceito num hash gravado ou importado: custo absurdo faria cada login rodar minutos
+PBKDF2_MAX_ITERS = 10_000_000
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_MIN_N = 1 << 14
+SCRYPT_MAX_N = 1 << 17  # 128 MiB por hash com r=8 (vezes os workers do pool)
+ALGORITHMS = ("pbkdf2_sha256", "scrypt")
+# folga abaixo do custo atual: a calibração varia um pouco a cada partida do servidor e
+# isso não deve refazer todos os hashes; abaixo dela (ou do piso) o hash é refeito no
+# próximo login. Custo maior que o atual nunca é refeito: seria trocar por um hash mais fraco
+REHASH_UNDER = 0.5
+
+
+class HashParams:
+    """Algoritmo e custo: iterações (pbkdf2_sha256) ou N (scrypt, com r e p fixos)."""
+
+    __slots__ = ("alg", "cost")
+
+    def __init__(self, alg: str = "pbkdf2_sha256", cost: int = PBKDF2_ITERS):
+        if alg not in ALGORITHMS:
+            raise ValueError(f"algoritmo de hash inválido: {alg!r}")
+        if not cost_in_range(alg, cost):
+            raise ValueError(f"custo de hash fora da faixa para {alg}: {cost}")
+        self.alg = alg
+        self.cost = cost
+
+    def __repr__(self):
+        return f"HashParams({self.alg!r}, {self.cost})"
+
+
+def cost_in_range(alg: str, cost: int) -> bool:
+    if alg == "scrypt":
+        return 2 <= cost <= SCRYPT_MAX_N and cost & (cost - 1) == 0
+    return 1 <= cost <= PBKDF2_MAX_ITERS
+
+
+def parse_hash(stored: str) -> tuple | None:
+    """(alg, custo, salt, dk) de um hash "alg$custo$salt$dk"; None se malformado ou com custo fora da faixa."""
+    try:
+        alg, cost_s, salt_b64, dk_b64 = stored.split("$", 3)
+        cost = int(cost_s)
+        salt = base64.b64decode(salt_b64, validate=True)
+        dk = base64.b64decode(dk_b64, validate=True)
+    except (AttributeError, ValueError):
+        return None
+    if alg not in ALGORITHMS or not cost_in_range(alg, cost) or not salt or len(dk) != 32:
+        return None
+    return alg, cost, salt, dk
+
+
+DEFAULT_PARAMS = HashParams()
+
+
+def _derive(alg: str, password: bytes, salt: bytes, cost: int) -> bytes:
+    if alg == "scrypt":
+        return hashlib.scrypt(password, salt=salt, n=cost, r=SCRYPT_R, p=SCRYPT_P,
+                              maxmem=256 * cost * SCRYPT_R, dklen=32)
+    return hashlib.pbkdf2_hmac("sha256", password, salt, cost)
+
+
+def hash_password(password: str, params: HashParams = DEFAULT_PARAMS) -> str:
+    salt = secrets.token_bytes(16)
+    dk = _derive(params.alg, password.encode("utf-8"), salt, params.cost)
+    return "%s$%d$%s$%s" % (
+        params.alg,
+        params.cost,
+        base64.b64encode(salt).decode("ascii"),
+        base64.b64encode(dk).decode("ascii"),
+    )
+
+
+def needs_rehash(alg: str, cost: int, params: HashParams) -> bool:
+    """Hash gravado mais fraco que a política atual: outro algoritmo ou custo bem abaixo do atual/piso."""
+    if alg != params.alg:
+        return True
+    floor = SCRYPT_MIN_N if alg == "scrypt" else PBKDF2_MIN_ITERS
+    # HASH_COST abaixo do piso é escolha explícita (testes, loadgen): o piso não passa do custo atual
+    return cost < max(params.cost * REHASH_UNDER, min(floor, params.cost))
+
+
+def verify_password(password: str, stored: str, params: HashParams = DEFAULT_PARAMS) -> tuple[bool, bool]:
+    """(senha confere, hash precisa ser refeito com os parâmetros atuais)."""
+    parsed = parse_hash(stored)
+    if parsed is None:
+        return False, False
+    alg, cost, salt, expected = parsed
+    try:
+        dk = _derive(alg, password.encode("utf-8"), salt, cost)
+        if not hmac.compare_digest(dk, expected):
+            return False, False
+        return True, needs_rehash(alg, cost, params)
+    except Exception:
+        return False, False
+
+
+def _time_once(alg: str, cost: int) -> float:
+    t0 = time.perf_counter()
+    _derive(alg, b"calibracao", b"0123456789abcdef", cost)
+    return time.perf_counter() - t0
+
+
+def calibrate(target_ms: float, alg: str = "pbkdf2_sha256", rounds: int = 3) -> HashParams:
+    """Escolhe o custo que leva ~target_ms por hash nesta máquina (melhor de `rounds` medições).
+
+    PBKDF2 escala linear com as iterações: mede, extrapola e mede de novo
+    perto do alvo, arredondando para PBKDF2_STEP. scrypt usa N potência de 2: dobra até
+    passar do alvo. Nunca fica abaixo do piso de cada algoritmo.
+    """
+    target = max(1.0, target_ms) / 1000.0
+    if alg == "scrypt":
+        n = SCRYPT_MIN_N
+        while n < SCRYPT_MAX_N and min(_time_once(alg, n * 2) for _ in range(rounds)) <= target:
+            n *= 2
+        return HashParams(alg, n)
+    iters = 20_000
+    for _ in range(2):  # amostra pequena para a ordem de grandeza, depois uma perto do alvo
+        per_iter = min(_time_once(alg, iters) for _ in range(rounds)) / iters
+        iters = max(PBKDF2_STEP, int(target / per_iter))
+    iters = iters // PBKDF2_STEP * PBKDF2_STEP
+    return HashParams(alg, min(PBKDF2_MAX_ITERS, max(PBKDF2_MIN_ITERS, iters)))
+
+
+class HashBusy(Exception):
+    """Fila de hashing cheia: o cliente deve tentar de novo mais tarde."""
+
+
+class HashService:
+    """Roda PBKDF2 fora do event loop, com fila limitada e controle de admissão.
+
+    kind="thread" já paraleliza (pbkdf2_hmac solta o GIL); kind="process"
+    isola a CPU do processo do servidor.
+    """
+
+    def __init__(self, workers: int | None = None, max_pending: int = 64, kind: str = "thread",
+                 params: HashParams = DEFAULT_PARAMS):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"kind inválido: {kind!r}")
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_pending = max(0, max_pending)
+        self.kind = kind
+        self.params = params  # novos hashes; hashes com outros parâmetros são refeitos no login
+        self.rejected = 0
+        self.rehashed = 0
+        self.observer = None  # callback(op, segundos): fila + execução
+        self._executor = None
+        self._in_flight = 0  # rodando + esperando na fila do executor
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._in_flight - self.workers)
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "alg": self.params.alg,
+            "cost": self.params.cost,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+        }
+
+    @property
+    def idle(self) -> bool:
+        return self._in_flight < self.workers
+
+    def _get_executor(self):
+        # criado sob demanda: com spawn, os filhos reimportam o server e não devem abrir outro pool
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hash")
+        return self._executor
+
+    def _release(self):
+        self._in_flight -= 1
+
+    def _on_done(self, loop, _cfut):
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            pass  # loop já fechado (shutdown)
+
+    async def _submit(self, op: str, fn, *args):
+        if self._in_flight >= self.workers + self.max_pending:
+            self.rejected += 1
+            raise HashBusy()
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        cfut = self._get_executor().submit(fn, *args)
+        self._in_flight += 1
+        # só libera a vaga quando o trabalho termina de fato, mesmo se o handler for cancelado
+        cfut.add_done_callback(lambda f: self._on_done(loop, f))
+        result = await asyncio.wrap_future(cfut)
+        if self.observer is not None:
+            self.observer(op, time.perf_counter() - t0)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._submit("hash", hash_password, password, self.params)
+
+    async def verify(self, password: str, stored: str) -> tuple[bool, bool]:
+        """(confere, precisa de rehash); ver verify_password."""
+        return await self._submit("verify", verify_password, password, stored, self.params)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
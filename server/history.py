@@ -0,0 +1,168 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from database import DB_PATH
+
+CHAT_LOG_DIR = DB_PATH.parent / "chatlog"
+
+# eventos de sala que entram no histórico (o resto, como jogo, não)
+HISTORY_TYPES = ("chat", "system")
+
+
+class RoomHistory:
+    """Últimos N eventos de chat/sistema de uma sala; memória fixa (deque com maxlen)."""
+
+    __slots__ = ("events",)
+
+    def __init__(self, size: int):
+        self.events = deque(maxlen=size)
+
+    def add(self, event: dict):
+        self.events.append(event)
+
+    def frame(self, room_name: str) -> dict:
+        return {"type": "chat_history", "room": room_name, "events": list(self.events)}
+
+
+class ChatLog:
+    """Log append-only (JSON por linha) escrito por uma thread própria.
+
+    append() só enfileira e nunca bloqueia: fila cheia descarta e conta. A
+    thread grava em lotes, faz fsync no máximo a cada fsync_interval e troca
+    de segmento (<prefix>-<seq>.log) quando o atual passa de segment_bytes.
+    Subclasses mudam o formato com EXT, HEADER e _encode() (ver replay.py).
+    """
+
+    EXT = "log"
+    HEADER = b""  # escrito no começo de cada segmento
+
+    def __init__(self, directory=CHAT_LOG_DIR, prefix: str = "chat", segment_bytes: int = 16 << 20,
+                 fsync_interval: float = 1.0, max_queue: int = 65536, batch: int = 1024):
+        self.directory = directory
+        self.prefix = prefix
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.batch = batch
+        self.written = 0
+        self.dropped = 0
+        self.fsyncs = 0
+        self.segments = 0
+        self._q = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._file = None
+        self._seq = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # sempre começa um segmento novo depois do último existente
+        for name in os.listdir(self.directory):
+            stem, _, ext = name.rpartition(".")
+            head, _, seq = stem.rpartition("-")
+            if ext == self.EXT and head == self.prefix and seq.isdigit():
+                self._seq = max(self._seq, int(seq))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._writer_loop, name=f"{self.prefix}-log", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        if self._thread is None:
+            return
+        # o Event garante a parada mesmo com a fila cheia (put bloquearia o shutdown);
+        # o None só acorda a thread mais cedo quando há espaço
+        self._stop.set()
+        try:
+            self._q.put_nowait(None)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def append(self, room_name: str, event: dict):
+        try:
+            self._q.put_nowait({"room": room_name, **event})
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self) -> dict:
+        return {
+            "queue": self._q.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "fsyncs": self.fsyncs,
+            "segment": self._seq,
+            "segments_opened": self.segments,
+        }
+
+    # ----- thread de escrita -----
+
+    def _open_segment(self):
+        self._seq += 1
+        path = os.path.join(self.directory, f"{self.prefix}-{self._seq:08d}.{self.EXT}")
+        self._file = open(path, "ab")
+        if self._file.tell() == 0 and self.HEADER:
+            self._file.write(self.HEADER)
+        self.segments += 1
+
+    def _encode(self, items: list) -> bytes:
+        return b"".join(json.dumps(e, ensure_ascii=False).encode("utf-8") + b"\n" for e in items)
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.fsyncs += 1
+
+    def _writer_loop(self):
+        dirty = False
+        last_sync = time.monotonic()
+        try:
+            while True:
+                try:
+                    item = self._q.get(timeout=self.fsync_interval)
+                except queue.Empty:
+                    item = False  # ocioso: só garante o fsync pendente
+                stop = item is None or (self._stop.is_set() and self._q.empty())
+                lines = []
+                if item:
+                    lines.append(item)
+                    while len(lines) < self.batch:
+                        try:
+                            item = self._q.get_nowait()
+                        except queue.Empty:
+                            break
+                        if item is None:
+                            stop = True
+                            break
+                        lines.append(item)
+                if lines:
+                    if self._file is None:
+                        self._open_segment()  # só cria arquivo quando há o que gravar
+                    self._file.write(self._encode(lines))
+                    self.written += len(lines)
+                    dirty = True
+                now = time.monotonic()
+                if dirty and (stop or now - last_sync >= self.fsync_interval):
+                    self._sync()
+                    dirty = False
+                    last_sync = now
+                if self._file is not None and self._file.tell() >= self.segment_bytes:
+                    # fecha com fsync; o próximo segmento abre na próxima escrita
+                    if dirty:
+                        self._sync()
+                        dirty = False
+                    self._file.close()
+                    self._file = None
+                if stop:
+                    return
+        finally:
+            if self._file is not None:
+                if dirty:
+                    self._sync()
+                self._file.close()
+                self._file = None
@@ -0,0 +1,252 @@
+import asyncio
+from collections import deque
+
+
+class RoomListFeed:
+    """Lista de salas versionada: snapshot no login e deltas agrupados depois.
+
+    Mudanças são acumuladas e enviadas no máximo a cada flush_ms. Quem perdeu
+    mensagens (fila estourada) ou pede room_list_sync recebe um snapshot novo.
+    """
+
+    def __init__(self, fanout, flush_ms: int = 250):
+        self.fanout = fanout
+        self.flush_delay = max(0, flush_ms) / 1000.0
+        self.version = 0
+        self.published = set()  # salas como estão na versão atual
+        self.pending = {}  # sala -> True (criada) / False (removida)
+        self.subscribers = set()
+        self._timer = None
+
+    def snapshot(self) -> dict:
+        return {"type": "room_list", "version": self.version, "rooms": sorted(self.published)}
+
+    def subscribe(self, ws):
+        self.subscribers.add(ws)
+        self.send_snapshot(ws)
+
+    def unsubscribe(self, ws):
+        self.subscribers.discard(ws)
+
+    def send_snapshot(self, ws):
+        self.fanout.take_overflowed(ws)
+        # snapshot pendente na fila é trocado pelo mais novo
+        self.fanout.send(ws, self.snapshot(), key="room_list")
+
+    def room_added(self, name: str):
+        self._mark(name, True)
+
+    def room_removed(self, name: str):
+        self._mark(name, False)
+
+    def _mark(self, name: str, present: bool):
+        if (name in self.published) == present:
+            self.pending.pop(name, None)  # criou e apagou (ou vice-versa) dentro da janela
+        else:
+            self.pending[name] = present
+        if self.pending and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_delay, self.flush)
+
+    def flush(self):
+        self._timer = None
+        if not self.pending:
+            return
+        added = sorted(n for n, present in self.pending.items() if present)
+        removed = sorted(n for n, present in self.pending.items() if not present)
+        self.pending.clear()
+        self.published.update(added)
+        self.published.difference_update(removed)
+        base = self.version
+        self.version += 1
+        delta = {
+            "type": "room_list_delta",
+            "base": base,
+            "version": self.version,
+            "added": added,
+            "removed": removed,
+        }
+        text = self.fanout.encode(delta)
+        for ws in list(self.subscribers):
+            if self.fanout.take_overflowed(ws):
+                self.send_snapshot(ws)  # ficou para trás: resync em vez de delta
+            elif not self.fanout.send_raw(ws, text):
+                self.subscribers.discard(ws)
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+class AdminFeed:
+    """Mudanças de salas e usuários para os admins inscritos (admin_subscribe).
+
+    Os eventos se acumulam e saem num frame admin_delta a cada flush_ms, com
+    seq crescente: o cliente que vir um buraco na sequência lista de novo.
+    Sem inscritos (e sem barramento para repassar) os eventos nem são guardados.
+    """
+
+    def __init__(self, fanout, flush_ms: int = 250, forward=None, shard: int | None = None):
+        self.fanout = fanout
+        self.flush_delay = max(0, flush_ms) / 1000.0
+        self.forward = forward  # callback(eventos) para os outros shards
+        self.shard = shard  # no modo multi-core cada evento diz de que shard veio
+        self.seq = 0
+        self.pending = []
+        self.subscribers = set()
+        self._timer = None
+
+    def subscribe(self, ws):
+        self.subscribers.add(ws)
+        self.fanout.send(ws, {"type": "admin_subscribed", "seq": self.seq})
+
+    def unsubscribe(self, ws):
+        self.subscribers.discard(ws)
+
+    def event(self, op: str, **fields):
+        if not self.subscribers and self.forward is None:
+            return
+        event = {"op": op, **fields}
+        if self.shard is not None:
+            event["shard"] = self.shard
+        self.pending.append(event)
+        self._arm()
+
+    def relay(self, events: list):
+        """Eventos vindos de outro shard: só entregam aqui, não voltam ao barramento."""
+        if not self.subscribers:
+            return
+        self.pending.extend(dict(e, remote=True) for e in events)
+        self._arm()
+
+    def _arm(self):
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_delay, self.flush)
+
+    def flush(self):
+        self._timer = None
+        if not self.pending:
+            return
+        events, self.pending = self.pending, []
+        local = [e for e in events if not e.get("remote")]
+        if self.forward is not None and local:
+            self.forward(local)
+        if not self.subscribers:
+            return
+        for e in events:
+            e.pop("remote", None)
+        self.seq += 1
+        text = self.fanout.encode({"type": "admin_delta", "seq": self.seq, "events": events})
+        for ws in list(self.subscribers):
+            if not self.fanout.send_raw(ws, text):
+                self.subscribers.discard(ws)
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+class SpectatorFeed:
+    """Eventos de sala para espectadores: atrasados delay_ms e entregues em lote.
+
+    Jogadores continuam no broadcast() de cada evento; aqui só se acumula
+    (append O(1)). A cada flush_ms, por sala, o que já passou do atraso vira
+    um frame spectate_batch codificado uma vez e enfileirado para todos os
+    espectadores. Só o último game_state do lote vai junto (a visão pública,
+    sem cartas na mão), na posição em que aconteceu, e ele fica guardado
+    para quem começar a assistir.
+    """
+
+    def __init__(self, fanout, spectators_of, flush_ms: int = 500, delay_ms: int = 2000, on_dead=None):
+        self.fanout = fanout
+        self.spectators_of = spectators_of  # callable(sala) -> sockets dos espectadores (ou None)
+        self.on_dead = on_dead  # callback(sockets mortos)
+        self.flush_delay = max(1, flush_ms) / 1000.0
+        self.delay = max(0, delay_ms) / 1000.0
+        self.pending = {}  # sala -> deque[(instante, evento)]
+        self.last_state = {}  # sala -> último game_state já entregue
+        self.batches = 0
+        self._timer = None
+
+    def add(self, room_name: str, event: dict):
+        loop = asyncio.get_running_loop()
+        self.pending.setdefault(room_name, deque()).append((loop.time(), event))
+        if self._timer is None:
+            self._timer = loop.call_later(self.flush_delay, self.flush)
+
+    def backfill(self, room_name: str, recent: list):
+        """Primeiro espectador da sala: põe na fila o que aconteceu há menos de delay.
+
+        Sala sem espectador não alimenta o feed, então esses eventos só estão
+        no histórico; recent traz (idade em segundos, evento). Da fila antiga
+        (de quem já saiu) fica só o game_state, que o histórico não tem.
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        kept = [p for p in self.pending.get(room_name, ()) if p[1].get("type") == "game_state"]
+        merged = sorted(kept + [(now - age, event) for age, event in recent], key=lambda p: p[0])
+        if not merged:
+            self.pending.pop(room_name, None)
+            return
+        self.pending[room_name] = deque(merged)
+        if self._timer is None:
+            self._timer = loop.call_later(self.flush_delay, self.flush)
+
+    def held(self, room_name: str) -> set:
+        """ids dos eventos da sala ainda na fila (sairão num próximo lote)."""
+        return {id(event) for _, event in self.pending.get(room_name, ())}
+
+    def flush(self):
+        self._timer = None
+        loop = asyncio.get_running_loop()
+        cutoff = loop.time() - self.delay
+        dead = []
+        for room_name in list(self.pending):
+            queue = self.pending[room_name]
+            sockets = self.spectators_of(room_name)
+            if not sockets:  # ninguém assistindo mais: descarta
+                del self.pending[room_name]
+                continue
+            batch = []
+            while queue and queue[0][0] <= cutoff:
+                batch.append(queue.popleft()[1])
+            if not queue:
+                del self.pending[room_name]
+            # game_states anteriores no lote são redundantes; o último fica onde estava
+            # (antes de um game_over que veio depois dele, por exemplo)
+            last = over = -1
+            for i, event in enumerate(batch):
+                if event.get("type") == "game_state":
+                    last = i
+                elif event.get("type") == "game_over":
+                    over = i
+            events = [e for i, e in enumerate(batch) if i == last or e.get("type") != "game_state"]
+            if last > over:
+                self.last_state[room_name] = batch[last]
+            elif over >= 0:
+                self.last_state.pop(room_name, None)
+            if not events:
+                continue
+            self.batches += 1
+            dead += self.fanout.broadcast(list(sockets), {"type": "spectate_batch", "room": room_name, "events": events})
+        if self.pending:
+            self._timer = loop.call_later(self.flush_delay, self.flush)
+        if dead and self.on_dead is not None:
+            self.on_dead(dead)
+
+    def forget(self, room_name: str):
+        self.pending.pop(room_name, None)
+        self.last_state.pop(room_name, None)
+
+    def stats(self) -> dict:
+        return {
+            "rooms_pending": len(self.pending),
+            "events_pending": sum(len(q) for q in self.pending.values()),
+            "batches": self.batches,
+        }
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
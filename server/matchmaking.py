@@ -0,0 +1,168 @@
+import bisect
+import time
+from collections import OrderedDict
+
+# jogadores por mesa: 1x1 ou 2x2
+MODES = (2, 4)
+
+
+class Ticket:
+    __slots__ = ("key", "rating", "mode", "since", "bucket", "payload")
+
+    def __init__(self, key, rating: float, mode: int, since: float, bucket: int, payload):
+        self.key = key
+        self.rating = rating
+        self.mode = mode
+        self.since = since
+        self.bucket = bucket
+        self.payload = payload  # o que o chamador quiser (no servidor, o websocket)
+
+
+class _ModeQueue:
+    """Fila de um modo: baldes de rating (FIFO cada) e a ordem global de chegada."""
+
+    __slots__ = ("size", "buckets", "indexes", "waiting")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.buckets = {}  # índice do balde -> OrderedDict(key -> Ticket)
+        self.indexes = []  # baldes não vazios, em ordem
+        self.waiting = OrderedDict()  # key -> Ticket, do mais antigo ao mais novo
+
+    def add(self, t: Ticket):
+        bucket = self.buckets.get(t.bucket)
+        if bucket is None:
+            bucket = self.buckets[t.bucket] = OrderedDict()
+            bisect.insort(self.indexes, t.bucket)
+        bucket[t.key] = t
+        self.waiting[t.key] = t
+
+    def remove(self, t: Ticket):
+        del self.waiting[t.key]
+        bucket = self.buckets[t.bucket]
+        del bucket[t.key]
+        if not bucket:
+            del self.buckets[t.bucket]
+            del self.indexes[bisect.bisect_left(self.indexes, t.bucket)]
+
+
+class Matchmaker:
+    """Agrupa quem está na fila em mesas de 2 ou 4 por faixa de rating.
+
+    O rating cai num balde de bucket_width pontos. Quem entra num balde que
+    já tem gente suficiente sai na hora com os mais antigos de lá, então
+    cada balde guarda menos de uma mesa e a fila fica pequena mesmo com
+    muita gente chegando. Quem sobra é visto no tick(), do mais antigo para
+    o mais novo: a janela de rating aceita cresce widen_per_second por
+    segundo de espera (até max_window) e pega vizinhos de outros baldes.
+    enqueue() e cancel() custam O(1) mais O(log baldes).
+    """
+
+    def __init__(self, bucket_width: float = 100.0, widen_per_second: float = 20.0,
+                 max_window: float = 400.0, clock=time.monotonic):
+        self.bucket_width = bucket_width
+        self.widen_per_second = widen_per_second
+        self.max_window = max_window
+        self.clock = clock
+        self.queues = {mode: _ModeQueue(mode) for mode in MODES}
+        self.tickets = {}  # key -> Ticket
+        self.matched = 0
+        self.cancelled = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def __len__(self):
+        return len(self.tickets)
+
+    def __contains__(self, key):
+        return key in self.tickets
+
+    def get(self, key) -> Ticket | None:
+        return self.tickets.get(key)
+
+    def enqueue(self, key, rating: float, mode: int, payload=None) -> list | None:
+        """Põe na fila (trocando um ticket anterior da mesma chave); devolve a mesa se já fechou."""
+        if mode not in self.queues:
+            raise ValueError(f"modo inválido: {mode}")
+        self.cancel(key, count=False)
+        t = Ticket(key, rating, mode, self.clock(), int(rating // self.bucket_width), payload)
+        q = self.queues[mode]
+        q.add(t)
+        self.tickets[key] = t
+        bucket = q.buckets[t.bucket]
+        if len(bucket) >= mode:
+            group = [bucket[k] for k in list(bucket)[:mode]]  # os mais antigos do balde
+            return self._take(q, group)
+        return None
+
+    def cancel(self, key, count: bool = True) -> Ticket | None:
+        t = self.tickets.pop(key, None)
+        if t is None:
+            return None
+        self.queues[t.mode].remove(t)
+        if count:
+            self.cancelled += 1
+        return t
+
+    def window(self, t: Ticket, now: float) -> float:
+        return min(self.max_window, self.bucket_width + self.widen_per_second * (now - t.since))
+
+    def tick(self) -> list:
+        """Junta quem sobrou nos baldes usando a janela de cada um; devolve as mesas formadas."""
+        now = self.clock()
+        groups = []
+        for q in self.queues.values():
+            for t in list(q.waiting.values()):
+                if t.key not in self.tickets or self.tickets[t.key] is not t:
+                    continue  # já saiu numa mesa deste mesmo tick
+                group = self._widen(q, t, now)
+                if group:
+                    groups.append(self._take(q, group))
+        return groups
+
+    def _widen(self, q: _ModeQueue, anchor: Ticket, now: float) -> list | None:
+        w = self.window(anchor, now)
+        lo = bisect.bisect_left(q.indexes, int((anchor.rating - w) // self.bucket_width))
+        hi = bisect.bisect_right(q.indexes, int((anchor.rating + w) // self.bucket_width))
+        candidates = []
+        for idx in q.indexes[lo:hi]:
+            for t in q.buckets[idx].values():
+                if t is not anchor and abs(t.rating - anchor.rating) <= w:
+                    candidates.append(t)
+        if len(candidates) < q.size - 1:
+            return None
+        # mais perto em rating primeiro; empate vai para quem espera há mais tempo
+        candidates.sort(key=lambda t: (abs(t.rating - anchor.rating), t.since))
+        return [anchor] + candidates[:q.size - 1]
+
+    def _take(self, q: _ModeQueue, group: list) -> list:
+        now = self.clock()
+        for t in group:
+            q.remove(t)
+            del self.tickets[t.key]
+            waited = now - t.since
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        self.matched += len(group)
+        return group
+
+    def stats(self) -> dict:
+        return {
+            "queued": {mode: len(q.waiting) for mode, q in self.queues.items()},
+            "matched": self.matched,
+            "cancelled": self.cancelled,
+            "avg_wait_s": round(self.wait_total / self.matched, 3) if self.matched else 0.0,
+            "max_wait_s": round(self.wait_max, 3),
+        }
+
+
+def balanced_seats(group: list) -> list:
+    """Ordem dos assentos (times = assento % 2) com os times mais parelhos.
+
+    1x1: tanto faz. 2x2: o mais forte joga com o mais fraco (a+d contra b+c).
+    """
+    ranked = sorted(group, key=lambda t: t.rating, reverse=True)
+    if len(ranked) == 4:
+        a, b, c, d = ranked
+        return [a, b, d, c]
+    return ranked
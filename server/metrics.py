@@ -0,0 +1,195 @@
+import asyncio
+import bisect
+import time
+
+# limites dos buckets em segundos (de 100µs a 10s)
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # último = +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Aproximação pelo limite superior do bucket que contém o quantil."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 6),
+        }
+
+
+def _labels_text(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Metrics:
+    """Contadores, histogramas e gauges do servidor, sem dependências externas.
+
+    Exposto como dict (mensagem admin_stats) e como texto no formato do
+    Prometheus (endpoint HTTP local).
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.counters = {}  # (nome, labels) -> int
+        self.histograms = {}  # (nome, labels) -> Histogram
+        self.gauges = {}  # nome -> callable() -> número
+        self.counter_fns = {}  # nome -> callable() -> total acumulado (contador mantido por outro objeto)
+        self.sections = {}  # nome -> callable() -> dict (só no admin_stats)
+        self.help = {}
+        self.loop_lag = 0.0
+
+    def inc(self, name: str, value: int = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = Histogram()
+        hist.observe(seconds)
+
+    def observer(self, name: str):
+        """Callback (op, segundos) para serviços que medem o próprio tempo (banco, hashing)."""
+        def _observe(op: str, seconds: float):
+            self.observe(name, seconds, op=op)
+        return _observe
+
+    def gauge(self, name: str, fn, help_text: str = ""):
+        self.gauges[name] = fn
+        if help_text:
+            self.help[name] = help_text
+
+    def counter(self, name: str, fn, help_text: str = ""):
+        """Como gauge(), mas para um total que só cresce: sai como counter no Prometheus."""
+        self.counter_fns[name] = fn
+        if help_text:
+            self.help[name] = help_text
+
+    def section(self, name: str, fn):
+        self.sections[name] = fn
+
+    # ----- event loop -----
+
+    async def sample_loop_lag(self, interval: float = 0.5):
+        """Mede quanto o loop atrasa para acordar um sleep: proxy de handler bloqueando."""
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - t0 - interval)
+            self.loop_lag = lag
+            self.observe("event_loop_lag_seconds", lag)
+
+    # ----- saída -----
+
+    def snapshot(self) -> dict:
+        counters = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            counters[name + _labels_text(labels)] = value
+        for name, fn in sorted(self.counter_fns.items()):
+            counters[name] = fn()
+        histograms = {}
+        for (name, labels), hist in sorted(self.histograms.items()):
+            histograms[name + _labels_text(labels)] = hist.summary()
+        data = {
+            "uptime_s": round(time.time() - self.started, 1),
+            "loop_lag_s": round(self.loop_lag, 6),
+            "gauges": {name: fn() for name, fn in sorted(self.gauges.items())},
+            "counters": counters,
+            "histograms": histograms,
+        }
+        for name, fn in self.sections.items():
+            data[name] = fn()
+        return data
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for name, fn in sorted(self.gauges.items()):
+            if name in self.help:
+                lines.append(f"# HELP truco_{name} {self.help[name]}")
+            lines.append(f"# TYPE truco_{name} gauge")
+            lines.append(f"truco_{name} {fn()}")
+
+        for name, fn in sorted(self.counter_fns.items()):
+            if name in self.help:
+                lines.append(f"# HELP truco_{name} {self.help[name]}")
+            lines.append(f"# TYPE truco_{name} counter")
+            lines.append(f"truco_{name} {fn()}")
+
+        typed = set()
+        for (name, labels), value in sorted(self.counters.items()):
+            if name not in typed:
+                lines.append(f"# TYPE truco_{name} counter")
+                typed.add(name)
+            lines.append(f"truco_{name}{_labels_text(labels)} {value}")
+
+        for (name, labels), hist in sorted(self.histograms.items()):
+            if name not in typed:
+                lines.append(f"# TYPE truco_{name} histogram")
+                typed.add(name)
+            acc = 0
+            for bound, c in zip(hist.bounds, hist.counts):
+                acc += c
+                lines.append(f"truco_{name}_bucket{_labels_text(labels + (('le', bound),))} {acc}")
+            lines.append(f"truco_{name}_bucket{_labels_text(labels + (('le', '+Inf'),))} {hist.count}")
+            lines.append(f"truco_{name}_sum{_labels_text(labels)} {hist.sum}")
+            lines.append(f"truco_{name}_count{_labels_text(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    async def _handle_http(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # descarta os headers
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1] in ("/metrics", "/"):
+                body = self.render_prometheus().encode("utf-8")
+                head = "HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            else:
+                body = b"not found\n"
+                head = "HTTP/1.0 404 Not Found\r\nContent-Type: text/plain\r\n"
+            writer.write(f"{head}Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_http(self, host: str, port: int):
+        return await asyncio.start_server(self._handle_http, host, port)
@@ -0,0 +1,166 @@
+import math
+import time
+
+# escopos de um bucket: por conexão, por usuário logado, por IP remoto, ou um só para todos
+SCOPES = ("conn", "user", "ip", "global")
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "stamp")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.stamp = now
+
+    def refill(self, rate: float, burst: float, now: float) -> float:
+        tokens = self.tokens + (now - self.stamp) * rate
+        self.tokens = burst if tokens > burst else tokens
+        self.stamp = now
+        return self.tokens
+
+
+class Rule:
+    __slots__ = ("scope", "rate", "burst", "name")
+
+    def __init__(self, scope: str, rate: float, burst: float, name: str):
+        if scope not in SCOPES:
+            raise ValueError(f"escopo desconhecido: {scope}")
+        if rate <= 0 or burst < 1:
+            raise ValueError(f"limite inválido para {name}: {rate}/{burst}")
+        self.scope = scope
+        self.rate = rate
+        self.burst = burst
+        self.name = name  # dono dos buckets (tipo de mensagem ou nome do budget global)
+
+
+def parse_rules(text: str) -> dict:
+    """"chat=conn:3/5,user:5/10;login=ip:1/10,global:auth:20/40" -> {tipo: [Rule]}.
+
+    Cada limite é escopo:taxa_por_segundo/rajada. No escopo global o nome do
+    budget vem antes (global:auth:20/40) e tipos diferentes podem dividi-lo.
+    Regra malformada levanta ValueError citando o trecho, para o servidor não
+    subir com um limite diferente do que se pediu.
+    """
+    rules = {}
+    for part in text.split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        kind, eq, limits = part.partition("=")
+        kind = kind.strip()
+        if not eq or not kind or not limits.strip():
+            raise ValueError(f"regra de rate limit inválida: {part!r} (esperado tipo=escopo:taxa/rajada)")
+        for limit in limits.split(","):
+            rules.setdefault(kind, []).append(_parse_limit(kind, limit.strip()))
+    return rules
+
+
+def _parse_limit(kind: str, limit: str) -> Rule:
+    fields = limit.split(":")
+    scope = fields[0]
+    if len(fields) != (3 if scope == "global" else 2) or not fields[-2] or "/" not in fields[-1]:
+        raise ValueError(f"limite inválido em {kind}: {limit!r} (esperado escopo:taxa/rajada ou global:nome:taxa/rajada)")
+    rate, _, burst = fields[-1].partition("/")
+    try:
+        rate, burst = float(rate), float(burst)
+    except ValueError:
+        raise ValueError(f"limite inválido em {kind}: {limit!r} (taxa e rajada precisam ser números)") from None
+    if not (math.isfinite(rate) and math.isfinite(burst)):
+        raise ValueError(f"limite inválido em {kind}: {limit!r} (taxa e rajada precisam ser finitas)")
+    name = fields[1] if scope == "global" else kind
+    try:
+        return Rule(scope, rate, burst, name)
+    except ValueError as e:
+        raise ValueError(f"limite inválido em {kind}: {limit!r} ({e})") from None
+
+
+class RateLimiter:
+    """Token buckets por conexão, usuário, IP e budgets globais, por tipo de mensagem.
+
+    check() devolve None (passou, consome um token de cada bucket) ou quantos
+    segundos esperar. Só consome se todos os buckets da regra tiverem token.
+    Buckets cheios de novo são esquecidos pela roda de timers, então o
+    estado só cresce com quem está mandando mensagens agora.
+    """
+
+    def __init__(self, rules: dict, wheel, clock=time.monotonic):
+        self.rules = rules
+        self.wheel = wheel
+        self.clock = clock
+        self.buckets = {}  # (nome, escopo, chave) -> TokenBucket
+        self.by_conn = {}  # conexão -> chaves dos buckets dela
+        self.limited = {}  # tipo -> recusas
+        self.evicted = 0
+
+    def rules_for(self, kind: str):
+        return self.rules.get(kind) or self.rules.get("*") or ()
+
+    def check(self, kind: str, conn, user: str | None, ip: str | None) -> float | None:
+        rules = self.rules_for(kind)
+        if not rules:
+            return None
+        now = self.clock()
+        keys = {"conn": conn, "user": user, "ip": ip, "global": None}
+        wait = 0.0
+        taken = []
+        for rule in rules:
+            key = keys[rule.scope]
+            if key is None and rule.scope != "global":
+                continue  # ex.: limite por usuário antes do login
+            bkey = (rule.name, rule.scope, key)
+            bucket = self.buckets.get(bkey)
+            if bucket is None:
+                bucket = self.buckets[bkey] = TokenBucket(rule.burst, now)
+                if rule.scope == "conn":
+                    self.by_conn.setdefault(conn, set()).add(bkey)
+                self._schedule_evict(bkey, rule, now)
+            tokens = bucket.refill(rule.rate, rule.burst, now)
+            if tokens < 1.0:
+                wait = max(wait, (1.0 - tokens) / rule.rate)
+            taken.append(bucket)
+        if wait > 0:
+            self.limited[kind] = self.limited.get(kind, 0) + 1
+            return wait
+        for bucket in taken:
+            bucket.tokens -= 1.0
+        return None
+
+    def forget_conn(self, conn):
+        """Conexão fechou: solta os buckets dela na hora."""
+        for bkey in self.by_conn.pop(conn, ()):
+            self.buckets.pop(bkey, None)
+            self.wheel.cancel(bkey)
+
+    def _schedule_evict(self, bkey, rule: Rule, now: float):
+        full_in = rule.burst / rule.rate
+        self.wheel.schedule(bkey, now + full_in, lambda k, rule=rule: self._maybe_evict(k, rule))
+
+    def _maybe_evict(self, bkey, rule: Rule):
+        bucket = self.buckets.get(bkey)
+        if bucket is None:
+            return
+        now = self.clock()
+        # ainda não encheu desde o último uso: confere de novo quando encher
+        missing = rule.burst - bucket.refill(rule.rate, rule.burst, now)
+        if missing > 1e-9:
+            self.wheel.schedule(bkey, now + missing / rule.rate, lambda k, rule=rule: self._maybe_evict(k, rule))
+            return
+        del self.buckets[bkey]
+        if bkey[1] == "conn":
+            keys = self.by_conn.get(bkey[2])
+            if keys is not None:
+                keys.discard(bkey)
+                if not keys:
+                    del self.by_conn[bkey[2]]
+        self.evicted += 1
+
+    def stats(self) -> dict:
+        by_scope = dict.fromkeys(SCOPES, 0)
+        for _, scope, _ in self.buckets:
+            by_scope[scope] += 1
+        return {
+            "buckets": by_scope,
+            "limited": dict(sorted(self.limited.items())),
+            "evicted": self.evicted,
+            "timers": len(self.wheel),
+        }
@@ -0,0 +1,298 @@
+"""Log binário das partidas e replayer determinístico.
+
+Uma partida é a semente do embaralhamento mais um byte por ação: 0..39 é
+"jogar a carta", MOVE_ACTION_BASE + código é o resto (truco, envido,
+quiero...). Quem age não é gravado, é sempre match.actor(), e as mãos saem
+de novo de random.Random(seed) na mesma ordem em que a Table deu.
+
+Os segmentos (data/replays/replay-<seq>.bin, ao lado do truco.db) começam
+com MAGIC e seguem com registros RECORD + movimentos. O replayer lê com
+mmap e pula de registro em registro, sem carregar o arquivo:
+
+    python server/replay.py data/replays/*.bin --workers 4   # reexecuta e confere placar
+    python server/replay.py data/replays/*.bin --seed 123    # uma partida, lance a lance
+    python server/replay.py --synth 100000 --out /tmp/r.bin  # partidas aleatórias (benchmark)
+"""
+import argparse
+import json
+import mmap
+import os
+import queue
+import random
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from database import DB_PATH
+from history import ChatLog
+from truco import ACTION_NAMES, NUM_CARDS, OK, PHASE_HAND_OVER, PHASE_MATCH_OVER, PLAY, Match, card_name
+
+REPLAY_DIR = DB_PATH.parent / "replays"
+MAGIC = b"TRPL\x01\x00\x00\x00"  # formato 1
+# bytes dos movimentos, semente, início, pontos para ganhar, jogadores, flags, time vencedor, placar
+RECORD = struct.Struct("<IQdHBBbHH")
+FLAG_FLOR = 1
+FLAG_ABANDONED = 2  # terminou antes do placar (alguém saiu)
+MOVE_ACTION_BASE = NUM_CARDS
+
+
+def encode_move(action: int, arg: int = 0) -> int:
+    return arg if action == PLAY else MOVE_ACTION_BASE + action
+
+
+def pack_record(seed: int, started_at: float, target: int, players: int, flor: bool,
+                winner: int, score, moves) -> bytes:
+    flags = (FLAG_FLOR if flor else 0) | (FLAG_ABANDONED if winner < 0 else 0)
+    head = RECORD.pack(len(moves), seed, started_at, target, players, flags, winner, score[0], score[1])
+    return head + bytes(moves)
+
+
+def record_of(table, winner: int) -> bytes:
+    m = table.match
+    return pack_record(table.seed, table.started_at, m.target, m.n, m.flor_enabled,
+                       winner, m.score, table.moves)
+
+
+class ReplayLog(ChatLog):
+    """Registros de partida no mesmo esquema do ChatLog: fila, thread, fsync agrupado e segmentos."""
+
+    EXT = "bin"
+    HEADER = MAGIC
+
+    def __init__(self, directory=REPLAY_DIR, prefix: str = "replay", segment_bytes: int = 64 << 20, **kwargs):
+        super().__init__(directory, prefix=prefix, segment_bytes=segment_bytes, **kwargs)
+
+    def append(self, table, winner: int = -1):
+        try:
+            self._q.put_nowait(record_of(table, winner))
+        except queue.Full:
+            self.dropped += 1
+
+    def _encode(self, items: list) -> bytes:
+        return b"".join(items)
+
+
+# ----- leitura -----
+
+def open_segment(path):
+    """mmap só-leitura do segmento (None se vazio); confere o MAGIC."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buf[:len(MAGIC)] != MAGIC:
+        buf.close()
+        raise ValueError(f"{path}: não é um log de replay (formato desconhecido)")
+    return buf
+
+
+def iter_records(buf, start: int = len(MAGIC), end: int | None = None):
+    """(offset, campos do RECORD, movimentos) de cada registro completo em [start, end)."""
+    end = len(buf) if end is None else end
+    size = RECORD.size
+    off = start
+    while off + size <= end:
+        fields = RECORD.unpack_from(buf, off)
+        stop = off + size + fields[0]
+        if stop > len(buf):
+            return  # registro pela metade (servidor caiu no meio da escrita)
+        yield off, fields, buf[off + size:stop]
+        off = stop
+
+
+def split_segment(buf, parts: int) -> list:
+    """Fatias [início, fim) com quantidades parecidas de bytes, cortadas em limites de registro."""
+    if parts <= 1:
+        return [(len(MAGIC), len(buf))]
+    step = max(1, (len(buf) - len(MAGIC)) // parts)
+    cuts, mark = [len(MAGIC)], len(MAGIC) + step
+    for off, fields, _ in iter_records(buf):
+        if off >= mark:
+            cuts.append(off)
+            mark = off + step
+    cuts.append(len(buf))
+    return list(zip(cuts, cuts[1:]))
+
+
+# ----- reexecução -----
+
+def replay(players: int, target: int, flor: bool, seed: int, moves, on_move=None):
+    """Reexecuta a partida no motor; devolve (match, índice do lance rejeitado ou -1)."""
+    m = Match(players, target=target, flor=flor)
+    rng = random.Random(seed)
+    m.start_hand(rng)
+    apply = m.apply
+    actor = m.actor
+    for i, b in enumerate(moves):
+        if m.phase == PHASE_HAND_OVER:
+            m.start_hand(rng)
+        seat = actor()
+        if b < MOVE_ACTION_BASE:
+            rc = apply(seat, PLAY, b)
+        else:
+            rc = apply(seat, b - MOVE_ACTION_BASE, 0)
+        if rc != OK:
+            return m, i
+        if on_move is not None:
+            on_move(m, seat, b)
+    return m, -1
+
+
+def check(fields, moves) -> str | None:
+    """None se o replay bate com o que foi gravado; senão, o motivo."""
+    _, seed, _, target, players, flags, winner, score0, score1 = fields
+    m, bad = replay(players, target, bool(flags & FLAG_FLOR), seed, moves)
+    if bad >= 0:
+        return f"lance {bad} rejeitado"
+    if (m.score[0], m.score[1]) != (score0, score1):
+        return f"placar {m.score[0]}x{m.score[1]}, gravado {score0}x{score1}"
+    if not flags & FLAG_ABANDONED and (m.phase != PHASE_MATCH_OVER or m.winner != winner):
+        return "partida não termina com o vencedor gravado"
+    return None
+
+
+def _scan(path: str, start: int, end: int, limit: int) -> dict:
+    buf = open_segment(path)
+    out = {"games": 0, "moves": 0, "mismatches": 0, "examples": []}
+    if buf is None:
+        return out
+    try:
+        for off, fields, moves in iter_records(buf, start, end):
+            out["games"] += 1
+            out["moves"] += len(moves)
+            why = check(fields, moves)
+            if why:
+                out["mismatches"] += 1
+                if len(out["examples"]) < limit:
+                    out["examples"].append({"file": path, "offset": off, "seed": fields[1], "why": why})
+    finally:
+        buf.close()
+    return out
+
+
+def verify(paths: list, workers: int, limit: int = 10) -> dict:
+    jobs = []
+    for path in paths:
+        buf = open_segment(path)
+        if buf is None:
+            continue
+        try:
+            jobs += [(path, a, b) for a, b in split_segment(buf, workers)]
+        finally:
+            buf.close()
+    t0 = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_scan, *zip(*jobs), [limit] * len(jobs))) if jobs else []
+    else:
+        results = [_scan(path, a, b, limit) for path, a, b in jobs]
+    elapsed = time.perf_counter() - t0
+    games = sum(r["games"] for r in results)
+    return {
+        "files": len(paths),
+        "games": games,
+        "moves": sum(r["moves"] for r in results),
+        "bytes": sum(os.path.getsize(p) for p in paths),
+        "seconds": round(elapsed, 3),
+        "games_per_minute": round(games / elapsed * 60) if elapsed else None,
+        "mismatches": sum(r["mismatches"] for r in results),
+        "examples": [e for r in results for e in r["examples"]][:limit],
+    }
+
+
+def show(paths: list, seed: int):
+    """Imprime a partida de uma semente lance a lance (disputas)."""
+    for path in paths:
+        buf = open_segment(path)
+        if buf is None:
+            continue
+        try:
+            for off, fields, moves in iter_records(buf):
+                if fields[1] == seed:
+                    _print_game(path, off, fields, moves)
+                    return True
+        finally:
+            buf.close()
+    return False
+
+
+def _print_game(path, off, fields, moves):
+    _, seed, started_at, target, players, flags, winner, score0, score1 = fields
+    print(f"{path} @{off}: semente {seed}, {players} jogadores, até {target}, "
+          f"início {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started_at))}")
+    hand = [0]
+
+    def on_move(m, seat, b):
+        if m.hand_no != hand[0]:
+            hand[0] = m.hand_no
+            cards = [", ".join(card_name(c) for c in m.dealt[s * 3:s * 3 + 3]) for s in range(m.n)]
+            print(f"mão {m.hand_no} (mano {m.mano}): " + " | ".join(cards))
+        what = f"joga {card_name(b)}" if b < MOVE_ACTION_BASE else ACTION_NAMES[b - MOVE_ACTION_BASE]
+        print(f"  assento {seat}: {what}   [{m.score[0]} x {m.score[1]}]")
+
+    m, bad = replay(players, target, bool(flags & FLAG_FLOR), seed, moves, on_move=on_move)
+    if bad >= 0:
+        print(f"lance {bad} rejeitado pelo motor")
+    result = "abandonada" if flags & FLAG_ABANDONED else f"time {winner} venceu"
+    print(f"gravado: {score0} x {score1}, {result}; replay: {m.score[0]} x {m.score[1]}")
+
+
+# ----- partidas sintéticas -----
+
+def synth(out_path: str, games: int, seed: int, players: int, target: int):
+    """Partidas com jogadas aleatórias (só lances legais), no formato do log."""
+    rng = random.Random(seed)
+    with open(out_path, "wb") as out:
+        out.write(MAGIC)
+        for _ in range(games):
+            game_seed = rng.getrandbits(63)
+            m = Match(players, target=target)
+            deal = random.Random(game_seed)
+            m.start_hand(deal)
+            moves = bytearray()
+            while m.phase != PHASE_MATCH_OVER:
+                if m.phase == PHASE_HAND_OVER:
+                    m.start_hand(deal)
+                seat = m.actor()
+                action = rng.choice(m.legal_actions(seat))
+                code = ACTION_NAMES.index(action)
+                arg = 0
+                if code == PLAY:
+                    arg = rng.choice([c for c in m.hands[seat * 3:seat * 3 + 3] if c >= 0])
+                m.apply(seat, code, arg)
+                moves.append(encode_move(code, arg))
+            out.write(pack_record(game_seed, time.time(), target, players, True, m.winner, m.score, moves))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replayer do log binário de partidas")
+    ap.add_argument("paths", nargs="*", help="segmentos (padrão: todos em data/replays)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--seed", type=int, help="mostra só a partida dessa semente")
+    ap.add_argument("--synth", type=int, metavar="N", help="gera N partidas aleatórias em --out")
+    ap.add_argument("--out", default="synth-replays.bin")
+    ap.add_argument("--players", type=int, default=2)
+    ap.add_argument("--target", type=int, default=30)
+    args = ap.parse_args()
+
+    if args.synth:
+        t0 = time.perf_counter()
+        synth(args.out, args.synth, 1, args.players, args.target)
+        print(f"{args.synth} partidas em {args.out} ({os.path.getsize(args.out)} bytes, "
+              f"{time.perf_counter() - t0:.1f}s)", file=sys.stderr)
+        return
+    paths = args.paths or sorted(str(p) for p in REPLAY_DIR.glob("replay-*.bin"))
+    if args.seed is not None:
+        if not show(paths, args.seed):
+            print(f"semente {args.seed} não encontrada", file=sys.stderr)
+            raise SystemExit(1)
+        return
+    result = verify(paths, max(1, args.workers))
+    print(json.dumps(result, indent=2))
+    if result["mismatches"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,78 +1,197 @@
 import asyncio
 import json
 import os
+import signal
 import time
-import base64
-import hashlib
-import hmac
-import secrets
+import zlib
+from http import HTTPStatus
+
 import websockets
 
+from accounts import (
+    BOT_PREFIX,
+    PASSWORD_MAX,
+    PASSWORD_MIN,
+    USERNAME_MAX,
+    USERNAME_MIN,
+    validate_len,
+    validate_password,
+    validate_username,
+)
+from bus import BusClient, BusError
 from database import (
-    create_tables,
-    ensure_schema_or_raise,
+    AsyncDatabase,
+    migrate,
     create_user,
     get_user_by_username,
+    load_revoked_sessions,
+    load_session_revocations,
+    UPSERT_REVOKED_SESSION,
+    UPSERT_SESSION_NOT_BEFORE,
 )
+from fanout import FanOut
+from hashing import DEFAULT_TARGET_MS, HashBusy, HashParams, HashService, calibrate, hash_password
+from history import CHAT_LOG_DIR, HISTORY_TYPES, ChatLog
+from lobby import AdminFeed, RoomListFeed, SpectatorFeed
+from matchmaking import MODES, Matchmaker, balanced_seats
+from metrics import Metrics
+from ratelimit import RateLimiter, parse_rules
+from replay import REPLAY_DIR, ReplayLog
+from sessions import SessionManager, load_or_create_secret
+from state import State
+from table import Table
+from timerwheel import TimerWheel
+from usercache import UserCache
+
+try:
+    from bots import BotConnection, BotPool
+except ImportError:  # numpy ausente: servidor sobe sem robôs
+    BotConnection = BotPool = None
 
 HOST = "localhost"  # Bloco 3 muda
 PORT = int(os.environ.get("PORT", "8765"))
 
-USERNAME_MIN = 3
-USERNAME_MAX = 20
-
-PASSWORD_MIN = 5
-PASSWORD_MAX = 20  # se quiser, mude para 64
-
 ROOM_MIN = 1
 ROOM_MAX = 24
 
 CHAT_MIN = 1
 CHAT_MAX = 200
-CHAT_COOLDOWN_SECONDS = 0.35
-
-PBKDF2_ITERS = 200_000
 
-
-def hash_password(password: str) -> str:
-    salt = secrets.token_bytes(16)
-    dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, PBKDF2_ITERS)
-    return "pbkdf2_sha256$%d$%s$%s" % (
-        PBKDF2_ITERS,
-        base64.b64encode(salt).decode("ascii"),
-        base64.b64encode(dk).decode("ascii"),
-    )
-
-
-def verify_password(password: str, stored: str) -> bool:
-    try:
-        alg, iters_s, salt_b64, dk_b64 = stored.split("$", 3)
-        if alg != "pbkdf2_sha256":
-            return False
-        iters = int(iters_s)
-        salt = base64.b64decode(salt_b64.encode("ascii"))
-        expected = base64.b64decode(dk_b64.encode("ascii"))
-        dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iters)
-        return hmac.compare_digest(dk, expected)
-    except Exception:
-        return False
+# limites por tipo de mensagem (token buckets): tipo=escopo:taxa/rajada,...
+# escopos: conn, user, ip e global:<budget> (compartilhado entre tipos);
+# "*" vale para os tipos sem regra própria. RATE_LIMITS="" desliga (ex.: loadgen local)
+RATE_LIMITS = os.environ.get("RATE_LIMITS", (
+    "chat=conn:3/5,user:5/10;"
+    "login=ip:1/10,global:auth:50/100;"
+    "register=ip:0.2/3,global:auth:50/100;"
+    "resume=ip:5/20;"
+    "create_room=conn:2/5;join_room=conn:2/5;"
+    "game_action=conn:10/20;game_resync=conn:2/5;"
+    "*=conn:20/40"
+))
+TIMER_TICK_SECONDS = 1.0
+
+# histórico por sala (últimos N eventos de chat/sistema, reenviados no room_joined)
+# e log append-only em disco, com fsync agrupado e rotação de segmentos
+CHAT_HISTORY_SIZE = int(os.environ.get("CHAT_HISTORY_SIZE", "50"))
+CHAT_LOG = os.environ.get("CHAT_LOG", "1") != "0"
+CHAT_LOG_SEGMENT_MB = int(os.environ.get("CHAT_LOG_SEGMENT_MB", "16"))
+CHAT_LOG_FSYNC_MS = int(os.environ.get("CHAT_LOG_FSYNC_MS", "1000"))
+
+# log binário das partidas (semente + um byte por ação) para replay, em data/replays
+REPLAY_LOG = os.environ.get("REPLAY_LOG", "1") != "0"
+REPLAY_LOG_SEGMENT_MB = int(os.environ.get("REPLAY_LOG_SEGMENT_MB", "64"))
+
+# hashing de senha fora do event loop
+HASH_POOL = os.environ.get("HASH_POOL", "thread")  # "thread" ou "process"
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", "0")) or None  # 0 = nº de CPUs
+HASH_MAX_PENDING = int(os.environ.get("HASH_MAX_PENDING", "64"))
+HASH_RETRY_AFTER_SECONDS = 1.0
+# custo do hash de senha: calibrado na partida para ~HASH_TARGET_MS por hash nesta máquina,
+# ou fixo com HASH_COST (iterações do PBKDF2 ou N do scrypt). Hashes antigos são refeitos no login
+HASH_ALG = os.environ.get("HASH_ALG", "pbkdf2_sha256")  # ou "scrypt"
+HASH_TARGET_MS = float(os.environ.get("HASH_TARGET_MS", str(DEFAULT_TARGET_MS)))
+HASH_COST = int(os.environ.get("HASH_COST", "0"))
+
+# fila de saída por conexão e política para cliente lento ("drop", "coalesce", "disconnect")
+SEND_QUEUE_MAX = int(os.environ.get("SEND_QUEUE_MAX", "256"))
+SLOW_CONSUMER_POLICY = os.environ.get("SLOW_CONSUMER_POLICY", "coalesce")
+
+# vida das conexões (timer wheel, sem task por conexão): quem fica calado por
+# HEARTBEAT_INTERVAL recebe ping; sem nada (nem pong) por HEARTBEAT_TIMEOUT, cai.
+# Socket sem login cai depois de LOGIN_DEADLINE. 0 desliga cada um
+HEARTBEAT_INTERVAL_SECONDS = float(os.environ.get("HEARTBEAT_INTERVAL_SECONDS", "20"))
+HEARTBEAT_TIMEOUT_SECONDS = float(os.environ.get("HEARTBEAT_TIMEOUT_SECONDS", "60"))
+LOGIN_DEADLINE_SECONDS = float(os.environ.get("LOGIN_DEADLINE_SECONDS", "30"))
+# limites de conexões abertas (503 no handshake), total e por IP; 0 = sem limite
+MAX_CONNECTIONS = int(os.environ.get("MAX_CONNECTIONS", "10000"))
+MAX_CONNECTIONS_PER_IP = int(os.environ.get("MAX_CONNECTIONS_PER_IP", "50"))
+# memória por conexão na entrada: tamanho máximo de uma mensagem e quantas ficam no buffer
+MAX_MESSAGE_BYTES = int(os.environ.get("MAX_MESSAGE_BYTES", "65536"))
+MAX_INCOMING_QUEUE = int(os.environ.get("MAX_INCOMING_QUEUE", "16"))
+
+# deltas da lista de salas saem agrupados, no máximo um a cada N ms
+ROOM_LIST_FLUSH_MS = int(os.environ.get("ROOM_LIST_FLUSH_MS", "250"))
+
+# espectadores recebem os eventos da sala em lotes a cada N ms, com atraso (anti-"ghosting")
+SPECTATE_FLUSH_MS = int(os.environ.get("SPECTATE_FLUSH_MS", "500"))
+SPECTATE_DELAY_MS = int(os.environ.get("SPECTATE_DELAY_MS", "2000"))
+
+# cache de usuários na frente do banco (0 desliga); "não existe" expira mais cedo
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", "300"))
+USER_CACHE_NEGATIVE_TTL_SECONDS = float(os.environ.get("USER_CACHE_NEGATIVE_TTL_SECONDS", "30"))
+
+# admin_list_rooms: tamanho padrão e máximo de uma página
+ADMIN_PAGE_SIZE = int(os.environ.get("ADMIN_PAGE_SIZE", "50"))
+ADMIN_PAGE_MAX = 500
+
+# conexões de leitura do pool do banco (a escrita tem uma thread só)
+DB_READERS = int(os.environ.get("DB_READERS", "4"))
+
+# token de sessão devolvido no login_ok; "resume" reconecta sem PBKDF2
+SESSION_TTL_SECONDS = int(os.environ.get("SESSION_TTL_SECONDS", str(24 * 3600)))
+SESSION_PRUNE_SECONDS = 600.0  # varredura das revogações vencidas (na timer wheel)
+
+# partidas de truco: 2 ou 4 jogadores sentados na sala
+GAME_TARGET_POINTS = int(os.environ.get("GAME_TARGET_POINTS", "30"))
+GAME_FLOR = os.environ.get("GAME_FLOR", "1") != "0"
+# deltas de estado guardados por assento para quem pular um seq ou cair e voltar
+GAME_DELTA_WINDOW = int(os.environ.get("GAME_DELTA_WINDOW", "32"))
+# jogador que caiu (sem sair) tem N segundos para voltar antes de a partida ser cancelada
+GAME_REJOIN_GRACE_SECONDS = float(os.environ.get("GAME_REJOIN_GRACE_SECONDS", "20"))
+
+# matchmaking (queue_match): baldes de rating e janela que alarga com a espera
+MATCH_BUCKET_WIDTH = float(os.environ.get("MATCH_BUCKET_WIDTH", "100"))
+MATCH_WIDEN_PER_SECOND = float(os.environ.get("MATCH_WIDEN_PER_SECOND", "20"))
+MATCH_MAX_WINDOW = float(os.environ.get("MATCH_MAX_WINDOW", "400"))
+MATCH_TICK_SECONDS = 1.0
+MATCH_ROOM_PREFIX = "partida-"
+
+# robôs (Monte Carlo em pool de processos); BOT_THINK_MS é o orçamento por decisão
+BOT_THINK_MS = float(os.environ.get("BOT_THINK_MS", "200"))
+BOT_WORKERS = int(os.environ.get("BOT_WORKERS", "0")) or None  # 0 = nº de CPUs
+
+# métricas: admin_stats e texto estilo Prometheus em http://METRICS_HOST:METRICS_PORT/metrics (0 desliga)
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9465"))
+LOOP_LAG_INTERVAL_SECONDS = 0.5
+
+# modo multi-core (cluster.py): SHARD_COUNT processos na mesma porta (SO_REUSEPORT);
+# cada sala pertence a um shard, e quem pede sala de outro recebe um redirect
+# para a porta direta do dono (SHARD_PORT_BASE + shard)
+SHARD_ID = int(os.environ.get("SHARD_ID", "0"))
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT", "1"))
+SHARD_PORT_BASE = int(os.environ.get("SHARD_PORT_BASE", str(PORT + 1)))
+BUS_PORT = int(os.environ.get("BUS_PORT", "0"))
+
+# tipos conhecidos; o resto vira "unknown" nas métricas (cardinalidade fixa)
+MESSAGE_TYPES = {
+    "register", "login", "resume", "logout",
+    "admin_list_rooms", "admin_close_room", "admin_kick", "admin_logout_user", "admin_stats",
+    "admin_subscribe", "admin_unsubscribe",
+    "create_room", "join_room", "leave_room", "room_list_sync", "chat",
+    "game_start", "game_action", "add_bot", "remove_bot",
+    "leaderboard", "player_stats", "match_history", "queue_match", "cancel_match",
+    "spectate", "stop_spectating", "game_resync",
+}
 
 
 def log(msg):
-    print(f"[SERVER] {msg}")
+    tag = f"SERVER {SHARD_ID}" if SHARD_COUNT > 1 else "SERVER"
+    print(f"[{tag}] {msg}")
 
 
 def _clean(s: str) -> str:
     return (s or "").strip()
 
 
-def validate_len(field: str, value: str, min_len: int, max_len: int) -> str | None:
-    if not (min_len <= len(value) <= max_len):
-        return f"{field} deve ter entre {min_len} e {max_len} caracteres"
-    return None
-
-
 async def safe_send(ws, data: dict):
+    if fanout.is_open(ws):
+        return fanout.send(ws, data)
+    if BotConnection is not None and isinstance(ws, BotConnection):
+        await ws.send(data)  # o robô lê o dict direto, sem passar por JSON
+        return True
     try:
         await ws.send(json.dumps(data))
         return True
@@ -81,28 +200,115 @@ async def safe_send(ws, data: dict):
 
 
 # ----- DB init -----
-create_tables()
 try:
-    ensure_schema_or_raise()
+    applied = migrate()
 except RuntimeError as e:
     log(str(e))
     raise SystemExit(1)
+if applied:
+    log(f"Banco migrado para a versão {applied[-1]} (aplicadas: {applied})")
 
 # ----- estado -----
-rooms = {}
-clients = set()
-conn_info = {}  # ws -> {"authed","username","role","room","last_chat"}
+user_cache = UserCache(
+    max_entries=USER_CACHE_SIZE,
+    ttl=USER_CACHE_TTL_SECONDS,
+    negative_ttl=USER_CACHE_NEGATIVE_TTL_SECONDS,
+) if USER_CACHE_SIZE > 0 else None
+db = AsyncDatabase(readers=DB_READERS, user_cache=user_cache)
+hash_params = HashParams(HASH_ALG, HASH_COST) if HASH_COST > 0 else calibrate(HASH_TARGET_MS, HASH_ALG)
+hasher = HashService(workers=HASH_WORKERS, max_pending=HASH_MAX_PENDING, kind=HASH_POOL, params=hash_params)
+log(f"Hash de senha: {hash_params.alg}, custo {hash_params.cost}")
+fanout = FanOut(max_queue=SEND_QUEUE_MAX, policy=SLOW_CONSUMER_POLICY)
+lobby = RoomListFeed(fanout, flush_ms=ROOM_LIST_FLUSH_MS)
+sessions = SessionManager(
+    load_or_create_secret(),
+    ttl_seconds=SESSION_TTL_SECONDS,
+    not_before=load_session_revocations(),
+    revoked=load_revoked_sessions(),
+)
+chat_log = ChatLog(
+    CHAT_LOG_DIR,
+    prefix=f"chat-s{SHARD_ID}" if SHARD_COUNT > 1 else "chat",
+    segment_bytes=CHAT_LOG_SEGMENT_MB << 20,
+    fsync_interval=CHAT_LOG_FSYNC_MS / 1000.0,
+) if CHAT_LOG else None
+replays = ReplayLog(
+    REPLAY_DIR,
+    prefix=f"replay-s{SHARD_ID}" if SHARD_COUNT > 1 else "replay",
+    segment_bytes=REPLAY_LOG_SEGMENT_MB << 20,
+    fsync_interval=CHAT_LOG_FSYNC_MS / 1000.0,
+) if REPLAY_LOG else None
+bot_pool = BotPool(workers=BOT_WORKERS, think_ms=BOT_THINK_MS) if BotPool else None
+bus = BusClient(SHARD_ID, port=BUS_PORT) if SHARD_COUNT > 1 else None
+admin_feed = AdminFeed(
+    fanout,
+    flush_ms=ROOM_LIST_FLUSH_MS,
+    forward=(lambda events: bus.publish("admin_events", events=events)) if bus else None,
+    shard=SHARD_ID if bus else None,
+)
+state = State(history_size=CHAT_HISTORY_SIZE, on_change=admin_feed.event)
+spectators = SpectatorFeed(
+    fanout,
+    state.spectators_of,
+    flush_ms=SPECTATE_FLUSH_MS,
+    delay_ms=SPECTATE_DELAY_MS,
+    on_dead=lambda dead: drop_dead(dead),
+)
+wheel = TimerWheel(tick=TIMER_TICK_SECONDS)
+limiter = RateLimiter(parse_rules(RATE_LIMITS), wheel)
+matchmaker = Matchmaker(MATCH_BUCKET_WIDTH, MATCH_WIDEN_PER_SECOND, MATCH_MAX_WINDOW)
+match_seq = 0
+bot_seq = 0
+remote_rooms = {}  # sala -> shard dono (só no modo multi-core)
+
+metrics = Metrics()
+metrics.gauge("connections", lambda: len(state.conns) - state.bots, "conexões WebSocket abertas")
+metrics.gauge("rooms", lambda: len(state.rooms), "salas abertas")
+metrics.gauge("authed_users", lambda: state.authed - state.bots, "conexões autenticadas")
+metrics.gauge("online_users", lambda: len(state.by_user), "usuários distintos conectados")
+metrics.gauge("send_queue_messages", lambda: fanout.stats()["queued"], "mensagens nas filas de saída")
+metrics.gauge("send_queue_max_depth", lambda: fanout.stats()["max_depth"], "maior fila de saída")
+metrics.counter("send_dropped_total", lambda: fanout.dropped, "mensagens descartadas por cliente lento")
+metrics.gauge("hash_in_flight", lambda: hasher.in_flight, "hashes rodando ou na fila")
+metrics.gauge("hash_queue_depth", lambda: hasher.queue_depth, "hashes esperando worker")
+metrics.counter("hash_rejected_total", lambda: hasher.rejected, "hashes recusados por fila cheia")
+metrics.gauge("db_write_queue", lambda: db.stats()["write_queue"], "escritas esperando o writer")
+metrics.section("fanout", fanout.stats)
+metrics.section("hashing", hasher.stats)
+metrics.section("db", db.stats)
+if user_cache is not None:
+    metrics.gauge("user_cache_hit_ratio", lambda: user_cache.stats()["hit_rate"], "acertos do cache de usuários")
+    metrics.section("user_cache", user_cache.stats)
+metrics.section("rate_limit", limiter.stats)
+metrics.gauge("match_queue", lambda: len(matchmaker), "jogadores na fila do matchmaking")
+metrics.gauge("spectators", lambda: sum(len(r.spectators) for r in state.rooms.values()), "espectadores conectados")
+metrics.section("spectate", spectators.stats)
+metrics.section("matchmaking", matchmaker.stats)
+metrics.gauge("rate_buckets", lambda: len(limiter.buckets), "token buckets ativos")
+if chat_log:
+    metrics.gauge("chat_log_queue", lambda: chat_log.stats()["queue"], "eventos esperando o log de chat")
+    metrics.section("chat_log", chat_log.stats)
+if replays:
+    metrics.section("replay_log", replays.stats)
+if bus:
+    metrics.gauge("remote_rooms", lambda: len(remote_rooms), "salas de outros shards")
+    metrics.section("bus", bus.stats)
+if bot_pool:
+    metrics.counter("bot_decisions_total", lambda: bot_pool.decisions, "decisões tomadas pelos robôs")
+    metrics.section("bots", bot_pool.stats)
+hasher.observer = metrics.observer("hash_seconds")
+db.observer = metrics.observer("db_seconds")
 
 # ----- bootstrap dono (cria 1 admin no primeiro run) -----
 OWNER_BOOTSTRAP_USER = os.environ.get("OWNER_BOOTSTRAP_USER", "").strip()
 OWNER_BOOTSTRAP_PASS = os.environ.get("OWNER_BOOTSTRAP_PASS", "")
 
-if OWNER_BOOTSTRAP_USER and OWNER_BOOTSTRAP_PASS:
+if OWNER_BOOTSTRAP_USER and OWNER_BOOTSTRAP_PASS and SHARD_ID == 0:
     row = get_user_by_username(OWNER_BOOTSTRAP_USER)
     if not row:
         created = create_user(
             OWNER_BOOTSTRAP_USER,
-            hash_password(OWNER_BOOTSTRAP_PASS),
+            hash_password(OWNER_BOOTSTRAP_PASS, hash_params),
             role="admin",
         )
         if created:
@@ -113,76 +319,670 @@ if OWNER_BOOTSTRAP_USER and OWNER_BOOTSTRAP_PASS:
         log("Admin bootstrap não criado (já existe).")
 
 
-async def broadcast_room_list():
-    payload = {"type": "room_list", "rooms": list(rooms.keys())}
-    dead = []
-    for ws in list(clients):
-        ok = await safe_send(ws, payload)
-        if not ok:
-            dead.append(ws)
+def drop_dead(dead):
+    # a Connection fica para o finally do handler, que faz o leave_room completo
     for ws in dead:
-        clients.discard(ws)
-        conn_info.pop(ws, None)
+        lobby.unsubscribe(ws)
+        admin_feed.unsubscribe(ws)
+        fanout.close(ws)
+        state.drop_socket(ws)
+
+
+def open_room(room_name: str):
+    room, created = state.open_room(room_name)
+    if created:
+        lobby.room_added(room_name)
+        if bus:
+            bus.publish("room_added", room=room_name)
+    return room
+
+
+def delete_room(room_name: str):
+    room = state.rooms.get(room_name)
+    if room is not None and room.spectators:
+        fanout.broadcast(list(room.spectators), {"type": "spectate_end", "room": room_name})
+    spectators.forget(room_name)
+    if state.close_room(room_name) is not None:
+        lobby.room_removed(room_name)
+        if bus:
+            bus.publish("room_removed", room=room_name)
 
 
 async def broadcast(room_name: str, data: dict):
-    room = rooms.get(room_name)
+    room = state.rooms.get(room_name)
     if not room:
         return
-    dead = []
-    for ws in list(room["connections"]):
-        ok = await safe_send(ws, data)
-        if not ok:
-            dead.append(ws)
-    for ws in dead:
-        room["connections"].discard(ws)
-        clients.discard(ws)
-        conn_info.pop(ws, None)
+    feed = data
+    if data.get("type") in HISTORY_TYPES:
+        event = {"ts": round(time.time(), 3), **data}
+        room.history.add(event)
+        if chat_log:
+            chat_log.append(room_name, event)
+        feed = event  # o mesmo objeto no histórico e na fila dos espectadores (ver spectate)
+    drop_dead(fanout.broadcast(list(room.sockets), data))
+    if room.spectators:
+        spectators.add(room_name, feed)  # fora do caminho dos jogadores: sai no próximo lote
+
+
+async def leave_room(ws, dropped: bool = False):
+    """Tira a conexão da sala; dropped = caiu (não pediu para sair) e pode voltar."""
+    conn = state.conn(ws)
+    if not conn:
+        return
+    username = conn.username
+    room = state.leave(conn)
+    if room is None or not username:
+        return
+
+    if dropped and await hold_seat(room, username):
+        return
+    await broadcast(room.name, {"type": "system", "message": f"{username} saiu da sala"})
+    await abandon_game(room.name, username)
+    await tidy_room(room, by_bot=conn.is_bot)
+
+
+async def tidy_room(room, by_bot: bool = False):
+    if not by_bot and room.members and state.room_has_only_bots(room):
+        # robô não fica sozinho numa sala
+        for bots in list(room.members.values()):
+            for bot in list(bots):
+                await remove_bot_connection(bot.ws)
+
+    if not room.members and state.rooms.get(room.name) is room:
+        delete_room(room.name)
+
+
+async def hold_seat(room, username: str) -> bool:
+    """Segura o assento de quem caiu no meio da partida; False se não há o que segurar."""
+    table = room.game
+    if not table or table.seat_of(username) < 0 or GAME_REJOIN_GRACE_SECONDS <= 0:
+        return False
+    if username not in room.members:
+        wheel.schedule_in(("seat", room.name, username), GAME_REJOIN_GRACE_SECONDS, on_seat_expired)
+        await broadcast(room.name, {
+            "type": "system",
+            "message": f"{username} caiu; a partida espera {GAME_REJOIN_GRACE_SECONDS:.0f}s pela volta",
+        })
+    return True  # ou ainda tem outra conexão na sala
+
+
+def on_seat_expired(key):
+    _, room_name, username = key
+    asyncio.get_running_loop().create_task(release_seat(room_name, username))
+
+
+async def release_seat(room_name: str, username: str):
+    room = state.rooms.get(room_name)
+    if room is None or username in room.members:
+        return
+    await broadcast(room_name, {"type": "system", "message": f"{username} não voltou"})
+    await abandon_game(room_name, username)
+    await tidy_room(room)
+
+
+async def enter_room(ws, room_name: str, create: bool, game_seq=None):
+    conn = state.conn(ws)
+    if conn.room and conn.room != room_name:
+        await leave_room(ws)
+    if conn.watching:
+        state.unspectate(conn)  # virou jogador
+
+    room = open_room(room_name) if create else state.rooms[room_name]
+    state.join(conn, room)
+    wheel.cancel(("seat", room_name, conn.username))  # voltou a tempo
+
+    await safe_send(ws, {"type": "room_joined", "room": room_name})
+    if room.history.events:
+        await safe_send(ws, room.history.frame(room_name))
+    if not create:
+        await broadcast(room_name, {"type": "system", "message": f"{conn.username} entrou na sala"})
+    if room.game:
+        await send_game_catchup(ws, room_name, game_seq)
+
+
+# ----- shards -----
+def shard_of(room_name: str) -> int:
+    return zlib.crc32(room_name.encode("utf-8")) % SHARD_COUNT
+
+
+def room_owner(room_name: str) -> int | None:
+    if room_name in state.rooms:
+        return SHARD_ID
+    return remote_rooms.get(room_name)
+
+
+async def redirect_if_remote(ws, room_name: str, spectate: bool = False, create: bool = False) -> bool:
+    """Sala de outro shard: manda o cliente reconectar no dono (com resume).
+
+    create = veio de um create_room: o resume no dono pode criar a sala.
+    """
+    if SHARD_COUNT == 1:
+        return False
+    owner = shard_of(room_name)
+    if owner == SHARD_ID:
+        return False
+    await safe_send(ws, {
+        "type": "redirect",
+        "room": room_name,
+        "shard": owner,
+        "port": SHARD_PORT_BASE + owner,
+        **({"spectate": True} if spectate else {}),
+        **({"create": True} if create else {}),
+    })
+    return True
+
+
+async def call_shard(shard: int, method: str, **args) -> dict:
+    try:
+        return await bus.call(shard, method, **args)
+    except asyncio.TimeoutError:
+        return {"error": f"Shard {shard} não respondeu"}
+    except BusError as e:
+        return {"error": f"Shard {shard}: {e}"}
+
+
+async def on_room_added(msg):
+    remote_rooms[msg["room"]] = msg["from"]
+    lobby.room_added(msg["room"])
+
+
+async def on_room_removed(msg):
+    if remote_rooms.get(msg["room"]) == msg["from"]:
+        del remote_rooms[msg["room"]]
+        lobby.room_removed(msg["room"])
+
+
+async def on_shard_hello(msg):
+    # shard (re)iniciado: conta para ele as salas que já existem aqui
+    bus.send_to(msg["from"], "rooms", rooms=list(state.rooms))
+
+
+async def on_shard_rooms(msg):
+    for room_name in msg["rooms"]:
+        await on_room_added({"room": room_name, "from": msg["from"]})
+
+
+async def on_shard_down(msg):
+    for room_name in [r for r, s in remote_rooms.items() if s == msg["from"]]:
+        await on_room_removed({"room": room_name, "from": msg["from"]})
+
+
+async def on_logout_user(msg):
+    sessions.not_before[msg["username"]] = msg["ts"]
+    await logout_user_local(msg["username"])
+
+
+async def on_revoke_session(msg):
+    sessions.revoke_sid(msg["sid"], msg["until"])
+
+
+async def on_user_changed(msg):
+    db.invalidate_user(msg["username"])
+
+
+async def on_admin_events(msg):
+    admin_feed.relay(msg["events"])
+
+
+async def on_bus_reconnect():
+    # enquanto estivemos fora os outros shards viram shard_down e esqueceram nossas
+    # salas, e podemos ter perdido room_added/room_removed deles: recomeça do zero
+    for room_name in list(remote_rooms):
+        del remote_rooms[room_name]
+        lobby.room_removed(room_name)
+    bus.publish("rooms", rooms=list(state.rooms))
+    bus.publish("hello")
+    log("Barramento reconectado")
+
 
+async def bus_list_rooms(**query):
+    return list_rooms_local(**query)
 
-async def leave_room(ws):
-    info = conn_info.get(ws)
-    if not info:
+
+async def bus_stats():
+    return metrics.snapshot()
+
+
+async def start_bus():
+    for op, fn in (
+        ("room_added", on_room_added),
+        ("room_removed", on_room_removed),
+        ("hello", on_shard_hello),
+        ("rooms", on_shard_rooms),
+        ("shard_down", on_shard_down),
+        ("logout_user", on_logout_user),
+        ("revoke_session", on_revoke_session),
+        ("admin_events", on_admin_events),
+        ("user_changed", on_user_changed),
+    ):
+        bus.on(op, fn)
+    bus.method("list_rooms", bus_list_rooms)
+    bus.method("stats", bus_stats)
+    bus.method("close_room", close_room)
+    bus.method("kick", kick_user)
+    bus.on_reconnect = on_bus_reconnect
+    await bus.connect()
+    bus.publish("hello")
+
+
+# ----- jogo -----
+# jogadores recebem game_delta numerado por assento (ver gamesync.py); quem pula um
+# seq pede game_resync. Robôs estão no mesmo processo e seguem com o game_state inteiro
+async def send_game_views(room_name: str):
+    room = state.rooms.get(room_name)
+    table = room and room.game
+    if not table:
+        return
+    for seat, username in enumerate(table.players):
+        view = table.view(seat)
+        delta = table.streams[seat].update(view)  # avança mesmo sem ninguém conectado no assento
+        conns = room.members.get(username, ())
+        humans = [conn.ws for conn in conns if not conn.is_bot]
+        if delta and humans:
+            drop_dead(fanout.broadcast(humans, {"type": "game_delta", "room": room_name, **delta}))
+        for conn in conns:
+            if conn.is_bot:
+                await safe_send(conn.ws, {"type": "game_state", "room": room_name, "state": view})
+    if room.spectators:
+        spectators.add(room_name, {"type": "game_state", "room": room_name, "state": table.view(-1)})
+
+
+async def send_game_catchup(ws, room_name: str, seq=None):
+    """Deltas que faltam depois de seq, ou a foto do assento se a janela não cobre."""
+    room = state.rooms.get(room_name)
+    table = room and room.game
+    conn = state.conn(ws)
+    seat = table.seat_of(conn.username) if table and conn else -1
+    if seat < 0 or table.streams[seat].view is None:
+        return
+    stream = table.streams[seat]
+    missing = stream.since(seq)
+    if missing is None:
+        await safe_send(ws, {"type": "game_state", "room": room_name, **stream.snapshot()})
+        return
+    for delta in missing:
+        await safe_send(ws, {"type": "game_delta", "room": room_name, **delta})
+
+
+async def game_resync(ws, data):
+    room_name = _clean(data.get("room"))
+    if not room_name or state.conn(ws).room != room_name:
+        await safe_send(ws, {"type": "error", "message": "Você não está nessa sala"})
+        return
+    await send_game_catchup(ws, room_name, data.get("seq"))
+
+
+async def start_game(ws, room_name: str):
+    room = state.rooms.get(room_name)
+    if not room or state.conn(ws).room != room_name:
+        await safe_send(ws, {"type": "error", "message": "Você não está nessa sala"})
+        return
+    if room.game:
+        await safe_send(ws, {"type": "error", "message": "Já existe uma partida nessa sala"})
+        return
+    if len(room) not in (2, 4):
+        await safe_send(ws, {"type": "error", "message": "A partida precisa de 2 ou 4 jogadores na sala"})
+        return
+
+    await begin_game(room, room.users)
+
+
+async def begin_game(room, players: list):
+    # players na ordem dos assentos; times alternados: assentos 0/2 contra 1/3
+    for username in players:
+        ticket = matchmaker.cancel(username)  # começou uma partida: sai da fila
+        if ticket:
+            fanout.send(ticket.payload, {"type": "match_cancelled"})
+    table = room.game = Table(players, target=GAME_TARGET_POINTS, flor=GAME_FLOR, delta_window=GAME_DELTA_WINDOW)
+    table.start_hand()
+    await broadcast(room.name, {"type": "game_started", "room": room.name, "players": players})
+    await send_game_views(room.name)
+
+
+async def game_action(ws, room_name: str, data):
+    room = state.rooms.get(room_name)
+    table = room and room.game
+    conn = state.conn(ws)
+    if not table or conn.room != room_name:
+        await safe_send(ws, {"type": "error", "message": "Não há partida nessa sala"})
+        return
+
+    err, event = table.act(conn.username, data.get("action"), data.get("card"))
+    if err:
+        await safe_send(ws, {"type": "error", "message": err})
+        return
+
+    await broadcast(room_name, {"type": "game_event", "room": room_name, **event})
+    if table.match_over:
+        await finish_game(room_name, winner=table.match.winner)
+        return
+    if table.hand_over:
+        table.start_hand()
+    await send_game_views(room_name)
+
+
+async def finish_game(room_name: str, winner: int = -1, reason: str | None = None, abandoned_by: str | None = None):
+    room = state.rooms.get(room_name)
+    table = room and room.game
+    if not table:
+        return
+    room.game = None
+    m = table.match
+    db.record_match_nowait({
+        "room": room_name,
+        "started_at": table.started_at,
+        "finished_at": time.time(),
+        "winner": winner,
+        "score": [m.score[0], m.score[1]],
+        "reason": reason,
+        "seed": table.seed,
+        "abandoned_by": abandoned_by,
+        "seats": [(name, not name.startswith(BOT_PREFIX)) for name in table.players],
+    })
+    if replays:
+        replays.append(table, winner)  # achado depois pela semente (matches.seed)
+    msg = {
+        "type": "game_over",
+        "room": room_name,
+        "players": table.players,
+        "score": [m.score[0], m.score[1]],
+        "winner": winner,
+    }
+    if reason:
+        msg["reason"] = reason
+    await broadcast(room_name, msg)
+
+
+async def abandon_game(room_name: str, username: str):
+    room = state.rooms.get(room_name)
+    table = room and room.game
+    if table and table.seat_of(username) >= 0:
+        await finish_game(room_name, reason=f"{username} saiu; partida cancelada", abandoned_by=username)
+
+
+# ----- espectadores -----
+# fora de room.members: não contam para a partida e não recebem broadcast evento a evento
+async def spectate(ws, room_name: str):
+    conn = state.conn(ws)
+    if conn.room:
+        await safe_send(ws, {"type": "error", "message": "Saia da sala antes de assistir outra"})
+        return
+    room = state.rooms.get(room_name)
+    if room is None:
+        if room_owner(room_name) is not None and await redirect_if_remote(ws, room_name, spectate=True):
+            return
+        await safe_send(ws, {"type": "error", "message": "Sala não existe"})
+        return
+    first = not room.spectators
+    state.spectate(conn, room)
+    await safe_send(ws, {
+        "type": "spectating",
+        "room": room_name,
+        "players": room.game.players if room.game else room.users,
+        "delay_ms": SPECTATE_DELAY_MS,
+    })
+    # do histórico vai agora só o que já passou do atraso e já saiu da fila do
+    # feed; o resto chega nos lotes, uma vez só
+    now = time.time()
+    cutoff = now - SPECTATE_DELAY_MS / 1000.0
+    if first:
+        spectators.backfill(room_name, [(now - e["ts"], e) for e in room.history.events if e["ts"] > cutoff])
+    held = spectators.held(room_name)
+    events = [e for e in room.history.events if e["ts"] <= cutoff and id(e) not in held]
+    if events:
+        await safe_send(ws, {"type": "chat_history", "room": room_name, "events": events})
+    last = spectators.last_state.get(room_name)
+    if last is not None:
+        await safe_send(ws, last)
+
+
+async def stop_spectating(ws):
+    room = state.unspectate(state.conn(ws))
+    await safe_send(ws, {"type": "spectate_end", "room": room.name if room else None})
+
+
+# ----- matchmaking -----
+# cada shard casa quem está conectado nele; a sala nasce com nome do próprio shard
+async def queue_match(ws, data):
+    conn = state.conn(ws)
+    try:
+        mode = int(data.get("mode") or 2)
+    except (TypeError, ValueError):
+        mode = 0
+    if mode not in MODES:
+        await safe_send(ws, {"type": "error", "message": "Modo inválido (2 ou 4 jogadores)"})
+        return
+    room = state.rooms.get(conn.room) if conn.room else None
+    if room and room.game and room.game.seat_of(conn.username) >= 0:
+        await safe_send(ws, {"type": "error", "message": "Termine a partida atual antes de entrar na fila"})
+        return
+    rating = await db.rating(conn.username)
+    if state.conn(ws) is not conn or not conn.authed:
+        return  # saiu enquanto lia o rating
+    group = matchmaker.enqueue(conn.username, rating, mode, payload=ws)
+    await safe_send(ws, {"type": "match_queued", "mode": mode, "rating": round(rating, 1), "queued": len(matchmaker)})
+    if group:
+        await start_match(group)
+    else:
+        arm_match_tick()
+
+
+def arm_match_tick():
+    if "matchmaking" not in wheel:
+        wheel.schedule_in("matchmaking", MATCH_TICK_SECONDS, on_match_tick)
+
+
+def cancel_match(ws, notify: bool = True) -> bool:
+    conn = state.conn(ws)
+    ticket = conn and conn.username and matchmaker.get(conn.username)
+    if not ticket or ticket.payload is not ws:
+        return False
+    matchmaker.cancel(conn.username)
+    if notify:
+        fanout.send(ws, {"type": "match_cancelled"})
+    return True
+
+
+def on_match_tick(_key):
+    for group in matchmaker.tick():
+        asyncio.get_running_loop().create_task(start_match(group))
+    if len(matchmaker):
+        arm_match_tick()
+
+
+def new_match_room() -> str:
+    global match_seq
+    while True:
+        match_seq += 1
+        name = f"{MATCH_ROOM_PREFIX}{SHARD_ID}-{match_seq}"
+        if name not in state.rooms and (SHARD_COUNT == 1 or shard_of(name) == SHARD_ID):
+            return name
+
+
+async def start_match(group: list):
+    seats = balanced_seats(group)
+    players = [t.key for t in seats]
+    present = [t for t in seats if state.conn(t.payload) is not None and state.conn(t.payload).username == t.key]
+    if len(present) < len(seats):
+        # alguém sumiu no caminho: os outros voltam para a fila
+        for t in present:
+            group = matchmaker.enqueue(t.key, t.rating, t.mode, payload=t.payload)
+            if group:
+                asyncio.get_running_loop().create_task(start_match(group))
+        if len(matchmaker):
+            arm_match_tick()
         return
-    room_name = info.get("room")
-    username = info.get("username")
-    if not room_name or room_name not in rooms or not username:
-        info["room"] = None
+
+    room_name = new_match_room()
+    for i, t in enumerate(seats):
+        await enter_room(t.payload, room_name, create=(i == 0))
+    room = state.rooms.get(room_name)
+    if room is None or len(room) != len(seats):
+        return  # alguém caiu enquanto entrava; a sala segue como uma sala comum
+    ratings = {t.key: round(t.rating, 1) for t in seats}
+    await broadcast(room_name, {"type": "match_found", "room": room_name, "players": players, "ratings": ratings})
+    await begin_game(room, players)
+
+
+# ----- ranking -----
+# tudo sai de player_stats e dos índices de match_players (ver database.py)
+RANKING_PAGE_MAX = 100
+
+
+def _int_arg(data: dict, key: str, default: int, low: int, high: int) -> int:
+    try:
+        value = int(data.get(key) if data.get(key) is not None else default)
+    except (TypeError, ValueError):
+        value = default
+    return min(max(value, low), high)
+
+
+async def send_leaderboard(ws, data):
+    """Ranking por páginas: "next" da resposta volta como "after" para pedir a seguinte."""
+    limit = _int_arg(data, "limit", 20, 1, RANKING_PAGE_MAX)
+    after = data.get("after")
+    key, rank = None, 0
+    if isinstance(after, dict):
+        try:
+            key = (float(after["rating"]), str(after["user"]))
+            rank = max(0, int(after.get("rank") or 0))
+        except (KeyError, TypeError, ValueError):
+            await safe_send(ws, {"type": "error", "message": "Cursor do ranking inválido"})
+            return
+    rows = await db.leaderboard(limit, key)
+    reply = {
+        "type": "leaderboard",
+        "rows": [
+            {"rank": rank + i + 1, "user": u, "rating": round(r, 1), "games": g, "wins": w, "losses": lo}
+            for i, (u, r, g, w, lo) in enumerate(rows)
+        ],
+        "next": None,
+    }
+    if len(rows) == limit:
+        u, r = rows[-1][0], rows[-1][1]
+        reply["next"] = {"rating": r, "user": u, "rank": rank + len(rows)}  # rating sem arredondar
+    await safe_send(ws, reply)
+
+
+async def send_player_stats(ws, username: str):
+    row = await db.player_stats(username)
+    stats = None
+    if row:
+        keys = ("user", "games", "wins", "losses", "abandoned", "points_for", "points_against", "rating", "rank")
+        stats = dict(zip(keys, row))
+        stats["rating"] = round(stats["rating"], 1)
+    await safe_send(ws, {"type": "player_stats", "user": username, "stats": stats})
+
+
+async def send_match_history(ws, username: str, data):
+    limit = _int_arg(data, "limit", 20, 1, RANKING_PAGE_MAX)
+    before = _int_arg(data, "before", 0, 0, 2 ** 62) or None
+    rows = await db.match_history(username, before, limit)
+    matches = [
+        {
+            "id": mid, "room": room, "finished_at": fin, "winner": win, "score": [s0, s1], "reason": reason,
+            "team": team, "result": result,
+            "rating_change": round(after - before_r, 1) if after is not None else None,
+        }
+        for mid, room, fin, win, s0, s1, reason, team, result, before_r, after in rows
+    ]
+    await safe_send(ws, {
+        "type": "match_history",
+        "user": username,
+        "matches": matches,
+        "next_before": matches[-1]["id"] if len(matches) == limit else None,
+    })
+
+
+# ----- robôs -----
+async def add_bot(ws, room_name: str):
+    global bot_seq
+    room = state.rooms.get(room_name)
+    if not room or state.conn(ws).room != room_name:
+        await safe_send(ws, {"type": "error", "message": "Você não está nessa sala"})
+        return
+    if bot_pool is None:
+        await safe_send(ws, {"type": "error", "message": "Robôs indisponíveis neste servidor"})
+        return
+    if room.game:
+        await safe_send(ws, {"type": "error", "message": "Já existe uma partida nessa sala"})
         return
+    if len(room) >= 4:
+        await safe_send(ws, {"type": "error", "message": "Sala cheia para uma partida"})
+        return
+
+    bot_seq += 1
+    username = f"{BOT_PREFIX}{bot_seq}"
+    bot = BotConnection(username, bot_pool, on_action=bot_action)
+    fanout.open(bot)
+    state.login(state.connect(bot), None, username, "bot", None)
+    await enter_room(bot, room_name, create=False)
 
-    rooms[room_name]["users"].discard(username)
-    rooms[room_name]["connections"].discard(ws)
-    info["room"] = None
 
-    await broadcast(room_name, {"type": "system", "message": f"{username} saiu da sala"})
+async def remove_bot(ws, room_name: str, username: str):
+    room = state.rooms.get(room_name)
+    if not room or state.conn(ws).room != room_name:
+        await safe_send(ws, {"type": "error", "message": "Você não está nessa sala"})
+        return
+    names = [username] if username else list(room.members)
+    for name in names:
+        bots = [c for c in room.members.get(name, ()) if c.is_bot]
+        if bots:
+            await remove_bot_connection(bots[0].ws)
+            return
+    await safe_send(ws, {"type": "error", "message": "Robô não encontrado nessa sala"})
+
 
-    if not rooms[room_name]["users"]:
-        del rooms[room_name]
+async def bot_action(bot, data: dict):
+    if bot in state.conns:
+        await dispatch(bot, "game_action", data)
 
-    await broadcast_room_list()
+
+async def remove_bot_connection(bot):
+    await disconnect(bot)
+    await bot.close()
+
+
+async def send_busy(ws):
+    log(f"Hashing saturado: {hasher.stats()}")
+    await safe_send(ws, {
+        "type": "error",
+        "message": "Servidor ocupado, tente novamente em instantes",
+        "retry_after": HASH_RETRY_AFTER_SECONDS,
+    })
 
 
 def is_admin(ws) -> bool:
-    info = conn_info.get(ws) or {}
-    return info.get("role") == "admin"
+    conn = state.conn(ws)
+    return conn is not None and conn.role == "admin"
 
 
 async def handle_register(ws, data):
     username = _clean(data.get("user"))
     password = data.get("pass") or ""
 
-    err = (
-        validate_len("Usuário", username, USERNAME_MIN, USERNAME_MAX)
-        or validate_len("Senha", password, PASSWORD_MIN, PASSWORD_MAX)
-    )
+    err = validate_username(username) or validate_password(password)
     if err:
         await safe_send(ws, {"type": "error", "message": err})
         return
 
-    ok = create_user(username, hash_password(password), role="user")
+    # nome já usado: recusa antes de pagar o hash (quase sempre resolvido no cache)
+    if await db.get_user_by_username(username):
+        await safe_send(ws, {"type": "error", "message": "Não foi possível criar a conta"})
+        return
+
+    try:
+        password_hash = await hasher.hash(password)
+    except HashBusy:
+        await send_busy(ws)
+        return
+
+    ok = await db.create_user(username, password_hash, role="user")
     if not ok:
         await safe_send(ws, {"type": "error", "message": "Não foi possível criar a conta"})
         return
+    if bus:
+        bus.publish("user_changed", username=username)  # tira o "não existe" do cache dos outros shards
 
     await safe_send(ws, {"type": "register_ok"})
 
@@ -199,216 +999,618 @@ async def handle_login(ws, data):
         await safe_send(ws, {"type": "error", "message": err})
         return
 
-    row = get_user_by_username(username)
+    row = await db.get_user_by_username(username)
     if not row:
         await safe_send(ws, {"type": "error", "message": "Login inválido"})
         return
 
     user_id, username_db, password_hash, role = row
-    if not verify_password(password, password_hash):
+    try:
+        ok, stale = await hasher.verify(password, password_hash)
+    except HashBusy:
+        await send_busy(ws)
+        return
+    if not ok:
         await safe_send(ws, {"type": "error", "message": "Login inválido"})
         return
+    if stale and hasher.idle:
+        # parâmetros antigos: refaz em segundo plano só com worker livre (senão, no próximo login)
+        asyncio.get_running_loop().create_task(rehash_password(username_db, password, password_hash))
 
-    conn_info[ws]["authed"] = True
-    conn_info[ws]["username"] = username_db
-    conn_info[ws]["role"] = role
+    if ws not in state.conns:
+        return  # desconectou enquanto o hash rodava
+    await start_session(ws, user_id, username_db, role)
 
-    await safe_send(ws, {"type": "login_ok", "role": role})
-    await broadcast_room_list()
+
+async def rehash_password(username: str, password: str, old_hash: str):
+    try:
+        new_hash = await hasher.hash(password)
+    except HashBusy:
+        return
+    if await db.update_password_hash(username, old_hash, new_hash):
+        hasher.rehashed += 1
+        if bus:
+            bus.publish("user_changed", username=username)
+
+
+async def start_session(ws, user_id: int, username: str, role: str, sid: str | None = None):
+    """login_ok com token novo; com sid (resume), o token continua a mesma sessão."""
+    conn = state.conn(ws)
+    if conn.session and conn.session["sid"] != sid:
+        await revoke_session(conn.session)
+    if conn.authed and conn.username != username:
+        await leave_room(ws)  # trocou de usuário: sai da sala com aviso
+    token, claims = sessions.issue(user_id, username, role, sid=sid)
+    state.login(conn, user_id, username, role, claims)
+    wheel.cancel(("login", ws))
+    if role != "admin":
+        admin_feed.unsubscribe(ws)
+
+    reply = {"type": "login_ok", "role": role, "token": token, "expires_in": SESSION_TTL_SECONDS}
+    if sid:
+        reply["resumed"] = True
+    await safe_send(ws, reply)
+    lobby.subscribe(ws)
+
+
+async def handle_resume(ws, data):
+    # HMAC e o cache de usuários: nada de PBKDF2 numa tempestade de reconexões
+    claims = sessions.verify(data.get("token"))
+    row = await db.get_user_by_username(claims["u"]) if claims else None
+    if row is None:
+        await safe_send(ws, {"type": "error", "message": "Sessão inválida ou expirada, faça login", "code": "session_invalid"})
+        return
+    if ws not in state.conns:
+        return
+    # o papel vem do banco, não do token: admin rebaixado perde o acesso no próximo resume
+    user_id, username_db, _, role = row
+    await start_session(ws, user_id, username_db, role, sid=claims["sid"])
+
+    room_name = _clean(data.get("room"))
+    if room_name and not validate_len("Sala", room_name, ROOM_MIN, ROOM_MAX):
+        create = data.get("create") is True  # só o create_room redirecionado de outro shard
+        if await redirect_if_remote(ws, room_name, create=create):
+            return
+        if room_name not in state.rooms and not create:
+            # fechada pelo admin ou esvaziada enquanto o cliente estava fora: não ressuscita
+            await safe_send(ws, {"type": "error", "message": f"A sala {room_name} não existe mais", "code": "room_gone"})
+            return
+        await enter_room(ws, room_name, create=room_name not in state.rooms, game_seq=data.get("game_seq"))
+    elif data.get("spectate"):
+        await spectate(ws, _clean(data.get("spectate")))
+
+
+async def revoke_session(claims: dict):
+    """Logout de uma sessão: gravado (vale depois de um restart) e avisado aos outros shards."""
+    until = sessions.revoke(claims)
+    await db.execute(UPSERT_REVOKED_SESSION, (claims["sid"], until))
+    if bus:
+        bus.publish("revoke_session", sid=claims["sid"], until=until)
+
+
+def on_session_prune(key):
+    sessions.prune()
+    wheel.schedule_in(key, SESSION_PRUNE_SECONDS, on_session_prune)
+
+
+async def handle_logout(ws):
+    conn = state.conn(ws)
+    cancel_match(ws, notify=False)
+    await leave_room(ws)
+    lobby.unsubscribe(ws)
+    admin_feed.unsubscribe(ws)
+    if conn.session:
+        await revoke_session(conn.session)
+    state.logout(conn)
+    arm_login_deadline(ws)  # volta a ter prazo para logar
+    await safe_send(ws, {"type": "logout_ok"})
 
 
 # ----- comandos admin -----
-async def admin_list_rooms(ws):
+# close_room/kick_user rodam no shard dono da sala e devolvem {"ok"} ou {"error"},
+# para servirem tanto ao admin conectado aqui quanto a um pedido vindo do barramento
+async def admin_list_rooms(ws, data):
     if not is_admin(ws):
         await safe_send(ws, {"type": "error", "message": "Sem permissão"})
         return
-    payload = []
-    for name, room in rooms.items():
-        payload.append({"room": name, "users": sorted(list(room["users"]))})
-    await safe_send(ws, {"type": "admin_rooms", "rooms": payload})
+    try:
+        limit = int(data.get("limit") or ADMIN_PAGE_SIZE)
+        min_users = int(data.get("min_users") or 0)
+    except (TypeError, ValueError):
+        await safe_send(ws, {"type": "error", "message": "limit e min_users devem ser números"})
+        return
+    query = {
+        "cursor": _clean(data.get("cursor")),
+        "prefix": _clean(data.get("prefix")),
+        "min_users": max(0, min_users),
+        "user": _clean(data.get("user")) or None,
+        "limit": min(max(1, limit), ADMIN_PAGE_MAX),
+    }
+    pages = [list_rooms_local(**query)]
+    if bus:
+        others = await bus.call_all((s for s in range(SHARD_COUNT) if s != SHARD_ID), "list_rooms", **query)
+        pages.extend(others.values())
+    rooms, cursor = merge_room_pages(pages, query["limit"])
+    await safe_send(ws, {"type": "admin_rooms", "rooms": rooms, "next_cursor": cursor, "query": query})
+
+
+def list_rooms_local(cursor: str, prefix: str, min_users: int, user: str | None, limit: int) -> dict:
+    rooms, next_cursor = state.list_rooms(cursor, prefix, min_users, user, limit)
+    entries = [{"room": room.name, "users": room.users} for room in rooms]
+    if bus:
+        for entry in entries:
+            entry["shard"] = SHARD_ID
+    return {"rooms": entries, "next": next_cursor}
+
+
+def merge_room_pages(pages: list, limit: int) -> tuple[list, str | None]:
+    """Junta as páginas dos shards (cada uma em ordem) numa só, sem pular salas.
+
+    Um shard que parou antes do fim (next) só garante as salas até o cursor
+    dele; o que os outros mandaram depois disso fica para a próxima página.
+    """
+    horizon = min((p["next"] for p in pages if p["next"] is not None), default=None)
+    rooms = sorted(
+        (e for p in pages for e in p["rooms"] if horizon is None or e["room"] <= horizon),
+        key=lambda e: e["room"],
+    )
+    if len(rooms) > limit:
+        rooms = rooms[:limit]
+        return rooms, rooms[-1]["room"]
+    return rooms, horizon
 
 
-async def admin_close_room(ws, room_name: str):
+async def admin_subscribe(ws):
     if not is_admin(ws):
         await safe_send(ws, {"type": "error", "message": "Sem permissão"})
         return
-    room = rooms.get(room_name)
-    if not room:
-        await safe_send(ws, {"type": "error", "message": "Sala não existe"})
+    admin_feed.subscribe(ws)
+
+
+async def admin_stats(ws):
+    if not is_admin(ws):
+        await safe_send(ws, {"type": "error", "message": "Sem permissão"})
         return
+    stats = metrics.snapshot()
+    if bus:
+        stats["shard"] = SHARD_ID
+        others = await bus.call_all((s for s in range(SHARD_COUNT) if s != SHARD_ID), "stats")
+        stats["shards"] = {str(s): snap for s, snap in sorted(others.items())}
+    await safe_send(ws, {"type": "admin_stats", "stats": stats})
+
+
+async def send_admin_result(ws, result: dict):
+    if "error" in result:
+        await safe_send(ws, {"type": "error", "message": result["error"]})
+    else:
+        await safe_send(ws, {"type": "admin_ok", "message": result["ok"]})
+
+
+async def run_on_owner(ws, method: str, fn, **args):
+    owner = room_owner(args["room_name"])
+    if owner is None:
+        result = {"error": "Sala não existe"}
+    elif owner == SHARD_ID:
+        result = await fn(**args)
+    else:
+        result = await call_shard(owner, method, **args)
+    await send_admin_result(ws, result)
+
+
+async def admin_close_room(ws, room_name: str):
+    if not is_admin(ws):
+        await safe_send(ws, {"type": "error", "message": "Sem permissão"})
+        return
+    await run_on_owner(ws, "close_room", close_room, room_name=room_name)
+
+
+async def close_room(room_name: str) -> dict:
+    if room_name not in state.rooms:
+        return {"error": "Sala não existe"}
 
     await broadcast(room_name, {"type": "system", "message": "Sala fechada pelo admin"})
-    for cws in list(room["connections"]):
-        info = conn_info.get(cws)
-        if info:
-            info["room"] = None
-    del rooms[room_name]
-    await broadcast_room_list()
-    await safe_send(ws, {"type": "admin_ok", "message": f"Sala '{room_name}' fechada"})
+    delete_room(room_name)  # solta os membros, que continuam conectados
+    return {"ok": f"Sala '{room_name}' fechada"}
+
+
+async def admin_logout_user(ws, username: str):
+    if not is_admin(ws):
+        await safe_send(ws, {"type": "error", "message": "Sem permissão"})
+        return
+    if not username:
+        await safe_send(ws, {"type": "error", "message": "Informe o usuário"})
+        return
+
+    # invalida todos os tokens já emitidos e desloga as conexões abertas
+    ts = sessions.revoke_user(username)
+    await db.execute(UPSERT_SESSION_NOT_BEFORE, (username, ts))
+    if bus:
+        bus.publish("logout_user", username=username, ts=ts)
+    count = await logout_user_local(username)
+    where = " neste shard" if bus else ""
+    await safe_send(ws, {"type": "admin_ok", "message": f"Logout forçado de {username} ({count} conexões{where})"})
+
+
+async def logout_user_local(username: str) -> int:
+    targets = state.user_connections(username)
+    for conn in targets:
+        await safe_send(conn.ws, {"type": "system", "message": "Sua sessão foi encerrada pelo admin"})
+        await handle_logout(conn.ws)
+    return len(targets)
 
 
 async def admin_kick_user(ws, room_name: str, username: str):
     if not is_admin(ws):
         await safe_send(ws, {"type": "error", "message": "Sem permissão"})
         return
-    room = rooms.get(room_name)
+    await run_on_owner(ws, "kick", kick_user, room_name=room_name, username=username)
+
+
+async def kick_user(room_name: str, username: str) -> dict:
+    room = state.rooms.get(room_name)
     if not room:
-        await safe_send(ws, {"type": "error", "message": "Sala não existe"})
+        return {"error": "Sala não existe"}
+    if username not in room.members:
+        return {"error": "Usuário não encontrado nessa sala"}
+
+    kicked = state.kick(room, username)
+    for conn in kicked:
+        await safe_send(conn.ws, {"type": "system", "message": "Você foi removido da sala pelo admin"})
+    await broadcast(room_name, {"type": "system", "message": f"{username} foi removido pelo admin"})
+    await abandon_game(room_name, username)
+    for conn in kicked:
+        if conn.is_bot:
+            await remove_bot_connection(conn.ws)
+    await tidy_room(room)  # como no leave_room: sala que sobrou só com robôs também some
+    return {"ok": f"Kick em {username} da sala {room_name} realizado"}
+
+
+async def dispatch(ws, t, data):
+    if t == "register":
+        await handle_register(ws, data)
         return
 
-    target_ws = None
-    for cws in list(room["connections"]):
-        info = conn_info.get(cws) or {}
-        if info.get("username") == username:
-            target_ws = cws
-            break
+    if t == "login":
+        await handle_login(ws, data)
+        return
 
-    if not target_ws:
-        await safe_send(ws, {"type": "error", "message": "Usuário não encontrado nessa sala"})
+    if t == "resume":
+        await handle_resume(ws, data)
         return
 
-    room["users"].discard(username)
-    room["connections"].discard(target_ws)
-    if conn_info.get(target_ws):
-        conn_info[target_ws]["room"] = None
+    conn = state.conn(ws)
+    if not conn.authed:
+        await safe_send(ws, {"type": "error", "message": "Faça login primeiro"})
+        return
 
-    await safe_send(target_ws, {"type": "system", "message": "Você foi removido da sala pelo admin"})
-    await broadcast(room_name, {"type": "system", "message": f"{username} foi removido pelo admin"})
-    if not room["users"]:
-        del rooms[room_name]
-    await broadcast_room_list()
-    await safe_send(ws, {"type": "admin_ok", "message": f"Kick em {username} da sala {room_name} realizado"})
+    if t == "logout":
+        await handle_logout(ws)
+        return
 
+    username = conn.username
 
-async def handler(ws):
-    clients.add(ws)
-    conn_info[ws] = {"authed": False, "username": None, "role": None, "room": None, "last_chat": 0.0}
-    log("Cliente conectado")
+    # ---- admin endpoints ----
+    if t == "admin_list_rooms":
+        await admin_list_rooms(ws, data)
+        return
+    if t == "admin_subscribe":
+        await admin_subscribe(ws)
+        return
+    if t == "admin_unsubscribe":
+        admin_feed.unsubscribe(ws)
+        return
+    if t == "admin_close_room":
+        await admin_close_room(ws, _clean(data.get("room")))
+        return
+    if t == "admin_kick":
+        await admin_kick_user(ws, _clean(data.get("room")), _clean(data.get("user")))
+        return
+    if t == "admin_logout_user":
+        await admin_logout_user(ws, _clean(data.get("user")))
+        return
+    if t == "admin_stats":
+        await admin_stats(ws)
+        return
 
-    try:
-        async for raw in ws:
-            try:
-                data = json.loads(raw)
-            except json.JSONDecodeError:
-                await safe_send(ws, {"type": "error", "message": "JSON inválido"})
-                continue
+    # ---- normal rooms/chat ----
+    if t == "create_room":
+        room_name = _clean(data.get("room"))
+        err = validate_len("Sala", room_name, ROOM_MIN, ROOM_MAX)
+        if err:
+            await safe_send(ws, {"type": "error", "message": err})
+            return
+        if await redirect_if_remote(ws, room_name, create=True):
+            return
+        await enter_room(ws, room_name, create=True)
+        return
 
-            t = data.get("type")
+    if t == "join_room":
+        room_name = _clean(data.get("room"))
+        if room_owner(room_name) is None:
+            await safe_send(ws, {"type": "error", "message": "Sala não existe"})
+            return
+        if await redirect_if_remote(ws, room_name):
+            return
+        await enter_room(ws, room_name, create=False)
+        return
 
-            if t == "register":
-                await handle_register(ws, data)
-                continue
+    if t == "leave_room":
+        await leave_room(ws)
+        return
 
-            if t == "login":
-                await handle_login(ws, data)
-                continue
+    if t == "spectate":
+        await spectate(ws, _clean(data.get("room")))
+        return
 
-            if not conn_info[ws]["authed"]:
-                await safe_send(ws, {"type": "error", "message": "Faça login primeiro"})
-                continue
+    if t == "stop_spectating":
+        await stop_spectating(ws)
+        return
 
-            username = conn_info[ws]["username"]
+    if t == "room_list_sync":
+        lobby.send_snapshot(ws)
+        return
 
-            # ---- admin endpoints ----
-            if t == "admin_list_rooms":
-                await admin_list_rooms(ws)
-                continue
-            if t == "admin_close_room":
-                await admin_close_room(ws, _clean(data.get("room")))
-                continue
-            if t == "admin_kick":
-                await admin_kick_user(ws, _clean(data.get("room")), _clean(data.get("user")))
-                continue
+    if t == "game_start":
+        await start_game(ws, _clean(data.get("room")))
+        return
 
-            # ---- normal rooms/chat ----
-            if t == "create_room":
-                room_name = _clean(data.get("room"))
-                err = validate_len("Sala", room_name, ROOM_MIN, ROOM_MAX)
-                if err:
-                    await safe_send(ws, {"type": "error", "message": err})
-                    continue
-                if conn_info[ws]["room"] and conn_info[ws]["room"] != room_name:
-                    await leave_room(ws)
-
-                rooms.setdefault(room_name, {"users": set(), "connections": set()})
-                rooms[room_name]["users"].add(username)
-                rooms[room_name]["connections"].add(ws)
-                conn_info[ws]["room"] = room_name
-
-                await safe_send(ws, {"type": "room_joined", "room": room_name})
-                await broadcast_room_list()
-                continue
+    if t == "game_action":
+        await game_action(ws, _clean(data.get("room")), data)
+        return
+
+    if t == "game_resync":
+        await game_resync(ws, data)
+        return
 
-            if t == "join_room":
-                room_name = _clean(data.get("room"))
-                if room_name not in rooms:
-                    await safe_send(ws, {"type": "error", "message": "Sala não existe"})
-                    continue
-                if conn_info[ws]["room"] and conn_info[ws]["room"] != room_name:
-                    await leave_room(ws)
+    if t == "add_bot":
+        await add_bot(ws, _clean(data.get("room")))
+        return
 
-                rooms[room_name]["users"].add(username)
-                rooms[room_name]["connections"].add(ws)
-                conn_info[ws]["room"] = room_name
+    if t == "queue_match":
+        await queue_match(ws, data)
+        return
 
-                await safe_send(ws, {"type": "room_joined", "room": room_name})
-                await broadcast(room_name, {"type": "system", "message": f"{username} entrou na sala"})
-                continue
+    if t == "cancel_match":
+        if not cancel_match(ws):
+            await safe_send(ws, {"type": "error", "message": "Você não está na fila"})
+        return
 
-            if t == "leave_room":
-                await leave_room(ws)
-                continue
+    if t == "leaderboard":
+        await send_leaderboard(ws, data)
+        return
+
+    if t == "player_stats":
+        await send_player_stats(ws, _clean(data.get("user")) or username)
+        return
+
+    if t == "match_history":
+        await send_match_history(ws, _clean(data.get("user")) or username, data)
+        return
+
+    if t == "remove_bot":
+        await remove_bot(ws, _clean(data.get("room")), _clean(data.get("user")))
+        return
+
+    if t == "chat":
+        room_name = _clean(data.get("room"))
+        msg = _clean(data.get("message"))
+
+        if not conn.room:
+            await safe_send(ws, {"type": "error", "message": "Você não está em uma sala"})
+            return
+        if room_name != conn.room:
+            await safe_send(ws, {"type": "error", "message": "Você não está nessa sala"})
+            return
+
+        err = validate_len("Mensagem", msg, CHAT_MIN, CHAT_MAX)
+        if err:
+            await safe_send(ws, {"type": "error", "message": err})
+            return
+
+        await broadcast(room_name, {"type": "chat", "user": username, "message": msg})
+        return
+
+    await safe_send(ws, {"type": "error", "message": "Tipo de mensagem desconhecido"})
+
+
+def rate_limited(ws, kind: str) -> bool:
+    """Confere os buckets antes do dispatch; recusa com retry_after sem tocar em hashing nem broadcast."""
+    conn = state.conn(ws)
+    wait = limiter.check(kind, ws, conn.username, conn.ip)
+    if wait is None:
+        return False
+    metrics.inc("rate_limited_total", type=kind)
+    message = "Envie mensagens mais devagar" if kind == "chat" else "Muitas requisições, aguarde"
+    # chave fixa: uma enxurrada recusada vira um único erro pendente na fila de saída
+    fanout.send(ws, {"type": "error", "message": message, "retry_after": round(wait, 2)}, key="rate_limited")
+    return True
+
+
+# ----- vida das conexões -----
+# tudo na timer wheel: um ping só sai para quem está calado, e o custo por
+# tick é o das conexões que vencem nele, não o de todas as abertas
+
+def check_admission(connection, request):
+    """process_request do handshake: recusa com 503 acima dos limites de conexões."""
+    ip = (connection.remote_address or ("?",))[0]
+    cause = None
+    if MAX_CONNECTIONS and len(state.conns) - state.bots >= MAX_CONNECTIONS:
+        cause = "global"
+    elif MAX_CONNECTIONS_PER_IP and state.ip_connections(ip) >= MAX_CONNECTIONS_PER_IP:
+        cause = "ip"
+    if cause is None:
+        return None
+    metrics.inc("connections_rejected_total", cause=cause)
+    return connection.respond(HTTPStatus.SERVICE_UNAVAILABLE, "Servidor cheio, tente mais tarde\n")
+
+
+def arm_liveness(ws):
+    if HEARTBEAT_INTERVAL_SECONDS > 0:
+        wheel.schedule_in(("heartbeat", ws), HEARTBEAT_INTERVAL_SECONDS, on_heartbeat)
+    arm_login_deadline(ws)
+
+
+def arm_login_deadline(ws):
+    if LOGIN_DEADLINE_SECONDS > 0:
+        wheel.schedule_in(("login", ws), LOGIN_DEADLINE_SECONDS, on_login_deadline)
+
+
+def on_login_deadline(key):
+    ws = key[1]
+    conn = state.conn(ws)
+    if conn is not None and not conn.authed:
+        reap(ws, "login", 1008, "Tempo para login esgotado")
+
+
+def on_heartbeat(key):
+    ws = key[1]
+    conn = state.conn(ws)
+    if conn is None:
+        return
+    silent = time.monotonic() - conn.last_seen
+    if HEARTBEAT_TIMEOUT_SECONDS > 0 and silent >= HEARTBEAT_TIMEOUT_SECONDS:
+        reap(ws, "heartbeat", 1011, "Sem resposta ao ping")
+        return
+    if silent >= HEARTBEAT_INTERVAL_SECONDS:
+        asyncio.get_running_loop().create_task(send_ping(ws, conn))
+    wheel.schedule_in(key, HEARTBEAT_INTERVAL_SECONDS, on_heartbeat)
+
+
+async def send_ping(ws, conn):
+    try:
+        pong = await ws.ping()
+    except websockets.exceptions.ConnectionClosed:
+        return
+    pong.add_done_callback(lambda f: mark_alive(conn, f))
+
+
+def mark_alive(conn, pong):
+    if not pong.cancelled() and pong.exception() is None:
+        conn.last_seen = time.monotonic()
+
+
+def reap(ws, cause: str, code: int, reason: str):
+    """Tira a conexão dos broadcasts já e fecha; o finally do handler faz o resto."""
+    metrics.inc("connections_reaped_total", cause=cause)
+    log(f"Conexão derrubada ({cause})")
+    drop_dead([ws])
+    asyncio.get_running_loop().create_task(ws.close(code=code, reason=reason))
+
+
+async def disconnect(ws):
+    wheel.cancel(("heartbeat", ws))
+    wheel.cancel(("login", ws))
+    cancel_match(ws, notify=False)
+    try:
+        await leave_room(ws, dropped=True)
+    except:
+        pass
+    lobby.unsubscribe(ws)
+    admin_feed.unsubscribe(ws)
+    fanout.close(ws)
+    limiter.forget_conn(ws)
+    state.disconnect(ws)
+
+
+async def handler(ws):
+    fanout.open(ws)
+    conn = state.connect(ws, ip=(ws.remote_address or ("?",))[0])
+    arm_liveness(ws)
+    log("Cliente conectado")
 
-            if t == "chat":
-                room_name = _clean(data.get("room"))
-                msg = _clean(data.get("message"))
-
-                if not conn_info[ws]["room"]:
-                    await safe_send(ws, {"type": "error", "message": "Você não está em uma sala"})
-                    continue
-                if room_name != conn_info[ws]["room"]:
-                    await safe_send(ws, {"type": "error", "message": "Você não está nessa sala"})
-                    continue
-
-                err = validate_len("Mensagem", msg, CHAT_MIN, CHAT_MAX)
-                if err:
-                    await safe_send(ws, {"type": "error", "message": err})
-                    continue
-
-                now = time.time()
-                if now - conn_info[ws]["last_chat"] < CHAT_COOLDOWN_SECONDS:
-                    await safe_send(ws, {"type": "error", "message": "Envie mensagens mais devagar"})
-                    continue
-                conn_info[ws]["last_chat"] = now
-
-                await broadcast(room_name, {"type": "chat", "user": username, "message": msg})
+    try:
+        async for raw in ws:
+            conn.last_seen = time.monotonic()
+            try:
+                data = json.loads(raw)
+            except json.JSONDecodeError:
+                if not rate_limited(ws, "invalid"):
+                    await safe_send(ws, {"type": "error", "message": "JSON inválido"})
                 continue
 
-            await safe_send(ws, {"type": "error", "message": "Tipo de mensagem desconhecido"})
+            t = data.get("type") if isinstance(data, dict) else None
+            kind = t if t in MESSAGE_TYPES else "unknown"
+            if rate_limited(ws, kind):
+                continue
+            t0 = time.perf_counter()
+            try:
+                await dispatch(ws, t, data)
+            finally:
+                metrics.inc("messages_total", type=kind)
+                metrics.observe("handler_seconds", time.perf_counter() - t0, type=kind)
 
     except websockets.exceptions.ConnectionClosed:
         log("Cliente desconectado")
     finally:
-        try:
-            await leave_room(ws)
-        except:
-            pass
-        clients.discard(ws)
-        conn_info.pop(ws, None)
-        try:
-            await broadcast_room_list()
-        except:
-            pass
+        await disconnect(ws)
+
+
+SERVE_OPTIONS = dict(
+    ping_interval=None,  # o heartbeat é da timer wheel (on_heartbeat), não uma task por conexão
+    max_size=MAX_MESSAGE_BYTES or None,
+    max_queue=MAX_INCOMING_QUEUE,
+    process_request=check_admission,
+)
 
 
 async def main():
     log(f"Iniciando servidor em ws://{HOST}:{PORT}")
+    db.start()
+    if chat_log:
+        chat_log.start()
+    if replays:
+        replays.start()
+    lag_task = asyncio.create_task(metrics.sample_loop_lag(LOOP_LAG_INTERVAL_SECONDS))
+    wheel_task = asyncio.create_task(wheel.run())
+    wheel.schedule_in("session_prune", SESSION_PRUNE_SECONDS, on_session_prune)
+    metrics_server = None
+    if METRICS_PORT:
+        try:
+            metrics_server = await metrics.serve_http(METRICS_HOST, METRICS_PORT + SHARD_ID)
+            log(f"Métricas em http://{METRICS_HOST}:{METRICS_PORT + SHARD_ID}/metrics")
+        except OSError as e:
+            log(f"Endpoint de métricas desligado: {e}")
+    stop = asyncio.get_running_loop().create_future()
+    try:
+        # SIGTERM encerra limpo (e derruba os workers do pool de hashing junto)
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.cancel)
+    except (NotImplementedError, AttributeError):
+        pass
     try:
-        async with websockets.serve(handler, HOST, PORT):
-            log("Servidor rodando.")
-            await asyncio.Future()
+        if bus:
+            await start_bus()
+            # porta compartilhada (o kernel distribui as conexões) + porta direta do shard
+            async with websockets.serve(handler, HOST, PORT, reuse_port=True, **SERVE_OPTIONS), \
+                    websockets.serve(handler, HOST, SHARD_PORT_BASE + SHARD_ID, **SERVE_OPTIONS):
+                log(f"Shard {SHARD_ID}/{SHARD_COUNT} rodando (direta: {SHARD_PORT_BASE + SHARD_ID}).")
+                await stop
+        else:
+            async with websockets.serve(handler, HOST, PORT, **SERVE_OPTIONS):
+                log("Servidor rodando.")
+                await stop
+    except asyncio.CancelledError:
+        log("Encerrando servidor.")
     except OSError as e:
         log(f"Não foi possível iniciar (porta ocupada?): {e}")
-
-
-asyncio.run(main())
+    finally:
+        lag_task.cancel()
+        wheel_task.cancel()
+        if bus:
+            bus.close()
+        if metrics_server is not None:
+            metrics_server.close()
+        lobby.close()
+        admin_feed.close()
+        spectators.close()
+        hasher.shutdown()
+        if bot_pool:
+            bot_pool.shutdown()
+        if chat_log:
+            chat_log.close()
+        if replays:
+            replays.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
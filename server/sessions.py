@@ -0,0 +1,117 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+
+from database import DB_PATH
+
+SESSION_KEY_PATH = DB_PATH.parent / "session.key"
+
+
+def _b64e(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64d(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def load_or_create_secret(path=SESSION_KEY_PATH) -> bytes:
+    """Chave HMAC persistida em disco, para os tokens sobreviverem a um restart."""
+    env = os.environ.get("SESSION_SECRET", "")
+    if env:
+        return env.encode("utf-8")
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        key = secrets.token_bytes(32)
+        fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+        return key
+
+
+class SessionManager:
+    """Tokens de sessão assinados (HMAC-SHA256) com expiração e revogação.
+
+    Formato: v1.<payload base64url>.<assinatura base64url>. O resume emite um
+    token novo com o mesmo sid, então revogar o sid (logout) derruba a cadeia
+    inteira, até o último token que ela pode ter emitido expirar; revogar um
+    usuário invalida todos os tokens emitidos antes daquele instante (logout
+    forçado).
+    """
+
+    VERSION = "v1"
+
+    def __init__(self, secret: bytes, ttl_seconds: int = 24 * 3600, not_before=None, revoked=None):
+        self.secret = secret
+        self.ttl = ttl_seconds
+        self.revoked = dict(revoked or {})  # sid -> até quando vale a revogação
+        self.not_before = dict(not_before or {})  # username -> tokens com iat menor são inválidos
+
+    def _sign(self, body: str) -> str:
+        return _b64e(hmac.new(self.secret, body.encode("ascii"), hashlib.sha256).digest())
+
+    def issue(self, user_id: int, username: str, role: str, sid: str | None = None) -> tuple[str, dict]:
+        """Token novo; sid de um token já verificado continua a mesma sessão (resume)."""
+        now = time.time()
+        claims = {
+            "sid": sid or secrets.token_hex(8),
+            "uid": user_id,
+            "u": username,
+            "r": role,
+            "iat": now,
+            "exp": int(now + self.ttl),
+        }
+        body = self.VERSION + "." + _b64e(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+        return body + "." + self._sign(body), claims
+
+    def verify(self, token) -> dict | None:
+        """Claims do token, ou None para qualquer token inválido (inclusive lixo vindo do cliente)."""
+        if not isinstance(token, str):
+            return None
+        try:
+            version, payload, sig = token.split(".")
+            if version != self.VERSION:
+                return None
+            # compara bytes: str com caractere não ASCII não chega no compare_digest
+            if not hmac.compare_digest(sig.encode("ascii"), self._sign(version + "." + payload).encode("ascii")):
+                return None
+            claims = json.loads(_b64d(payload))
+        except (UnicodeError, ValueError):
+            return None
+        if not isinstance(claims, dict):
+            return None
+        if claims.get("exp", 0) < time.time():
+            return None
+        if claims.get("sid") in self.revoked:
+            return None
+        if claims.get("iat", 0) < self.not_before.get(claims.get("u"), 0):
+            return None
+        return claims
+
+    def revoke(self, claims: dict) -> float:
+        """Revoga a sessão (o sid); devolve até quando a revogação precisa durar."""
+        # um resume em outro socket pode ter emitido depois deste token: cobre o TTL inteiro
+        until = max(claims["exp"], int(time.time() + self.ttl))
+        self.revoke_sid(claims["sid"], until)
+        return until
+
+    def revoke_sid(self, sid: str, until: float):
+        self.revoked[sid] = max(until, self.revoked.get(sid, 0))
+
+    def revoke_user(self, username: str) -> float:
+        ts = time.time()
+        self.not_before[username] = ts
+        return ts
+
+    def prune(self) -> int:
+        """Esquece revogações vencidas (o token já expirou); roda periódico, não a cada revoke."""
+        now = time.time()
+        expired = [sid for sid, until in self.revoked.items() if until < now]
+        for sid in expired:
+            del self.revoked[sid]
+        return len(expired)
@@ -0,0 +1,269 @@
+"""Estado em memória do servidor: conexões, salas e os índices entre eles.
+
+Toda mudança passa pelos métodos de State (login, entrar, sair, kick, fechar
+sala, desconectar), que mantêm os índices coerentes:
+  - usuário -> conexões (logout forçado, achar alguém sem varrer tudo)
+  - sala -> membros (username -> conexões) e sockets para o broadcast
+  - IP -> conexões
+  - sala -> espectadores (fora de members: não contam como jogadores nem
+    recebem o broadcast de cada evento)
+Mensagens e efeitos colaterais (broadcast, lobby, jogo) ficam no server.py;
+quem quiser acompanhar as mudanças passa on_change(op, **campos).
+"""
+import bisect
+import time
+
+from history import RoomHistory
+
+# quantas salas uma página pode varrer atrás de quem passa no filtro antes de parar
+LIST_SCAN_FACTOR = 20
+
+
+class Connection:
+    __slots__ = ("ws", "ip", "authed", "user_id", "username", "role", "session", "room", "watching",
+                 "last_seen")
+
+    def __init__(self, ws, ip: str | None = None):
+        self.ws = ws
+        self.ip = ip
+        self.authed = False
+        self.user_id = None
+        self.username = None
+        self.role = None
+        self.session = None  # claims do token atual
+        self.room = None  # nome da sala
+        self.watching = None  # sala assistida como espectador
+        self.last_seen = time.monotonic()  # última mensagem ou pong (heartbeat)
+
+    @property
+    def is_bot(self) -> bool:
+        return self.role == "bot"
+
+
+class Room:
+    __slots__ = ("name", "members", "sockets", "spectators", "game", "history")
+
+    def __init__(self, name: str, history_size: int):
+        self.name = name
+        self.members = {}  # username -> set[Connection]
+        self.sockets = set()  # websockets na sala (alvo do broadcast)
+        self.spectators = set()  # websockets assistindo (recebem em lote, atrasado)
+        self.game = None  # Table da partida em andamento
+        self.history = RoomHistory(history_size)
+
+    @property
+    def users(self) -> list:
+        return sorted(self.members)
+
+    def __len__(self):
+        return len(self.members)
+
+
+class State:
+    def __init__(self, history_size: int = 50, on_change=None):
+        self.history_size = history_size
+        self.on_change = on_change  # callback(op, **campos): room_added/removed, join/leave, online/offline
+        self.rooms = {}  # nome -> Room
+        self.names = []  # nomes das salas em ordem (paginação por cursor)
+        self.conns = {}  # ws -> Connection
+        self.by_user = {}  # username -> set[Connection]
+        self.by_ip = {}  # ip -> set[Connection]
+        self.authed = 0
+        self.bots = 0
+
+    def conn(self, ws) -> Connection | None:
+        return self.conns.get(ws)
+
+    # ----- conexões -----
+
+    def connect(self, ws, ip: str | None = None) -> Connection:
+        conn = self.conns[ws] = Connection(ws, ip)
+        if ip is not None:
+            self.by_ip.setdefault(ip, set()).add(conn)
+        return conn
+
+    def disconnect(self, ws) -> Connection | None:
+        """Tira a conexão de todos os índices (sala inclusive) e devolve o que era."""
+        conn = self.conns.pop(ws, None)
+        if conn is None:
+            return None
+        self.leave(conn)
+        self.unspectate(conn)
+        self.logout(conn)
+        if conn.ip is not None:
+            _discard(self.by_ip, conn.ip, conn)
+        return conn
+
+    def login(self, conn: Connection, user_id: int, username: str, role: str, session: dict | None):
+        if conn.authed and conn.username != username:
+            self.logout(conn)
+        if not conn.authed:
+            self.authed += 1
+            if role == "bot":
+                self.bots += 1
+        conn.authed = True
+        conn.user_id = user_id
+        conn.username = username
+        conn.role = role
+        conn.session = session
+        conns = self.by_user.setdefault(username, set())
+        if not conns:
+            self._changed("online", user=username)
+        conns.add(conn)
+
+    def logout(self, conn: Connection):
+        if not conn.authed:
+            return
+        self.leave(conn)
+        self.unspectate(conn)
+        if _discard(self.by_user, conn.username, conn):
+            self._changed("offline", user=conn.username)
+        self.authed -= 1
+        if conn.role == "bot":
+            self.bots -= 1
+        conn.authed = False
+        conn.user_id = conn.username = conn.role = conn.session = None
+
+    def user_connections(self, username: str) -> list:
+        return list(self.by_user.get(username, ()))
+
+    def ip_connections(self, ip: str) -> int:
+        return len(self.by_ip.get(ip, ()))
+
+    # ----- salas -----
+
+    def open_room(self, name: str) -> tuple[Room, bool]:
+        room = self.rooms.get(name)
+        if room is not None:
+            return room, False
+        room = self.rooms[name] = Room(name, self.history_size)
+        bisect.insort(self.names, name)
+        self._changed("room_added", room=name)
+        return room, True
+
+    def close_room(self, name: str) -> Room | None:
+        """Remove a sala e solta todos os membros (continuam conectados)."""
+        room = self.rooms.pop(name, None)
+        if room is None:
+            return None
+        del self.names[bisect.bisect_left(self.names, name)]
+        for conns in room.members.values():
+            for conn in conns:
+                conn.room = None
+        for ws in room.spectators:
+            conn = self.conns.get(ws)
+            if conn is not None:
+                conn.watching = None
+        room.members.clear()
+        room.sockets.clear()
+        self._changed("room_removed", room=name)
+        return room
+
+    def join(self, conn: Connection, room: Room):
+        if conn.room is not None and conn.room != room.name:
+            self.leave(conn)
+        conns = room.members.setdefault(conn.username, set())
+        if not conns:
+            self._changed("join", room=room.name, user=conn.username)
+        conns.add(conn)
+        room.sockets.add(conn.ws)
+        conn.room = room.name
+
+    def leave(self, conn: Connection) -> Room | None:
+        """Tira a conexão da sala; devolve a sala (que pode ter ficado vazia)."""
+        room = self.rooms.get(conn.room) if conn.room else None
+        conn.room = None
+        if room is None:
+            return None
+        if _discard(room.members, conn.username, conn):
+            self._changed("leave", room=room.name, user=conn.username)
+        room.sockets.discard(conn.ws)
+        return room
+
+    def spectate(self, conn: Connection, room: Room):
+        if conn.watching is not None and conn.watching != room.name:
+            self.unspectate(conn)
+        room.spectators.add(conn.ws)
+        conn.watching = room.name
+
+    def unspectate(self, conn: Connection) -> Room | None:
+        room = self.rooms.get(conn.watching) if conn.watching else None
+        conn.watching = None
+        if room is not None:
+            room.spectators.discard(conn.ws)
+        return room
+
+    def spectators_of(self, name: str):
+        room = self.rooms.get(name)
+        return room.spectators if room is not None else None
+
+    def kick(self, room: Room, username: str) -> list:
+        """Tira todas as conexões de um usuário da sala; devolve quem saiu."""
+        conns = list(room.members.pop(username, ()))
+        for conn in conns:
+            room.sockets.discard(conn.ws)
+            conn.room = None
+        if conns:
+            self._changed("leave", room=room.name, user=username)
+        return conns
+
+    def drop_socket(self, ws):
+        """Socket morto: para de receber broadcast já; o resto sai no disconnect."""
+        conn = self.conns.get(ws)
+        room = self.rooms.get(conn.room) if conn and conn.room else None
+        if room is not None:
+            room.sockets.discard(ws)
+        watched = self.rooms.get(conn.watching) if conn and conn.watching else None
+        if watched is not None:
+            watched.spectators.discard(ws)
+
+    def room_has_only_bots(self, room: Room) -> bool:
+        return all(conn.is_bot for conns in room.members.values() for conn in conns)
+
+    def list_rooms(self, cursor: str = "", prefix: str = "", min_users: int = 0,
+                   user: str | None = None, limit: int = 50) -> tuple[list, str | None]:
+        """Uma página de salas em ordem de nome, depois de `cursor`.
+
+        Devolve (salas, próximo cursor ou None no fim). Com filtro de usuário
+        parte das salas dele (índice by_user) em vez de varrer todas. A
+        varredura é limitada: se muita sala não passa no filtro, a página
+        volta menor (até vazia) com o cursor de onde parou.
+        """
+        if user:
+            names = sorted({c.room for c in self.by_user.get(user, ()) if c.room})
+        else:
+            names = self.names
+        start = bisect.bisect_right(names, cursor) if cursor else 0
+        if prefix:
+            start = max(start, bisect.bisect_left(names, prefix))
+        page = []
+        budget = limit * LIST_SCAN_FACTOR
+        for i in range(start, len(names)):
+            name = names[i]
+            if prefix and not name.startswith(prefix):
+                return page, None
+            if len(page) == limit:
+                return page, page[-1].name
+            if budget == 0:
+                return page, names[i - 1]
+            budget -= 1
+            room = self.rooms[name]
+            if len(room) >= min_users:
+                page.append(room)
+        return page, None
+
+    def _changed(self, op: str, **fields):
+        if self.on_change is not None:
+            self.on_change(op, **fields)
+
+
+def _discard(index: dict, key, conn) -> bool:
+    """Tira conn do conjunto da chave; True se o conjunto ficou vazio (e saiu do índice)."""
+    conns = index.get(key)
+    if conns is None:
+        return False
+    conns.discard(conn)
+    if not conns:
+        del index[key]
+        return True
+    return False
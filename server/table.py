@@ -0,0 +1,80 @@
+import random
+import secrets
+import time
+
+import truco
+from gamesync import ViewStream
+from truco import ACTION_BY_NAME, ERRORS, Match, OK, PLAY
+
+
+class Table:
+    """Liga uma partida do motor aos jogadores de uma sala: assentos, RNG e eventos."""
+
+    def __init__(self, players: list, target: int = 30, flor: bool = True, seed: int | None = None,
+                 delta_window: int = 32):
+        self.players = list(players)  # username por assento (times: assento % 2)
+        self.streams = [ViewStream(delta_window) for _ in self.players]  # deltas numerados por assento
+        self.match = Match(len(self.players), target=target, flor=flor)
+        self.seed = seed if seed is not None else secrets.randbits(63)
+        self.rng = random.Random(self.seed)
+        self.started_at = time.time()
+        self.moves = bytearray()  # um byte por ação aceita, para o log de replay (ver replay.py)
+
+    def seat_of(self, username: str) -> int:
+        try:
+            return self.players.index(username)
+        except ValueError:
+            return -1
+
+    def start_hand(self):
+        self.match.start_hand(self.rng)
+
+    @property
+    def hand_over(self) -> bool:
+        return self.match.phase == truco.PHASE_HAND_OVER
+
+    @property
+    def match_over(self) -> bool:
+        return self.match.phase == truco.PHASE_MATCH_OVER
+
+    def act(self, username: str, action: str, card=None):
+        """Aplica a ação do jogador; devolve (erro, evento público)."""
+        seat = self.seat_of(username)
+        if seat < 0:
+            return ERRORS[truco.E_SEAT], None
+        code = ACTION_BY_NAME.get(action)
+        if code is None:
+            return ERRORS[truco.E_ACTION], None
+        arg = 0
+        if code == PLAY:
+            if not isinstance(card, int) or isinstance(card, bool):
+                return ERRORS[truco.E_CARD], None
+            arg = card
+        rc = self.match.apply(seat, code, arg)
+        if rc != OK:
+            return ERRORS[rc], None
+        self.moves.append(arg if code == PLAY else truco.NUM_CARDS + code)
+        return None, self.event(seat, action, arg)
+
+    def event(self, seat: int, action: str, arg: int) -> dict:
+        m = self.match
+        ev = {"seat": seat, "user": self.players[seat], "action": action}
+        if action == "play":
+            ev["card"] = arg
+        elif action == "truco":
+            ev["call"] = truco.TRUCO_CALL_NAMES[m.truco_call] if m.pending == truco.PENDING_TRUCO else None
+        if m.notes & truco.NOTE_TRICK:
+            ev["trick_winner"] = m.trick_result  # 0/1 = time, 2 = parda
+        if m.notes & truco.NOTE_ENVIDO:
+            ev["envido"] = {"team": m.envido_winner, "score": m.envido_score, "points": m.points}
+        if m.notes & truco.NOTE_FLOR:
+            ev["flor"] = {"team": m.flor_winner, "points": m.points}
+        if m.notes & truco.NOTE_HAND_OVER:
+            ev["hand_over"] = {"team": m.hand_winner, "points": truco.TRUCO_POINTS[m.truco_level]}
+        ev["score"] = [m.score[0], m.score[1]]
+        return ev
+
+    def view(self, seat: int = -1) -> dict:
+        data = self.match.view(seat)
+        data["players"] = self.players
+        return data
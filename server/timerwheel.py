@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+
+class TimerWheel:
+    """Roda de timers com hash (slots de `tick` segundos) para muitos prazos baratos.
+
+    schedule() e cancel() são O(1); a cada tick só o slot da vez é visitado.
+    Prazos mais longos que uma volta ficam no slot e são conferidos de novo
+    na volta seguinte. A precisão é de um tick, o que basta para expirar
+    estado ocioso.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 512, clock=time.monotonic):
+        self.tick = tick
+        self.slots = [dict() for _ in range(slots)]  # key -> (when, fn)
+        self.where = {}  # key -> índice do slot
+        self.clock = clock
+        self.fired = 0
+        self._cursor = int(clock() / tick)
+
+    def __len__(self):
+        return len(self.where)
+
+    def __contains__(self, key):
+        return key in self.where
+
+    def _slot(self, when: float) -> int:
+        return max(int(when / self.tick), self._cursor) % len(self.slots)
+
+    def schedule(self, key, when: float, fn):
+        """Agenda fn(key) para o instante `when` (no relógio da roda); substitui o anterior."""
+        self.cancel(key)
+        i = self._slot(when)
+        self.slots[i][key] = (when, fn)
+        self.where[key] = i
+
+    def schedule_in(self, key, delay: float, fn):
+        self.schedule(key, self.clock() + delay, fn)
+
+    def cancel(self, key):
+        i = self.where.pop(key, None)
+        if i is not None:
+            self.slots[i].pop(key, None)
+
+    def advance(self, now: float | None = None):
+        """Processa todos os slots até `now`."""
+        now = self.clock() if now is None else now
+        target = int(now / self.tick)
+        steps = min(target - self._cursor + 1, len(self.slots))
+        for k in range(steps):
+            slot = self.slots[(self._cursor + k) % len(self.slots)]
+            due = [(key, fn) for key, (when, fn) in slot.items() if when <= now]
+            for key, fn in due:
+                del slot[key]
+                del self.where[key]
+            for key, fn in due:
+                self.fired += 1
+                fn(key)
+        self._cursor = max(self._cursor, target)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            self.advance()
@@ -0,0 +1,608 @@
+"""Motor de Truco (baralho espanhol de 40 cartas) autoritativo no servidor.
+
+Cartas são inteiros 0..39 (naipe * 10 + índice do valor). Força no truco e
+pontos de envido vêm de tabelas pré-calculadas; o estado da partida vive em
+arrays pré-alocados com __slots__, e apply() só mexe em inteiros, sem alocar.
+"""
+from array import array
+
+SUITS = ("espadas", "bastos", "ouros", "copas")
+RANKS = (1, 2, 3, 4, 5, 6, 7, 10, 11, 12)
+ESPADAS, BASTOS, OUROS, COPAS = range(4)
+NUM_CARDS = 40
+NO_CARD = -1
+
+
+def card(suit: int, rank: int) -> int:
+    return suit * 10 + RANKS.index(rank)
+
+
+def card_name(c: int) -> str:
+    return f"{RANKS[c % 10]} de {SUITS[c // 10]}"
+
+
+CARD_SUIT = bytes(c // 10 for c in range(NUM_CARDS))
+CARD_RANK = bytes(RANKS[c % 10] for c in range(NUM_CARDS))
+# valor da carta no envido: figuras (10, 11, 12) valem zero
+ENVIDO_VALUE = bytes(r if r <= 7 else 0 for r in CARD_RANK)
+
+
+def _strength(c: int) -> int:
+    suit, rank = CARD_SUIT[c], CARD_RANK[c]
+    special = {
+        (ESPADAS, 1): 14, (BASTOS, 1): 13, (ESPADAS, 7): 12, (OUROS, 7): 11,
+    }
+    if (suit, rank) in special:
+        return special[(suit, rank)]
+    return {3: 10, 2: 9, 1: 8, 12: 7, 11: 6, 10: 5, 7: 4, 6: 3, 5: 2, 4: 1}[rank]
+
+
+# força no truco: maior ganha (1 de espadas = 14 ... 4s = 1)
+STRENGTH = bytes(_strength(c) for c in range(NUM_CARDS))
+
+
+def _hand_index(a: int, b: int, c: int) -> int:
+    return a * 1600 + b * 40 + c
+
+
+def _envido_of(cards) -> int:
+    best = 0
+    for i in range(3):
+        best = max(best, ENVIDO_VALUE[cards[i]])
+        for j in range(i + 1, 3):
+            if CARD_SUIT[cards[i]] == CARD_SUIT[cards[j]]:
+                best = max(best, 20 + ENVIDO_VALUE[cards[i]] + ENVIDO_VALUE[cards[j]])
+    return best
+
+
+def _build_envido_table() -> bytes:
+    table = bytearray(NUM_CARDS ** 3)
+    for a in range(NUM_CARDS):
+        for b in range(NUM_CARDS):
+            if b == a:
+                continue
+            for c in range(NUM_CARDS):
+                if c != a and c != b:
+                    table[_hand_index(a, b, c)] = _envido_of((a, b, c))
+    return bytes(table)
+
+
+# pontos de envido de qualquer mão de 3 cartas, em qualquer ordem
+ENVIDO_TABLE = _build_envido_table()
+
+# ações
+PLAY, TRUCO, ENVIDO, REAL_ENVIDO, FALTA_ENVIDO, FLOR, QUIERO, NO_QUIERO, MAZO = range(9)
+ACTION_NAMES = (
+    "play", "truco", "envido", "real_envido", "falta_envido", "flor", "quiero", "no_quiero", "mazo",
+)
+ACTION_BY_NAME = {name: i for i, name in enumerate(ACTION_NAMES)}
+
+# aposta pendente
+PENDING_NONE, PENDING_TRUCO, PENDING_ENVIDO, PENDING_FLOR = range(4)
+PENDING_NAMES = (None, "truco", "envido", "flor")
+
+# fases
+PHASE_IDLE, PHASE_PLAYING, PHASE_HAND_OVER, PHASE_MATCH_OVER = range(4)
+PHASE_NAMES = ("idle", "playing", "hand_over", "match_over")
+
+# nível do truco -> pontos da mão (sem truco, truco, retruco, vale quatro)
+TRUCO_POINTS = (1, 2, 3, 4)
+TRUCO_CALL_NAMES = (None, "truco", "retruco", "vale_quatro")
+FLOR_POINTS = 3
+FLOR_REJECTED_POINTS = 4
+CONTRAFLOR_POINTS = 6
+
+PARDA = 2  # rodada empatada (em trick_winner)
+
+# notas do último apply (bitmask)
+NOTE_TRICK = 1
+NOTE_HAND_OVER = 2
+NOTE_ENVIDO = 4
+NOTE_FLOR = 8
+NOTE_MATCH_OVER = 16
+
+# códigos de retorno do apply
+OK = 0
+E_PHASE, E_SEAT, E_TURN, E_CARD, E_PENDING, E_NO_PENDING, E_TRUCO, E_ENVIDO, E_FLOR, E_ACTION = range(1, 11)
+ERRORS = {
+    E_PHASE: "A mão não está em andamento",
+    E_SEAT: "Você não está sentado nessa mesa",
+    E_TURN: "Não é a sua vez",
+    E_CARD: "Você não tem essa carta",
+    E_PENDING: "Responda a aposta primeiro",
+    E_NO_PENDING: "Não há aposta para responder",
+    E_TRUCO: "Não pode cantar truco agora",
+    E_ENVIDO: "Não pode cantar envido agora",
+    E_FLOR: "Não pode cantar flor agora",
+    E_ACTION: "Ação inválida",
+}
+
+
+class Match:
+    """Estado de uma partida de 2 ou 4 jogadores (times: assento % 2)."""
+
+    __slots__ = (
+        "n", "target", "flor_enabled", "score", "hand_points", "phase", "winner",
+        "hand_no", "mano", "turn", "trick", "leader", "played", "deck",
+        "hands", "dealt", "table", "trick_winner",
+        "truco_level", "truco_call", "truco_holder",
+        "pending", "pending_team", "responder", "suspended_responder",
+        "envido_stage", "envido_accept", "envido_reject", "envido_count", "envido_real", "envido_falta",
+        "notes", "last_seat", "last_action", "last_arg",
+        "trick_result", "hand_winner", "envido_winner", "envido_score", "flor_winner", "points_team", "points",
+    )
+
+    def __init__(self, n_players: int = 2, target: int = 30, flor: bool = True):
+        if n_players not in (2, 4):
+            raise ValueError("Truco é jogado por 2 ou 4 jogadores")
+        self.n = n_players
+        self.target = target
+        self.flor_enabled = flor
+        self.score = array("h", [0, 0])
+        self.hand_points = array("h", [0, 0])
+        self.phase = PHASE_IDLE
+        self.winner = -1
+        self.hand_no = 0
+        self.mano = -1
+        self.deck = array("b", range(NUM_CARDS))
+        self.hands = array("b", [NO_CARD] * 12)  # assento * 3 + i; NO_CARD depois de jogada
+        self.dealt = array("b", [NO_CARD] * 12)  # mão original (envido, flor, replay)
+        self.table = array("b", [NO_CARD] * 12)  # rodada * 4 + assento
+        self.trick_winner = array("b", [-1, -1, -1])
+        self._reset_hand_state()
+        self.notes = 0
+        self.last_seat = -1
+        self.last_action = -1
+        self.last_arg = 0
+
+    def _reset_hand_state(self):
+        self.turn = 0
+        self.trick = 0
+        self.leader = 0
+        self.played = 0
+        self.truco_level = 0
+        self.truco_call = 0
+        self.truco_holder = -1
+        self.pending = PENDING_NONE
+        self.pending_team = -1
+        self.responder = -1
+        self.suspended_responder = -1
+        self.envido_stage = 0  # 0 livre, 1 em disputa, 2 encerrado
+        self.envido_accept = 0
+        self.envido_reject = 0
+        self.envido_count = 0
+        self.envido_real = False
+        self.envido_falta = False
+        self.trick_result = -1
+        self.hand_winner = -1
+        self.envido_winner = -1
+        self.envido_score = 0
+        self.flor_winner = -1
+        self.points_team = -1
+        self.points = 0
+        self.hand_points[0] = self.hand_points[1] = 0
+
+    # ----- mão -----
+
+    def start_hand(self, rng):
+        """Embaralha (Fisher-Yates parcial com rng.random) e dá 3 cartas a cada assento."""
+        deck = self.deck
+        for i in range(self.n * 3):
+            j = i + int(rng.random() * (NUM_CARDS - i))
+            deck[i], deck[j] = deck[j], deck[i]
+        self.deal_cards(deck)
+
+    def deal_cards(self, cards):
+        """Como start_hand, mas com as cartas dadas (assento * 3 + i); usado por replays e testes de regra."""
+        if self.phase == PHASE_MATCH_OVER:
+            raise RuntimeError("partida encerrada")
+        self._reset_hand_state()
+        self.hand_no += 1
+        self.mano = (self.mano + 1) % self.n
+        for i in range(12):
+            c = cards[i] if i < self.n * 3 else NO_CARD
+            self.hands[i] = c
+            self.dealt[i] = c
+            self.table[i] = NO_CARD
+        self.trick_winner[0] = self.trick_winner[1] = self.trick_winner[2] = -1
+        self.turn = self.leader = self.mano
+        self.phase = PHASE_PLAYING
+        self.notes = 0
+
+    # ----- consultas -----
+
+    def team_of(self, seat: int) -> int:
+        return seat & 1
+
+    def envido_of(self, seat: int) -> int:
+        d = self.dealt
+        return ENVIDO_TABLE[d[seat * 3] * 1600 + d[seat * 3 + 1] * 40 + d[seat * 3 + 2]]
+
+    def has_flor(self, seat: int) -> bool:
+        d = self.dealt
+        s = CARD_SUIT[d[seat * 3]]
+        return CARD_SUIT[d[seat * 3 + 1]] == s and CARD_SUIT[d[seat * 3 + 2]] == s
+
+    def flor_of(self, seat: int) -> int:
+        d = self.dealt
+        return 20 + ENVIDO_VALUE[d[seat * 3]] + ENVIDO_VALUE[d[seat * 3 + 1]] + ENVIDO_VALUE[d[seat * 3 + 2]]
+
+    def has_played(self, seat: int) -> bool:
+        return self.table[self.trick * 4 + seat] != NO_CARD
+
+    def _can_sing(self, seat: int) -> bool:
+        # envido/flor: só na primeira rodada, antes de jogar a própria carta
+        return self.trick == 0 and self.envido_stage == 0 and self.table[seat] == NO_CARD
+
+    def actor(self) -> int:
+        """Assento que deve agir agora (quem responde a aposta, ou quem joga)."""
+        return self.responder if self.pending else self.turn
+
+    # ----- transição -----
+
+    def apply(self, seat: int, action: int, arg: int = 0) -> int:
+        """Aplica uma ação; devolve OK ou um código de erro (ver ERRORS) sem mudar o estado."""
+        if self.phase != PHASE_PLAYING:
+            return E_PHASE
+        if seat < 0 or seat >= self.n:
+            return E_SEAT
+        pending = self.pending
+        if pending:
+            if seat != self.responder:
+                return E_PENDING if seat == self.turn else E_TURN
+        elif seat != self.turn:
+            return E_TURN
+
+        self.notes = 0
+        self.points = 0
+        self.points_team = -1
+        if action == PLAY:
+            if pending:
+                return E_PENDING
+            rc = self._play(seat, arg)
+        elif action == TRUCO:
+            rc = self._truco(seat)
+        elif action == ENVIDO or action == REAL_ENVIDO or action == FALTA_ENVIDO:
+            rc = self._envido(seat, action)
+        elif action == FLOR:
+            rc = self._flor(seat)
+        elif action == QUIERO:
+            rc = self._quiero(seat) if pending else E_NO_PENDING
+        elif action == NO_QUIERO:
+            rc = self._no_quiero(seat) if pending else E_NO_PENDING
+        elif action == MAZO:
+            if pending:
+                return E_PENDING
+            self._end_hand(1 - (seat & 1))
+            rc = OK
+        else:
+            return E_ACTION
+        if rc == OK:
+            self.last_seat = seat
+            self.last_action = action
+            self.last_arg = arg
+        return rc
+
+    def _play(self, seat: int, c: int) -> int:
+        base = seat * 3
+        hands = self.hands
+        if c < 0:
+            return E_CARD
+        if hands[base] == c:
+            hands[base] = NO_CARD
+        elif hands[base + 1] == c:
+            hands[base + 1] = NO_CARD
+        elif hands[base + 2] == c:
+            hands[base + 2] = NO_CARD
+        else:
+            return E_CARD
+        self.table[self.trick * 4 + seat] = c
+        self.played += 1
+        if self.played < self.n:
+            self.turn = (seat + 1) % self.n
+            return OK
+        self._finish_trick()
+        return OK
+
+    def _finish_trick(self):
+        n = self.n
+        base = self.trick * 4
+        best = -1
+        best_seat = -1
+        best_team = -1
+        # percorre a partir de quem abriu: em empate do mesmo time vale a primeira carta
+        for k in range(n):
+            s = (self.leader + k) % n
+            v = STRENGTH[self.table[base + s]]
+            if v > best:
+                best, best_seat, best_team = v, s, s & 1
+            elif v == best and (s & 1) != best_team:
+                best_team = PARDA
+        self.trick_winner[self.trick] = best_team
+        self.trick_result = best_team
+        self.notes |= NOTE_TRICK
+        if best_team != PARDA:
+            self.leader = best_seat
+        self.played = 0
+        self.trick += 1
+        winner = self._hand_decided()
+        if winner >= 0:
+            self._end_hand(winner)
+        else:
+            self.turn = self.leader
+
+    def _hand_decided(self) -> int:
+        """Time que ganhou a mão pelas rodadas, ou -1 se ainda não há vencedor."""
+        tw = self.trick_winner
+        t = self.trick
+        r0, r1 = tw[0], tw[1]
+        if t == 1:
+            return -1
+        if t == 2:
+            if r0 == PARDA:
+                return r1 if r1 != PARDA else -1
+            if r1 == r0 or r1 == PARDA:
+                return r0
+            return -1
+        r2 = tw[2]
+        if r0 == PARDA and r1 == PARDA:
+            return r2 if r2 != PARDA else (self.mano & 1)
+        if r2 == PARDA:
+            return r0  # empate na terceira: ganha quem fez a primeira
+        return r2
+
+    def _truco(self, seat: int) -> int:
+        team = seat & 1
+        if self.pending == PENDING_TRUCO:
+            # subir a aposta (retruco / vale quatro) já aceita a anterior
+            if self.truco_call >= 3:
+                return E_TRUCO
+            self.truco_level = self.truco_call
+            self.truco_call += 1
+        elif self.pending:
+            return E_PENDING
+        else:
+            if self.truco_level >= 3 or (self.truco_holder != -1 and self.truco_holder != team):
+                return E_TRUCO
+            self.truco_call = self.truco_level + 1
+            self.pending = PENDING_TRUCO
+        self.pending_team = team
+        self.responder = (seat + 1) % self.n
+        return OK
+
+    def _envido(self, seat: int, action: int) -> int:
+        pending = self.pending
+        if pending == PENDING_ENVIDO:
+            if action == ENVIDO and (self.envido_count >= 2 or self.envido_real or self.envido_falta):
+                return E_ENVIDO
+            if action == REAL_ENVIDO and (self.envido_real or self.envido_falta):
+                return E_ENVIDO
+            if action == FALTA_ENVIDO and self.envido_falta:
+                return E_ENVIDO
+            self.envido_reject = self.envido_accept
+        else:
+            if pending == PENDING_FLOR or not self._can_sing(seat):
+                return E_ENVIDO
+            if pending == PENDING_TRUCO:
+                if self.trick != 0:
+                    return E_ENVIDO
+                # "o envido está primeiro": o truco espera a resolução do envido
+                self.suspended_responder = self.responder
+            self.envido_stage = 1
+            self.envido_reject = 1
+            self.envido_accept = 0
+            self.pending = PENDING_ENVIDO
+        if action == ENVIDO:
+            self.envido_count += 1
+            self.envido_accept += 2
+        elif action == REAL_ENVIDO:
+            self.envido_real = True
+            self.envido_accept += 3
+        else:
+            self.envido_falta = True
+        self.pending_team = seat & 1
+        self.responder = (seat + 1) % self.n
+        return OK
+
+    def _flor(self, seat: int) -> int:
+        if not self.flor_enabled or not self.has_flor(seat):
+            return E_FLOR
+        pending = self.pending
+        if pending == PENDING_FLOR:
+            return E_FLOR
+        if pending == PENDING_ENVIDO:
+            # flor responde (e anula) o envido
+            if self.trick != 0 or self.table[seat] != NO_CARD:
+                return E_FLOR
+        else:
+            if not self._can_sing(seat):
+                return E_FLOR
+            if pending == PENDING_TRUCO:
+                self.suspended_responder = self.responder
+        team = seat & 1
+        self.envido_stage = 2
+        # alguém do outro time também tem flor? então ele responde (contraflor ou se achica)
+        n = self.n
+        for k in range(1, n):
+            s = (seat + k) % n
+            if (s & 1) != team and self.has_flor(s):
+                self.pending = PENDING_FLOR
+                self.pending_team = team
+                self.responder = s
+                return OK
+        self.flor_winner = team
+        self.notes |= NOTE_FLOR
+        self._resume_after_sing()
+        self._award(team, FLOR_POINTS)
+        return OK
+
+    def _best_team(self, flor: bool) -> int:
+        """Time com o maior envido/flor; empate fica com quem está mais perto da mão."""
+        n = self.n
+        best = -1
+        team = -1
+        for k in range(n):
+            s = (self.mano + k) % n
+            if flor:
+                if not self.has_flor(s):
+                    continue
+                v = self.flor_of(s)
+            else:
+                v = self.envido_of(s)
+            if v > best:
+                best, team = v, s & 1
+        self.envido_score = best
+        return team
+
+    def _resume_after_sing(self):
+        if self.suspended_responder != -1:
+            self.pending = PENDING_TRUCO
+            self.pending_team = 1 - (self.suspended_responder & 1)
+            self.responder = self.suspended_responder
+            self.suspended_responder = -1
+        else:
+            self.pending = PENDING_NONE
+            self.pending_team = -1
+            self.responder = -1
+
+    def _quiero(self, seat: int) -> int:
+        pending = self.pending
+        if pending == PENDING_TRUCO:
+            self.truco_level = self.truco_call
+            self.truco_holder = seat & 1  # quem aceitou é quem pode subir
+            self.pending = PENDING_NONE
+            self.pending_team = -1
+            self.responder = -1
+            return OK
+        if pending == PENDING_ENVIDO:
+            team = self._best_team(False)
+            if self.envido_falta:
+                pts = self.target - max(self.score[0], self.score[1])
+            else:
+                pts = self.envido_accept
+            self.envido_stage = 2
+            self.envido_winner = team
+            self.notes |= NOTE_ENVIDO
+            self._resume_after_sing()
+            self._award(team, pts)
+            return OK
+        # flor contra flor
+        team = self._best_team(True)
+        self.flor_winner = team
+        self.notes |= NOTE_FLOR
+        self._resume_after_sing()
+        self._award(team, CONTRAFLOR_POINTS)
+        return OK
+
+    def _no_quiero(self, seat: int) -> int:
+        pending = self.pending
+        team = self.pending_team
+        if pending == PENDING_TRUCO:
+            self._end_hand(team)  # leva o valor já aceito
+            return OK
+        if pending == PENDING_ENVIDO:
+            self.envido_stage = 2
+            self.envido_winner = team
+            self.envido_score = -1
+            self.notes |= NOTE_ENVIDO
+            self._resume_after_sing()
+            self._award(team, self.envido_reject)
+            return OK
+        self.flor_winner = team
+        self.notes |= NOTE_FLOR
+        self._resume_after_sing()
+        self._award(team, FLOR_REJECTED_POINTS)
+        return OK
+
+    def _award(self, team: int, pts: int):
+        self.score[team] += pts
+        self.hand_points[team] += pts
+        self.points_team = team
+        self.points += pts
+        if self.score[team] >= self.target and self.phase != PHASE_MATCH_OVER:
+            self.phase = PHASE_MATCH_OVER
+            self.winner = team
+            self.pending = PENDING_NONE
+            self.notes |= NOTE_MATCH_OVER
+
+    def _end_hand(self, team: int):
+        self.hand_winner = team
+        self.pending = PENDING_NONE
+        self.responder = -1
+        self.notes |= NOTE_HAND_OVER
+        self.phase = PHASE_HAND_OVER
+        self._award(team, TRUCO_POINTS[self.truco_level])
+
+    # ----- visão para os clientes (aloca; fora do caminho quente) -----
+
+    def legal_actions(self, seat: int) -> list:
+        if self.phase != PHASE_PLAYING or seat != self.actor():
+            return []
+        out = []
+        team = seat & 1
+        if self.pending == PENDING_TRUCO:
+            out += ["quiero", "no_quiero"]
+            if self.truco_call < 3:
+                out.append("truco")
+            if self.trick == 0 and self.envido_stage == 0 and self.table[seat] == NO_CARD:
+                out += ["envido", "real_envido", "falta_envido"]
+                if self.flor_enabled and self.has_flor(seat):
+                    out.append("flor")
+            return out
+        if self.pending == PENDING_ENVIDO:
+            out += ["quiero", "no_quiero"]
+            if self.envido_count < 2 and not self.envido_real and not self.envido_falta:
+                out.append("envido")
+            if not self.envido_real and not self.envido_falta:
+                out.append("real_envido")
+            if not self.envido_falta:
+                out.append("falta_envido")
+            if self.flor_enabled and self.has_flor(seat) and self.trick == 0 and self.table[seat] == NO_CARD:
+                out.append("flor")
+            return out
+        if self.pending == PENDING_FLOR:
+            return ["quiero", "no_quiero"]
+        out.append("play")
+        if self.truco_level < 3 and (self.truco_holder == -1 or self.truco_holder == team):
+            out.append("truco")
+        if self._can_sing(seat):
+            out += ["envido", "real_envido", "falta_envido"]
+            if self.flor_enabled and self.has_flor(seat):
+                out.append("flor")
+        out.append("mazo")
+        return out
+
+    def view(self, seat: int = -1) -> dict:
+        """Estado visível para um assento (seat=-1: só informação pública)."""
+        n = self.n
+        tricks = []
+        for t in range(min(self.trick + 1, 3)):
+            row = [self.table[t * 4 + s] for s in range(n)]
+            if any(c != NO_CARD for c in row) or t == self.trick:
+                tricks.append(row)
+        data = {
+            "seats": n,
+            "target": self.target,
+            "score": [self.score[0], self.score[1]],
+            "phase": PHASE_NAMES[self.phase],
+            "hand": self.hand_no,
+            "mano": self.mano,
+            "turn": self.turn,
+            "actor": self.actor() if self.phase == PHASE_PLAYING else -1,
+            "trick": self.trick,
+            "tricks": tricks,
+            "trick_winners": [w for w in self.trick_winner if w != -1],
+            "truco_level": self.truco_level,
+            "pending": PENDING_NAMES[self.pending],
+            "pending_call": TRUCO_CALL_NAMES[self.truco_call] if self.pending == PENDING_TRUCO else None,
+            "cards_left": [sum(1 for i in range(3) if self.hands[s * 3 + i] != NO_CARD) for s in range(n)],
+        }
+        if self.phase == PHASE_MATCH_OVER:
+            data["winner"] = self.winner
+        if 0 <= seat < n:
+            data["seat"] = seat
+            data["team"] = seat & 1
+            data["cards"] = [c for c in self.hands[seat * 3: seat * 3 + 3] if c != NO_CARD]
+            data["envido"] = self.envido_of(seat) if self.phase != PHASE_IDLE else 0
+            data["legal"] = self.legal_actions(seat)
+        return data
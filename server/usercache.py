@@ -0,0 +1,96 @@
+import time
+from collections import OrderedDict
+
+
+class UserCache:
+    """Cache LRU com TTL dos registros de usuário (id, username, hash, role).
+
+    Também guarda "não existe" (cache negativo) numa LRU separada e menor,
+    com TTL curto: nomes aleatórios de credential stuffing não vão ao disco
+    a cada tentativa e nem expulsam os usuários de verdade do cache.
+
+    Quem escreve no banco chama put()/invalidate(). Uma leitura que começou
+    antes de uma invalidação não grava o resultado (ver generation), para o
+    cache não voltar a um valor velho.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0, negative_ttl: float = 30.0,
+                 max_negative: int | None = None, clock=time.monotonic):
+        self.max_entries = max(1, max_entries)
+        self.max_negative = max(1, max_negative if max_negative is not None else max_entries // 4)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.entries = OrderedDict()  # username -> (expira_em, row)
+        self.negative = OrderedDict()  # username -> expira_em
+        self.generation = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries) + len(self.negative)
+
+    def get(self, username: str) -> tuple[bool, tuple | None]:
+        """(achou, row); row None com achou=True é um "não existe" em cache."""
+        now = self.clock()
+        item = self.entries.get(username)
+        if item is not None:
+            if item[0] > now:
+                self.entries.move_to_end(username)
+                self.hits += 1
+                return True, item[1]
+            del self.entries[username]
+        expires = self.negative.get(username)
+        if expires is not None:
+            if expires > now:
+                self.negative.move_to_end(username)
+                self.negative_hits += 1
+                return True, None
+            del self.negative[username]
+        self.misses += 1
+        return False, None
+
+    def put(self, username: str, row: tuple | None, generation: int | None = None):
+        if generation is not None and generation != self.generation:
+            return  # houve escrita enquanto a leitura rodava
+        now = self.clock()
+        if row is None:
+            self.entries.pop(username, None)
+            self._store(self.negative, username, now + self.negative_ttl, self.max_negative)
+        else:
+            self.negative.pop(username, None)
+            self._store(self.entries, username, (now + self.ttl, row), self.max_entries)
+
+    def invalidate(self, username: str):
+        self.generation += 1
+        self.invalidations += 1
+        self.entries.pop(username, None)
+        self.negative.pop(username, None)
+
+    def clear(self):
+        self.generation += 1
+        self.entries.clear()
+        self.negative.clear()
+
+    def _store(self, lru: OrderedDict, key: str, value, limit: int):
+        lru[key] = value
+        lru.move_to_end(key)
+        while len(lru) > limit:
+            lru.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "negative_entries": len(self.negative),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
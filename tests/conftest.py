@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# os módulos do servidor se importam pelo nome (python server/server.py roda de dentro de server/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "server"))
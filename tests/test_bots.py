@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from bots import BotConnection, fallback  # noqa: E402
+from truco import STRENGTH  # noqa: E402
+
+
+class FailingPool:
+    async def decide(self, view):
+        raise RuntimeError("worker morreu")
+
+
+class FixedPool:
+    def __init__(self, action, card=None):
+        self.result = {"action": action, "card": card, "sims": 0}
+
+    async def decide(self, view):
+        return self.result
+
+
+def turn(legal, cards=(0, 13, 27)):
+    return {"type": "game_state", "room": "r", "state": {"actor": 1, "seat": 1, "legal": legal, "cards": list(cards)}}
+
+
+async def run_bot(pool, frames, reject=0):
+    """Entrega os frames ao robô; o servidor falso recusa as primeiras `reject` ações."""
+    actions = []
+
+    async def on_action(bot, msg):
+        actions.append(msg)
+        if len(actions) <= reject:
+            await bot.send({"type": "error", "message": "Jogada inválida"})
+
+    bot = BotConnection("bot#1", pool, on_action)
+    for frame in frames:
+        await bot.send(frame)
+    for _ in range(10):
+        await asyncio.sleep(0)
+    return actions
+
+
+def test_fallback_plays_weakest_card_or_first_legal():
+    cards = [0, 13, 27]
+    assert fallback({"legal": ["play", "truco", "mazo"], "cards": cards}) == (
+        "play", min(cards, key=lambda c: STRENGTH[c]))
+    assert fallback({"legal": ["quiero", "no_quiero"], "cards": cards}) == ("quiero", None)
+
+
+def test_pool_failure_falls_back_to_a_legal_action():
+    actions = asyncio.run(run_bot(FailingPool(), [turn(["play", "mazo"])]))
+    assert len(actions) == 1 and actions[0]["action"] == "play"
+
+
+def test_rejected_action_retries_once_with_fallback():
+    actions = asyncio.run(run_bot(FixedPool("truco"), [turn(["play", "truco"])], reject=1))
+    assert [a["action"] for a in actions] == ["truco", "play"]
+
+
+def test_gives_up_after_fallback_is_also_rejected():
+    actions = asyncio.run(run_bot(FixedPool("truco"), [turn(["play", "truco"])], reject=5))
+    assert [a["action"] for a in actions] == ["truco", "play"]
+
+
+def test_not_its_turn_does_nothing():
+    frame = {"type": "game_state", "room": "r", "state": {"actor": 0, "seat": 1, "legal": [], "cards": [1]}}
+    assert asyncio.run(run_bot(FixedPool("play", 1), [frame])) == []
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+import bus
+from bus import BUS_HOST, BusClient, BusError, BusHub
+
+
+async def start_hub():
+    hub = BusHub()
+    server = await hub.start(BUS_HOST, 0)
+    return hub, server.sockets[0].getsockname()[1]
+
+
+async def connected(hub, port, *shards):
+    clients = [BusClient(s, port=port) for s in shards]
+    for c in clients:
+        await c.connect()
+    while len(hub.shards) < len(shards):
+        await asyncio.sleep(0.01)
+    return clients
+
+
+def test_failing_method_replies_with_error():
+    async def scenario():
+        hub, port = await start_hub()
+        a, b = await connected(hub, port, 0, 1)
+
+        async def boom():
+            raise RuntimeError("quebrou")
+
+        b.method("boom", boom)
+        with pytest.raises(BusError, match="quebrou"):
+            await a.call(1, "boom", timeout=1)
+        with pytest.raises(BusError, match="desconhecido"):
+            await a.call(1, "nada", timeout=1)
+        assert await a.call_all([1], "boom", timeout=1) == {}
+        a.close(), b.close(), hub.close()
+
+    asyncio.run(scenario())
+
+
+def test_client_reconnects_after_hub_drops_it():
+    async def scenario():
+        hub, port = await start_hub()
+        a, b = await connected(hub, port, 0, 1)
+        got, back = asyncio.Queue(), asyncio.Event()
+
+        async def on_ping(msg):
+            await got.put(msg["n"])
+
+        async def on_reconnect():
+            back.set()
+
+        b.on("ping", on_ping)
+        b.on_reconnect = on_reconnect
+        hub.shards[1].close()
+        await asyncio.wait_for(back.wait(), 5)
+        while 1 not in hub.shards or hub.shards[1].is_closing():
+            await asyncio.sleep(0.01)
+        a.publish("ping", n=7)
+        assert await asyncio.wait_for(got.get(), 2) == 7
+        assert b.stats()["reconnects"] == 1
+        a.close(), b.close(), hub.close()
+
+    asyncio.run(scenario())
+
+
+def test_hub_disconnects_a_shard_that_stops_reading(monkeypatch):
+    monkeypatch.setattr(bus, "HUB_HIGH_WATER", 1024)
+    monkeypatch.setattr(bus, "HUB_DRAIN_SECONDS", 0.2)
+
+    async def scenario():
+        hub, port = await start_hub()
+        (a,) = await connected(hub, port, 0)
+        # shard 1 se apresenta e nunca lê
+        reader, writer = await asyncio.open_connection(BUS_HOST, port)
+        writer.write(bus._line({"shard": 1}))
+        while 1 not in hub.shards:
+            await asyncio.sleep(0.01)
+        blob = "x" * 16384
+        for _ in range(5000):
+            a.publish("spam", blob=blob)
+            await asyncio.sleep(0.001)
+            if hub.dropped:
+                break
+        assert hub.dropped == 1
+        a.close(), writer.close(), hub.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,58 @@
+from gamesync import ViewStream, diff_view
+
+
+def apply(state: dict, delta: dict) -> dict:
+    """O que o cliente faz com um game_delta."""
+    state = {**state, **delta["set"]}
+    for k in delta.get("del", ()):
+        state.pop(k, None)
+    return state
+
+
+def views(n):
+    return [{"turn": i % 2, "score": [i, 0], **({"winner": 0} if i == n - 1 else {})} for i in range(n)]
+
+
+def test_diff_view_reports_changed_and_removed_fields():
+    assert diff_view({"a": 1, "b": 2, "c": 3}, {"a": 1, "b": 5, "d": None}) == ({"b": 5, "d": None}, ["c"])
+
+
+def test_first_delta_is_the_whole_view_and_unchanged_views_are_skipped():
+    vs = ViewStream()
+    first = vs.update({"turn": 0, "cards": [1, 2]})
+    assert first == {"seq": 1, "set": {"turn": 0, "cards": [1, 2]}}
+    assert vs.update({"turn": 0, "cards": [1, 2]}) is None
+    assert vs.update({"turn": 1}) == {"seq": 2, "set": {"turn": 1}, "del": ["cards"]}
+
+
+def test_missed_seq_is_caught_up_with_deltas_only():
+    vs = ViewStream(window=8)
+    client, seq = {}, 0
+    for i, view in enumerate(views(6)):
+        delta = vs.update(view)
+        if i == 2:
+            continue  # perdeu este
+        if delta["seq"] != seq + 1:
+            for missing in vs.since(seq):  # game_resync com o último seq aplicado
+                client, seq = apply(client, missing), missing["seq"]
+            continue
+        client, seq = apply(client, delta), delta["seq"]
+    assert seq == vs.seq == 6 and client == vs.view
+
+
+def test_resync_outside_the_window_needs_a_snapshot():
+    vs = ViewStream(window=3)
+    for view in views(6):
+        vs.update(view)
+    assert [d["seq"] for d in vs.since(3)] == [4, 5, 6]
+    assert vs.since(2) is None
+    assert vs.snapshot() == {"seq": 6, "state": vs.view}
+
+
+def test_since_rejects_bogus_seqs():
+    vs = ViewStream()
+    vs.update({"turn": 0})
+    assert vs.since(1) == []
+    assert vs.since(2) is None  # do futuro
+    assert vs.since("1") is None and vs.since(None) is None
+    assert [d["seq"] for d in vs.since(0)] == [1]
@@ -0,0 +1,23 @@
+from hashing import PBKDF2_MIN_ITERS, SCRYPT_MIN_N, HashParams, needs_rehash
+
+PARAMS = HashParams("pbkdf2_sha256", 400_000)
+
+
+def test_stronger_hash_is_kept():
+    assert not needs_rehash("pbkdf2_sha256", 400_000, PARAMS)
+    assert not needs_rehash("pbkdf2_sha256", 2_000_000, PARAMS)  # antes era "rebaixado"
+
+
+def test_weaker_hash_or_other_algorithm_is_redone():
+    assert not needs_rehash("pbkdf2_sha256", 200_000, PARAMS)  # dentro da folga da calibração
+    assert needs_rehash("pbkdf2_sha256", 199_999, PARAMS)
+    assert needs_rehash("scrypt", SCRYPT_MIN_N, PARAMS)
+
+
+def test_floor_applies_but_never_above_current_cost():
+    low = HashParams("pbkdf2_sha256", 150_000)
+    assert needs_rehash("pbkdf2_sha256", 90_000, low)  # acima da folga, abaixo do piso
+    assert not needs_rehash("pbkdf2_sha256", PBKDF2_MIN_ITERS, low)
+    explicit = HashParams("pbkdf2_sha256", 1000)  # HASH_COST baixo de propósito
+    assert not needs_rehash("pbkdf2_sha256", 1000, explicit)
+    assert needs_rehash("pbkdf2_sha256", 400, explicit)
@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import inspect_db  # noqa: E402
+from database import migrate  # noqa: E402
+from hashing import HashParams, hash_password  # noqa: E402
+
+GOOD_HASH = hash_password("12345", HashParams("pbkdf2_sha256", 1000))
+
+
+def fake_hash_many(passwords):
+    return [f"hash:{p}" for p in passwords]
+
+
+@pytest.mark.parametrize("rec", [
+    {"username": "ab", "password": "12345"},  # nome curto
+    {"username": "a" * 21, "password": "12345"},  # nome longo
+    {"username": "bot#7", "password": "12345"},  # prefixo reservado
+    {"username": 123, "password": "12345"},
+    {"username": "ana", "password": "1234"},  # senha curta
+    {"username": "ana", "password": "x" * 21},  # senha longa
+    {"username": "ana", "password": 12345},
+    {"username": "ana"},
+    {"username": "ana", "password_hash": "lixo"},
+    {"username": "ana", "password": "12345", "role": "root"},
+])
+def test_prepare_counts_invalid_records(rec):
+    assert inspect_db.prepare([rec], fake_hash_many) == ([], 1)
+
+
+def test_prepare_hashes_only_plain_passwords():
+    rows, invalid = inspect_db.prepare([
+        {"username": " ana ", "password": "12345"},
+        {"username": "bia", "password_hash": GOOD_HASH, "role": "admin"},
+    ], fake_hash_many)
+    assert invalid == 0
+    assert rows == [["ana", "hash:12345", "user", None], ["bia", GOOD_HASH, "admin", None]]
+
+
+def test_import_of_ready_hashes_starts_no_pool(tmp_path, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("pool de hashing criado sem senha em claro")
+
+    monkeypatch.setattr(inspect_db, "ProcessPoolExecutor", no_pool)
+    db = tmp_path / "users.db"
+    migrate(db)
+    conn = inspect_db.open_db(db)
+    records = [{"username": "ana", "password_hash": GOOD_HASH}, {"username": "x", "password_hash": GOOD_HASH}]
+    inspect_db.import_users(conn, iter(records), "skip", batch=10, txn_rows=10, workers=1)
+    assert [r[0] for r in conn.execute("SELECT username FROM users")] == ["ana"]
+    conn.close()
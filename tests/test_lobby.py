@@ -0,0 +1,40 @@
+import asyncio
+
+from lobby import SpectatorFeed
+
+
+class FakeFanOut:
+    def __init__(self):
+        self.sent = []
+
+    def broadcast(self, conns, data, key=None):
+        self.sent.append(data)
+        return []
+
+
+def flush_events(*events):
+    async def scenario():
+        fanout = FakeFanOut()
+        feed = SpectatorFeed(fanout, lambda room: ["espectador"], delay_ms=0)
+        for event in events:
+            feed.add("r", event)
+        feed.flush()
+        feed.close()
+        return fanout.sent[0]["events"], feed.last_state.get("r")
+
+    return asyncio.run(scenario())
+
+
+def test_final_state_stays_before_game_over():
+    s1, s2 = {"type": "game_state", "n": 1}, {"type": "game_state", "n": 2}
+    play, over = {"type": "game_event", "n": 3}, {"type": "game_over"}
+    events, last = flush_events(s1, play, s2, over)
+    assert events == [play, s2, over]
+    assert last is None
+
+
+def test_state_after_game_over_is_kept_for_new_spectators():
+    over, s1 = {"type": "game_over"}, {"type": "game_state", "n": 1}
+    events, last = flush_events(over, s1)
+    assert events == [over, s1]
+    assert last is s1
@@ -0,0 +1,85 @@
+import pytest
+
+from matchmaking import Matchmaker, balanced_seats
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def matchmaker():
+    clock = Clock()
+    return Matchmaker(bucket_width=100, widen_per_second=20, max_window=400, clock=clock), clock
+
+
+def keys(group):
+    return sorted(t.key for t in group)
+
+
+def test_same_bucket_matches_on_enqueue():
+    mm, _ = matchmaker()
+    assert mm.enqueue("a", 1010, 2) is None
+    assert keys(mm.enqueue("b", 1090, 2)) == ["a", "b"]
+    assert len(mm) == 0 and mm.matched == 2
+
+
+def test_window_widens_with_waiting_time():
+    mm, clock = matchmaker()
+    mm.enqueue("a", 1000, 2)
+    mm.enqueue("b", 1250, 2)
+    assert mm.tick() == []
+    clock.now = 5  # janela 100 + 20*5 = 200 < 250
+    assert mm.tick() == []
+    clock.now = 8  # 260
+    [group] = mm.tick()
+    assert keys(group) == ["a", "b"] and mm.stats()["max_wait_s"] == 8
+
+
+def test_window_stops_at_max_window():
+    mm, clock = matchmaker()
+    mm.enqueue("a", 1000, 2)
+    mm.enqueue("b", 1500, 2)
+    clock.now = 1000
+    assert mm.window(mm.get("a"), clock.now) == 400
+    assert mm.tick() == [] and len(mm) == 2
+
+
+def test_widening_picks_the_closest_ratings():
+    mm, clock = matchmaker()
+    for key, rating in (("a", 1000), ("far", 1350), ("b", 1150), ("c", 850), ("d", 1180)):
+        mm.enqueue(key, rating, 4)
+    clock.now = 15  # janela 400: todos cabem, mas só 3 vão com "a"
+    [group] = mm.tick()
+    assert group[0].key == "a" and keys(group) == ["a", "b", "c", "d"]
+    assert "far" in mm
+
+
+def test_modes_do_not_mix_and_cancel_leaves_the_queue():
+    mm, clock = matchmaker()
+    mm.enqueue("a", 1000, 2)
+    mm.enqueue("b", 1000, 4)
+    assert mm.cancel("a").key == "a" and mm.cancel("a") is None
+    clock.now = 100
+    assert mm.tick() == [] and list(mm.tickets) == ["b"] and mm.cancelled == 1
+    with pytest.raises(ValueError):
+        mm.enqueue("x", 1000, 3)
+
+
+def test_requeue_replaces_the_previous_ticket():
+    mm, _ = matchmaker()
+    mm.enqueue("a", 1000, 2)
+    mm.enqueue("a", 2000, 2)
+    assert mm.enqueue("b", 1010, 2) is None
+    assert mm.get("a").rating == 2000 and len(mm) == 2
+
+
+def test_balanced_seats_pairs_strongest_with_weakest():
+    mm, _ = matchmaker()
+    for key, rating in (("a", 1000), ("b", 1030), ("c", 1060), ("d", 1090)):
+        group = mm.enqueue(key, rating, 4)
+    seats = [t.key for t in balanced_seats(group)]
+    assert seats == ["d", "c", "a", "b"]  # times: assentos 0+2 (d, a) contra 1+3 (c, b)
@@ -0,0 +1,80 @@
+import pytest
+
+from ratelimit import RateLimiter, parse_rules
+from timerwheel import TimerWheel
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def limiter(text):
+    clock = Clock()
+    wheel = TimerWheel(tick=1.0, slots=64, clock=clock)
+    return RateLimiter(parse_rules(text), wheel, clock=clock), wheel, clock
+
+
+def test_parse_rules_reads_scopes_and_global_budgets():
+    rules = parse_rules(" chat=conn:3/5, user:5/10 ;login=global:auth:20/40;;")
+    assert [(r.scope, r.rate, r.burst, r.name) for r in rules["chat"]] == [
+        ("conn", 3.0, 5.0, "chat"), ("user", 5.0, 10.0, "chat")]
+    assert [(r.scope, r.name) for r in rules["login"]] == [("global", "auth")]
+    assert parse_rules("") == {}
+
+
+@pytest.mark.parametrize("text, bad", [
+    ("chat", "chat"),  # sem "="
+    ("=conn:1/2", "=conn:1/2"),
+    ("chat=", "chat="),
+    ("chat=conn3/5", "conn3/5"),  # sem ":"
+    ("chat=conn:3", "conn:3"),  # sem "/"
+    ("chat=conn:x/5", "conn:x/5"),
+    ("chat=conn:3/y", "conn:3/y"),
+    ("chat=conn:0/5", "conn:0/5"),
+    ("chat=conn:-1/5", "conn:-1/5"),
+    ("chat=conn:3/0", "conn:3/0"),
+    ("chat=conn:nan/5", "conn:nan/5"),
+    ("chat=room:3/5", "room:3/5"),  # escopo desconhecido
+    ("chat=global:3/5", "global:3/5"),  # budget sem nome
+    ("chat=global::3/5", "global::3/5"),
+    ("chat=conn:a:3/5", "conn:a:3/5"),
+    ("chat=conn:3/5,", "''"),
+])
+def test_parse_rules_names_the_bad_entry(text, bad):
+    with pytest.raises(ValueError) as e:
+        parse_rules(text)
+    assert bad in str(e.value)
+
+
+def test_bucket_refills_at_rate():
+    rl, _, clock = limiter("chat=conn:2/3")
+    assert [rl.check("chat", "c", None, None) for _ in range(3)] == [None] * 3
+    assert rl.check("chat", "c", None, None) == pytest.approx(0.5)  # falta 1 token a 2/s
+    clock.now += 0.5
+    assert rl.check("chat", "c", None, None) is None
+    assert rl.check("chat", "c", None, None) is not None
+    assert rl.limited == {"chat": 2}
+
+
+def test_full_bucket_is_evicted_only_after_idling():
+    rl, wheel, clock = limiter("chat=conn:1/2,user:1/2")
+    rl.check("chat", "c", "ana", None)
+    clock.now += 1.5  # ainda falta meio token: reagenda em vez de esquecer
+    wheel.advance()
+    assert len(rl.buckets) == 2 and rl.evicted == 0
+    clock.now += 1.0
+    wheel.advance()
+    assert rl.buckets == {} and rl.by_conn == {} and rl.evicted == 2
+    assert len(wheel) == 0
+
+
+def test_forget_conn_drops_its_buckets_and_timers():
+    rl, wheel, _ = limiter("chat=conn:1/2,ip:1/2")
+    rl.check("chat", "c", None, "1.2.3.4")
+    rl.forget_conn("c")
+    assert list(rl.buckets) == [("chat", "ip", "1.2.3.4")]
+    assert len(wheel) == 1
@@ -0,0 +1,165 @@
+"""Sessões de ponta a ponta: servidor de verdade num diretório temporário (banco próprio)."""
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+import websockets
+
+from sessions import SessionManager
+
+SERVER_DIR = Path(__file__).resolve().parent.parent / "server"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def server_url(tmp_path):
+    # DB_PATH sai de server/../data: uma cópia do server/ isola o banco do teste
+    shutil.copytree(SERVER_DIR, tmp_path / "server", ignore=shutil.ignore_patterns("__pycache__"))
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        METRICS_PORT="0",
+        RATE_LIMITS="",
+        HASH_COST="100000",
+        SESSION_SECRET="teste",
+        CHAT_LOG="0",
+        REPLAY_LOG="0",
+    )
+    proc = subprocess.Popen([sys.executable, "server.py"], cwd=tmp_path / "server", env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"ws://localhost:{port}"
+    try:
+        asyncio.run(wait_listening(url, proc))
+        yield url
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+async def wait_listening(url, proc):
+    for _ in range(100):
+        if proc.poll() is not None:
+            raise RuntimeError("servidor não subiu")
+        try:
+            async with websockets.connect(url):
+                return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("servidor não respondeu")
+
+
+async def request(url, *messages) -> dict:
+    """Manda as mensagens numa conexão nova e devolve a última resposta relevante."""
+    async with websockets.connect(url) as ws:
+        reply = None
+        for msg in messages:
+            await ws.send(json.dumps(msg))
+            while True:
+                reply = json.loads(await asyncio.wait_for(ws.recv(), 10))
+                if reply["type"] in ("register_ok", "login_ok", "logout_ok", "error"):
+                    break
+        return reply
+
+
+def test_logout_revokes_resumed_session(server_url):
+    async def scenario():
+        await request(server_url, {"type": "register", "user": "ana", "pass": "12345"})
+        first = await request(server_url, {"type": "login", "user": "ana", "pass": "12345"})
+        t1 = first["token"]
+        async with websockets.connect(server_url) as ws:
+            await ws.send(json.dumps({"type": "resume", "token": t1}))
+            resumed = json.loads(await asyncio.wait_for(ws.recv(), 10))
+            assert resumed["type"] == "login_ok" and resumed["token"] != t1
+            await ws.send(json.dumps({"type": "logout"}))
+            while json.loads(await asyncio.wait_for(ws.recv(), 10))["type"] != "logout_ok":
+                pass
+        again = await request(server_url, {"type": "resume", "token": t1})
+        assert again["type"] == "error" and again["code"] == "session_invalid"
+        again = await request(server_url, {"type": "resume", "token": resumed["token"]})
+        assert again["code"] == "session_invalid"
+
+    asyncio.run(scenario())
+
+
+MALFORMED_TOKENS = [None, 123, ["v1"], {"t": 1}, "", "v1", "v1.a", "v1.a.b.c", "v2.a.b",
+                    "v1.é.x", "v1.abc.é", "v1.%%%.x", "v1..", "\udcff.a.b"]
+
+
+@pytest.mark.parametrize("token", MALFORMED_TOKENS)
+def test_verify_rejects_malformed_tokens(token):
+    assert SessionManager(b"segredo").verify(token) is None
+
+
+def test_verify_rejects_tampering():
+    sessions = SessionManager(b"segredo")
+    token, claims = sessions.issue(1, "ana", "user")
+    assert sessions.verify(token)["sid"] == claims["sid"]
+    version, payload, sig = token.split(".")
+    flipped = sig[:-1] + ("A" if sig[-1] != "A" else "B")
+    assert sessions.verify(f"{version}.{payload}.{flipped}") is None
+    assert SessionManager(b"outro").verify(token) is None
+    # payload assinado mas que não é um objeto JSON
+    body = "v1." + "MTIz"  # "123"
+    assert sessions.verify(body + "." + sessions._sign(body)) is None
+
+
+def test_malformed_resume_keeps_connection(server_url):
+    async def scenario():
+        async with websockets.connect(server_url) as ws:
+            for token in MALFORMED_TOKENS:
+                await ws.send(json.dumps({"type": "resume", "token": token}))
+                reply = json.loads(await asyncio.wait_for(ws.recv(), 10))
+                assert reply["code"] == "session_invalid", token
+
+    asyncio.run(scenario())
+
+
+def test_resume_does_not_recreate_a_gone_room(server_url):
+    async def scenario():
+        await request(server_url, {"type": "register", "user": "bia", "pass": "12345"})
+        async with websockets.connect(server_url) as ws:
+            await ws.send(json.dumps({"type": "login", "user": "bia", "pass": "12345"}))
+            while (reply := json.loads(await asyncio.wait_for(ws.recv(), 10)))["type"] != "login_ok":
+                pass
+            token = reply["token"]
+            await ws.send(json.dumps({"type": "create_room", "room": "velha"}))
+            while json.loads(await asyncio.wait_for(ws.recv(), 10))["type"] != "room_joined":
+                pass
+        # a sala esvaziou com a queda; o resume não pode trazê-la de volta
+        await asyncio.sleep(0.3)
+        async with websockets.connect(server_url) as ws:
+            await ws.send(json.dumps({"type": "resume", "token": token, "room": "velha"}))
+            types = []
+            while not types or types[-1] != "error":
+                types.append(json.loads(await asyncio.wait_for(ws.recv(), 10))["type"])
+            assert "room_joined" not in types
+        async with websockets.connect(server_url) as ws:
+            # create só vem num redirect de create_room (cluster): aí a sala é criada no dono
+            await ws.send(json.dumps({"type": "resume", "token": token, "room": "velha", "create": True}))
+            while (reply := json.loads(await asyncio.wait_for(ws.recv(), 10)))["type"] not in ("room_joined", "error"):
+                pass
+            assert reply == {**reply, "type": "room_joined", "room": "velha"}
+
+    asyncio.run(scenario())
+
+
+def test_prune_forgets_only_expired_revocations():
+    sessions = SessionManager(b"segredo", ttl_seconds=60)
+    token, claims = sessions.issue(1, "ana", "user")
+    sessions.revoke(claims)
+    sessions.revoke_sid("velho", 1.0)  # já venceu
+    assert sessions.prune() == 1
+    assert "velho" not in sessions.revoked
+    assert sessions.verify(token) is None
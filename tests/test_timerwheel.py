@@ -0,0 +1,82 @@
+from timerwheel import TimerWheel
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def wheel(slots=8):
+    clock = Clock()
+    return TimerWheel(tick=1.0, slots=slots, clock=clock), clock
+
+
+def test_fires_once_when_due():
+    w, clock = wheel()
+    fired = []
+    w.schedule_in("a", 2.5, fired.append)
+    clock.now += 2.0
+    w.advance()
+    assert fired == [] and "a" in w
+    clock.now += 1.0
+    w.advance()
+    w.advance()
+    assert fired == ["a"] and "a" not in w and len(w) == 0 and w.fired == 1
+
+
+def test_cancel_and_reschedule_replace_the_timer():
+    w, clock = wheel()
+    fired = []
+    w.schedule_in("a", 1, fired.append)
+    w.schedule_in("b", 1, fired.append)
+    w.cancel("a")
+    w.cancel("nada")  # cancelar o que não existe é inofensivo
+    w.schedule_in("b", 5, lambda k: fired.append(k + "!"))
+    clock.now += 2
+    w.advance()
+    assert fired == []
+    clock.now += 4
+    w.advance()
+    assert fired == ["b!"] and len(w) == 0
+
+
+def test_deadline_longer_than_a_turn_waits_for_its_turn():
+    w, clock = wheel(slots=4)
+    fired = []
+    w.schedule_in("longe", 10, fired.append)
+    for _ in range(9):
+        clock.now += 1
+        w.advance()
+    assert fired == []
+    clock.now += 1
+    w.advance()
+    assert fired == ["longe"]
+
+
+def test_callback_may_reschedule_itself():
+    w, clock = wheel()
+    fired = []
+
+    def tick(key):
+        fired.append(clock.now)
+        if len(fired) < 3:
+            w.schedule_in(key, 2, tick)
+
+    w.schedule_in("job", 2, tick)
+    for _ in range(8):
+        clock.now += 1
+        w.advance()
+    assert fired == [102.0, 104.0, 106.0] and len(w) == 0
+
+
+def test_big_jump_fires_everything_overdue():
+    w, clock = wheel(slots=4)
+    fired = []
+    for i in range(10):
+        w.schedule_in(i, i + 1, fired.append)
+    clock.now += 50
+    w.advance()
+    assert sorted(fired) == list(range(10))
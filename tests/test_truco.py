@@ -0,0 +1,134 @@
+from truco import (
+    BASTOS, COPAS, E_CARD, E_PENDING, E_TRUCO, E_TURN, ENVIDO, ENVIDO_TABLE, ESPADAS, FALTA_ENVIDO, MAZO,
+    NO_QUIERO, OK, OUROS, PARDA, PENDING_ENVIDO, PENDING_TRUCO, PHASE_HAND_OVER, PHASE_MATCH_OVER, PLAY,
+    QUIERO, REAL_ENVIDO, STRENGTH, TRUCO, Match, card,
+)
+
+E1, B1, E7, O7 = card(ESPADAS, 1), card(BASTOS, 1), card(ESPADAS, 7), card(OUROS, 7)
+
+
+def match(seat0, seat1, target=30):
+    """Partida de 2 com a mão dada; o assento 0 é mão na primeira rodada."""
+    m = Match(2, target=target)
+    m.deal_cards([card(*c) for c in seat0] + [card(*c) for c in seat1])
+    return m
+
+
+def play(m, *moves):
+    for seat, action, arg in moves:
+        assert m.apply(seat, action, card(*arg) if action == PLAY else 0) == OK, (seat, action, arg)
+
+
+def test_strength_follows_truco_order():
+    threes = [card(s, 3) for s in range(4)]
+    fours = [card(s, 4) for s in range(4)]
+    assert STRENGTH[E1] > STRENGTH[B1] > STRENGTH[E7] > STRENGTH[O7] > max(STRENGTH[c] for c in threes)
+    assert STRENGTH[card(COPAS, 1)] == STRENGTH[card(OUROS, 1)] < STRENGTH[card(COPAS, 2)]
+    assert all(STRENGTH[c] == min(STRENGTH) for c in fours)
+
+
+def test_envido_table_counts_pairs_of_a_suit_and_ignores_figures():
+    seven, six, king = card(COPAS, 7), card(COPAS, 6), card(ESPADAS, 12)
+    assert ENVIDO_TABLE[seven * 1600 + six * 40 + king] == 33
+    assert ENVIDO_TABLE[king * 1600 + six * 40 + seven] == 33  # qualquer ordem
+    assert ENVIDO_TABLE[card(COPAS, 12) * 1600 + card(COPAS, 11) * 40 + card(ESPADAS, 4)] == 20
+    assert ENVIDO_TABLE[card(COPAS, 5) * 1600 + card(OUROS, 7) * 40 + card(ESPADAS, 12)] == 7
+
+
+def test_hand_is_won_by_two_tricks():
+    m = match([(ESPADAS, 1), (COPAS, 4), (COPAS, 5)], [(OUROS, 3), (OUROS, 2), (BASTOS, 4)])
+    play(m, (0, PLAY, (ESPADAS, 1)), (1, PLAY, (OUROS, 3)))
+    assert list(m.trick_winner[:1]) == [0] and m.turn == 0
+    play(m, (0, PLAY, (COPAS, 4)), (1, PLAY, (OUROS, 2)))
+    assert m.turn == 1  # quem ganhou a rodada abre a próxima
+    play(m, (1, PLAY, (BASTOS, 4)), (0, PLAY, (COPAS, 5)))
+    assert list(m.trick_winner) == [0, 1, 0]  # o 5 de copas ganha do 4 de bastos
+    assert m.phase == PHASE_HAND_OVER and m.hand_winner == 0 and list(m.score) == [1, 0]
+
+
+def test_parda_in_first_trick_is_decided_by_the_second():
+    m = match([(ESPADAS, 3), (COPAS, 4), (COPAS, 5)], [(BASTOS, 3), (OUROS, 2), (BASTOS, 4)])
+    play(m, (0, PLAY, (ESPADAS, 3)), (1, PLAY, (BASTOS, 3)))
+    assert m.trick_winner[0] == PARDA and m.turn == 0
+    play(m, (0, PLAY, (COPAS, 4)), (1, PLAY, (OUROS, 2)))
+    assert m.phase == PHASE_HAND_OVER and m.hand_winner == 1
+
+
+def test_accepted_truco_is_worth_two_and_only_the_acceptor_raises():
+    m = match([(ESPADAS, 1), (BASTOS, 1), (COPAS, 5)], [(OUROS, 3), (OUROS, 2), (BASTOS, 4)])
+    play(m, (0, TRUCO, None), (1, QUIERO, None))
+    assert m.truco_level == 1 and m.pending == 0
+    assert m.apply(0, TRUCO) == E_TRUCO
+    play(m, (0, PLAY, (ESPADAS, 1)), (1, PLAY, (OUROS, 3)), (0, PLAY, (BASTOS, 1)), (1, PLAY, (OUROS, 2)))
+    assert list(m.score) == [2, 0]
+
+
+def test_rejected_truco_and_retruco_pay_the_accepted_value():
+    m = match([(ESPADAS, 1), (BASTOS, 1), (COPAS, 5)], [(OUROS, 3), (OUROS, 2), (BASTOS, 4)])
+    play(m, (0, TRUCO, None), (1, NO_QUIERO, None))
+    assert m.phase == PHASE_HAND_OVER and list(m.score) == [1, 0]
+
+    m = match([(ESPADAS, 1), (BASTOS, 1), (COPAS, 5)], [(OUROS, 3), (OUROS, 2), (BASTOS, 4)])
+    play(m, (0, TRUCO, None), (1, TRUCO, None))  # retruco já aceita o truco
+    assert m.truco_level == 1 and m.responder == 0
+    play(m, (0, NO_QUIERO, None))
+    assert list(m.score) == [0, 2]
+
+
+def test_envido_accepted_goes_to_the_best_hand():
+    m = match([(COPAS, 7), (COPAS, 6), (ESPADAS, 12)], [(OUROS, 5), (OUROS, 4), (BASTOS, 4)])
+    play(m, (0, ENVIDO, None), (1, QUIERO, None))
+    assert m.envido_winner == 0 and m.envido_score == 33 and list(m.score) == [2, 0]
+    assert m.pending == 0 and m.turn == 0  # a mão continua
+
+
+def test_envido_tie_goes_to_the_mano():
+    m = match([(COPAS, 7), (COPAS, 6), (ESPADAS, 12)], [(OUROS, 7), (OUROS, 6), (BASTOS, 12)])
+    play(m, (0, ENVIDO, None), (1, QUIERO, None))
+    assert m.envido_winner == 0
+
+
+def test_rejected_raise_pays_what_was_already_on_the_table():
+    m = match([(COPAS, 7), (COPAS, 6), (ESPADAS, 12)], [(OUROS, 5), (OUROS, 4), (BASTOS, 4)])
+    play(m, (0, ENVIDO, None), (1, REAL_ENVIDO, None), (0, NO_QUIERO, None))
+    assert m.envido_winner == 1 and list(m.score) == [0, 2]
+
+
+def test_falta_envido_pays_what_the_leader_is_missing():
+    m = match([(COPAS, 7), (COPAS, 6), (ESPADAS, 12)], [(OUROS, 5), (OUROS, 4), (BASTOS, 4)], target=15)
+    m.score[1] = 9
+    play(m, (0, FALTA_ENVIDO, None), (1, QUIERO, None))
+    assert list(m.score) == [6, 9]
+
+
+def test_envido_is_first_then_truco_resumes():
+    m = match([(COPAS, 7), (COPAS, 6), (ESPADAS, 12)], [(OUROS, 5), (OUROS, 4), (BASTOS, 4)])
+    play(m, (0, TRUCO, None), (1, ENVIDO, None))
+    assert m.pending == PENDING_ENVIDO and m.responder == 0
+    play(m, (0, QUIERO, None))
+    assert m.pending == PENDING_TRUCO and m.responder == 1 and list(m.score) == [2, 0]
+
+
+def test_reaching_the_target_ends_the_match():
+    m = match([(ESPADAS, 1), (BASTOS, 1), (COPAS, 5)], [(OUROS, 3), (OUROS, 2), (BASTOS, 4)], target=2)
+    play(m, (0, TRUCO, None), (1, QUIERO, None))
+    play(m, (0, PLAY, (ESPADAS, 1)), (1, PLAY, (OUROS, 3)), (0, PLAY, (BASTOS, 1)), (1, PLAY, (OUROS, 2)))
+    assert m.phase == PHASE_MATCH_OVER and m.winner == 0
+    assert m.view()["winner"] == 0
+
+
+def test_mazo_gives_the_hand_to_the_other_team():
+    m = match([(ESPADAS, 1), (BASTOS, 1), (COPAS, 5)], [(OUROS, 3), (OUROS, 2), (BASTOS, 4)])
+    play(m, (0, MAZO, None))
+    assert m.hand_winner == 1 and list(m.score) == [0, 1]
+
+
+def test_invalid_actions_leave_the_state_untouched():
+    m = match([(ESPADAS, 1), (BASTOS, 1), (COPAS, 5)], [(OUROS, 3), (OUROS, 2), (BASTOS, 4)])
+    before = m.view(0)
+    assert m.apply(1, PLAY, card(OUROS, 3)) == E_TURN
+    assert m.apply(0, PLAY, card(OUROS, 3)) == E_CARD
+    assert m.view(0) == before
+    play(m, (0, TRUCO, None))
+    assert m.apply(1, PLAY, card(OUROS, 3)) == E_PENDING
+    assert m.legal_actions(1)[:2] == ["quiero", "no_quiero"] and m.legal_actions(0) == []
@@ -0,0 +1,85 @@
+import asyncio
+
+from database import AsyncDatabase
+from usercache import UserCache
+
+ANA = (1, "ana", "hash", "user")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = UserCache(ttl=10, negative_ttl=2, clock=clock)
+    cache.put("ana", ANA)
+    cache.put("zzz", None)
+    assert cache.get("ana") == (True, ANA)
+    assert cache.get("zzz") == (True, None)  # "não existe" em cache
+    clock.now = 3
+    assert cache.get("zzz") == (False, None)
+    assert cache.get("ana") == (True, ANA)
+    clock.now = 11
+    assert cache.get("ana") == (False, None)
+    assert len(cache) == 0
+
+
+def test_negative_entries_have_their_own_smaller_lru():
+    cache = UserCache(max_entries=8, max_negative=2)
+    cache.put("ana", ANA)
+    for name in ("x1", "x2", "x3"):
+        cache.put(name, None)
+    assert cache.get("x1") == (False, None)  # o mais antigo saiu
+    assert cache.get("x3") == (True, None)
+    assert cache.get("ana") == (True, ANA)  # nomes inventados não expulsam usuários
+    cache.put("x3", ANA)  # passou a existir
+    assert cache.get("x3") == (True, ANA) and "x3" not in cache.negative
+
+
+def test_lru_evicts_least_recently_used():
+    cache = UserCache(max_entries=2)
+    cache.put("a", ANA)
+    cache.put("b", ANA)
+    cache.get("a")
+    cache.put("c", ANA)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a")[0] and cache.get("c")[0]
+    assert cache.evictions == 1
+
+
+def test_put_from_a_read_older_than_an_invalidation_is_dropped():
+    cache = UserCache()
+    generation = cache.generation
+    cache.invalidate("ana")
+    cache.put("ana", ANA, generation)
+    assert cache.get("ana") == (False, None)
+    cache.put("ana", ANA, cache.generation)
+    assert cache.get("ana") == (True, ANA)
+
+
+def test_invalidation_during_a_load_does_not_cache_the_stale_row():
+    cache = UserCache()
+    db = AsyncDatabase(user_cache=cache)
+    reading, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_fetchone(sql, params):
+        reading.set()
+        await release.wait()
+        return None  # o que o disco tinha antes do registro
+
+    db.fetchone = slow_fetchone
+
+    async def scenario():
+        load = asyncio.create_task(db.get_user_by_username("ana"))
+        await reading.wait()
+        db.invalidate_user("ana")  # registro (ou outro shard) escreveu enquanto a leitura rodava
+        release.set()
+        assert await load is None
+        assert cache.get("ana") == (False, None)  # o "não existe" velho não foi gravado
+
+    asyncio.run(scenario())